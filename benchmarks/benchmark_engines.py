@@ -0,0 +1,69 @@
+'''Benchmark the engines updating the population densities.
+
+Generates a random landscape (by default large enough for the density arrays to exceed the CPU
+cache) and reports the time per time step of each engine, e.g.:
+
+    python -m benchmarks.benchmark_engines --width 2000 --height 2000 --time-steps 16
+'''
+from argparse import ArgumentParser
+import time
+import numpy as np
+from predator_prey.engines import ENGINES, create_advance_function
+
+def create_random_landscape(width, height, land_fraction, seed):
+    """
+    Create a random landscape and the land neighbour counts of its squares.
+
+    Args:
+        width (int): The width of the landscape.
+        height (int): The height of the landscape.
+        land_fraction (float): The probability of a square being land.
+        seed (int): The random seed.
+
+    Returns:
+        tuple: The landscape (with halo) and the number of land neighbours of each square.
+    """
+    landscape = np.zeros((height + 2, width + 2), int)
+    landscape[1:-1, 1:-1] = np.random.default_rng(seed).random((height, width)) < land_fraction
+    neighbours = np.zeros_like(landscape)
+    neighbours[1:-1, 1:-1] = landscape[:-2, 1:-1] + landscape[2:, 1:-1] + landscape[1:-1, :-2] + landscape[1:-1, 2:]
+    return landscape, neighbours
+
+def benchmarkCommLineIntf():
+    par=ArgumentParser(description="Benchmark the engines updating the population densities")
+    par.add_argument("--width",type=int,default=2000,help="Width of the random landscape")
+    par.add_argument("--height",type=int,default=2000,help="Height of the random landscape")
+    par.add_argument("--time-steps",type=int,default=16,help="Number of time steps per engine")
+    par.add_argument("--engines",type=str,nargs="+",default=[engine for engine in ENGINES if engine != "loop"],
+                        choices=ENGINES,help="Engines to benchmark")
+    par.add_argument("--threads",type=int,default=None,help="Number of threads of the threaded and blocked engines")
+    par.add_argument("--block-steps",type=int,nargs="+",default=[4, 8, 16],help="Block steps of the blocked engine")
+    args=par.parse_args()
+
+    landscape, neighbours = create_random_landscape(args.width, args.height, 0.8, 0)
+    mice = np.zeros(landscape.shape)
+    mice[1:-1, 1:-1] = np.random.default_rng(1).uniform(0, 5.0, (args.height, args.width)) * landscape[1:-1, 1:-1]
+    foxes = np.zeros(landscape.shape)
+    foxes[1:-1, 1:-1] = np.random.default_rng(2).uniform(0, 5.0, (args.height, args.width)) * landscape[1:-1, 1:-1]
+    print("Landscape {} x {}, {:.1f} MB per density array".format(args.width, args.height, mice.nbytes / 2**20))
+
+    configurations = []
+    for engine in args.engines:
+        for block_steps in (args.block_steps if engine == "blocked" else [1]):
+            configurations.append(("{} (block steps {})".format(engine, block_steps) if engine == "blocked" else engine,
+                                   create_advance_function(engine, args.threads, block_steps)))
+    results = {}
+    for name, advance_function in configurations:
+        start = time.perf_counter()
+        final_mice, _, final_foxes, _ = advance_function(args.time_steps, 0.1, 0.05, 0.2, 0.03, 0.09, 0.2, 0.5,
+                                                         args.width, args.height, landscape, neighbours,
+                                                         mice.copy(), mice.copy(), foxes.copy(), foxes.copy())
+        elapsed = time.perf_counter() - start
+        results[name] = (final_mice, final_foxes)
+        identical = all(np.array_equal(final_mice, other[0]) and np.array_equal(final_foxes, other[1])
+                        for other in results.values())
+        print("{:<26} {:8.1f} ms per time step{}".format(name, 1000 * elapsed / args.time_steps,
+                                                         "" if identical else "  (results differ!)"))
+
+if __name__ == "__main__":
+    benchmarkCommLineIntf()
@@ -0,0 +1,31 @@
+'''Client of the simulation daemon.
+
+Takes the same parameters as `predator_prey.simulate_predator_prey` and runs the simulation on a
+running `predator_prey.daemon`, logging the averages as they are streamed back.
+'''
+import logging
+import os
+from predator_prey.validate_arguments import *
+from predator_prey.logging_config import configure_logging
+from predator_prey.simulate_predator_prey import create_argument_parser
+from predator_prey.daemon import DEFAULT_SOCKET_PATH, submit_simulation
+
+logger = logging.getLogger("predator_prey.client")
+
+def clientCommLineIntf():
+    par=create_argument_parser()
+    par.add_argument("--socket",type=str,default=DEFAULT_SOCKET_PATH,help="Path of the simulation daemon's Unix socket")
+    args=par.parse_args()
+    configure_logging(args.log_level, args.quiet, args.progress_file, args.progress_interval)
+
+    validate_arguments(args) # the landscape file is validated by the daemon
+
+    parameters = vars(args)
+    socket_path = parameters.pop("socket")
+    parameters["landscape_file"] = os.path.abspath(args.landscape_file)
+    for event in submit_simulation(parameters, socket_path):
+        logger.info("Averages. Timestep: %d Time (s): %.1f Mice: %.17f Foxes: %.17f", event["timestep"],
+                    event["time"], event["mice"], event["foxes"], extra={"event": event})
+
+if __name__ == "__main__":
+    clientCommLineIntf()
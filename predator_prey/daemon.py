@@ -0,0 +1,298 @@
+'''Local simulation daemon.
+
+Run requests, in the parameter schema of the simulation's command line, are received on a Unix
+socket and queued onto pre-warmed worker processes. The averages of each run are streamed back
+to the client as JSON lines while they are produced.
+'''
+from argparse import ArgumentParser, _AppendAction
+from collections import OrderedDict
+from multiprocessing import Process, Queue, SimpleQueue
+import itertools
+import json
+import os
+import queue
+import socket
+import socketserver
+import tempfile
+import threading
+from predator_prey.validate_arguments import *
+from predator_prey.helper_functions import *
+from predator_prey.logging_config import LOG_LEVELS, configure_logging
+from predator_prey.simulate_predator_prey import create_argument_parser, run_simulation_from_arguments
+
+DEFAULT_SOCKET_PATH = os.path.join(tempfile.gettempdir(), "predator_prey.sock")
+
+# Number of seconds between two checks that the worker of a job is still alive
+WORKER_POLL_INTERVAL = 1.0
+
+# Parameters holding paths, which are relative to the working directory of a run request
+PATH_PARAMETERS = ["landscape_file", "snapshot_directory", "cache_directory", "landscape_cache_directory",
+                   "tile_directory", "landscape_changes", "out_of_core"]
+
+def load_cached_landscape(landscape_cache, landscape_file, cache_size):
+    """
+    Load a landscape, reusing the landscape data of recently used files.
+
+    Files are validated when they are first loaded. The least recently used landscape is
+    evicted once more than `cache_size` landscapes are cached.
+
+    Args:
+        landscape_cache (collections.OrderedDict): The cached landscape data, least recently used first.
+        landscape_file (str): The path to the input landscape file.
+        cache_size (int): The maximum number of cached landscapes.
+
+    Returns:
+        tuple: The landscape data, as returned by `load_landscape`.
+    """
+    if not os.path.exists(landscape_file):
+        raise FileNotFoundError('The file {} does not exist.'.format(landscape_file))
+    status = os.stat(landscape_file)
+    key = (os.path.realpath(landscape_file), status.st_mtime_ns, status.st_size)
+    if key in landscape_cache:
+        landscape_cache.move_to_end(key)
+        return landscape_cache[key]
+
+    validate_input_file_argument(landscape_file)
+    landscape_data = load_landscape(landscape_file)
+    landscape_cache[key] = landscape_data
+    while len(landscape_cache) > cache_size:
+        landscape_cache.popitem(last=False)
+    return landscape_data
+
+def raise_argument_error(message):
+    """Raise the error of a parser as a `ValueError`, instead of exiting."""
+    raise ValueError(message)
+
+def create_simulation_arguments(parameters, working_directory=None):
+    """
+    Create the simulation arguments of a run request, filling in the command-line defaults.
+
+    The parameters are parsed by the parser of the command line, so they are converted and
+    checked as the options would be.
+
+    Args:
+        parameters (dict): The requested parameters, keyed by the destination names of the
+            command-line options (e.g. 'birth_mice', 'landscape_file').
+        working_directory (str): If given, the directory against which relative paths of
+            `PATH_PARAMETERS` are resolved.
+
+    Raises:
+        ValueError: If the landscape file is missing, a parameter is unknown or a value is invalid
+            for its option.
+
+    Returns:
+        argparse.Namespace: The simulation arguments.
+    """
+    if "landscape_file" not in parameters:
+        raise ValueError("A run request must contain a landscape file")
+    par = create_argument_parser()
+    par.error = raise_argument_error
+    actions = {action.dest: action for action in par._actions if action.option_strings}
+    arguments = []
+    for name, value in parameters.items():
+        if name not in actions:
+            raise ValueError("Unknown simulation parameter: {}".format(name))
+        action = actions[name]
+        option = [option_string for option_string in action.option_strings if option_string.startswith("--")][0]
+        if action.nargs == 0:
+            if value not in (True, False):
+                raise ValueError("argument {}: expected true or false".format(option))
+            if value:
+                arguments.append(option)
+            continue
+        if value is None:
+            continue
+        for item in value if isinstance(action, _AppendAction) else [value]:
+            # Lists, e.g. of the rates of the sensitivities or of a region, are given comma-separated
+            arguments += [option, ",".join(str(part) for part in item) if isinstance(item, list) else str(item)]
+    args = par.parse_args(arguments)
+    if working_directory is not None:
+        for name in PATH_PARAMETERS:
+            if getattr(args, name) is not None:
+                setattr(args, name, os.path.join(working_directory, getattr(args, name)))
+    return args
+
+def run_worker(job_queue, event_queue, cache_size):
+    """
+    Run simulations from the job queue until a `None` job is received.
+
+    The output files of a job are written to its working directory, without changing the
+    directory of the worker.
+
+    Args:
+        job_queue (multiprocessing.Queue): The queue of (job id, parameters, working directory) jobs.
+        event_queue (multiprocessing.SimpleQueue): The queue on which (job id, event) pairs are reported.
+        cache_size (int): The maximum number of landscapes cached by the worker.
+
+    Returns:
+        None
+    """
+    landscape_cache = OrderedDict()
+    for job in iter(job_queue.get, None):
+        job_id, parameters, working_directory = job
+        # Tells the server which worker to watch while the job runs
+        event_queue.put((job_id, {"event": "started", "worker": os.getpid()}))
+
+        def report_averages(time_step_index, time_in_secs, average_mice_density, average_foxes_density):
+            event_queue.put((job_id, {"event": "averages", "timestep": time_step_index, "time": time_in_secs,
+                                      "mice": float(average_mice_density), "foxes": float(average_foxes_density)}))
+
+        try:
+            args = create_simulation_arguments(parameters, working_directory)
+            validate_arguments(args)
+            landscape_data = load_cached_landscape(landscape_cache, args.landscape_file, cache_size)
+            run_simulation_from_arguments(args, working_directory, landscape_data=landscape_data,
+                                          averages_callback=report_averages)
+            event_queue.put((job_id, {"event": "done"}))
+        except Exception as error:
+            event_queue.put((job_id, {"event": "error", "message": str(error)}))
+
+class SimulationRequestHandler(socketserver.StreamRequestHandler):
+    """Queue the run request received on a connection and stream its events back."""
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            parameters = request["parameters"]
+            working_directory = request.get("working_directory", os.getcwd())
+        except (ValueError, KeyError, TypeError):
+            self.send_event({"event": "error", "message": "Invalid run request"})
+            return
+
+        job_id, events = self.server.register_job()
+        try:
+            self.server.job_queue.put((job_id, parameters, working_directory))
+            worker_pid = None
+            while True:
+                try:
+                    event = events.get(timeout=WORKER_POLL_INTERVAL)
+                except queue.Empty:
+                    # A worker killed mid-job (e.g. out of memory) never reports the end of the job
+                    if not self.server.is_worker_alive(worker_pid):
+                        self.send_event({"event": "error",
+                                         "message": "The worker process running the job exited unexpectedly"})
+                        break
+                    continue
+                if event["event"] == "started":
+                    worker_pid = event["worker"]
+                    continue
+                self.send_event(event)
+                if event["event"] in ("done", "error"):
+                    break
+        finally:
+            self.server.unregister_job(job_id)
+
+    def send_event(self, event):
+        self.wfile.write((json.dumps(event) + "\n").encode("utf-8"))
+        self.wfile.flush()
+
+class SimulationServer(socketserver.ThreadingUnixStreamServer):
+    """A Unix socket server dispatching run requests to a pool of worker processes."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, workers, cache_size):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        self.job_queue = Queue()
+        # Events are written without a feeder thread, so a worker dying between two events
+        # cannot leave the queue locked
+        self.event_queue = SimpleQueue()
+        self.job_ids = itertools.count()
+        self.job_events = {}
+        self.lock = threading.Lock()
+        # Start (and so pre-warm) the workers before any server thread exists
+        self.workers = [Process(target=run_worker, args=(self.job_queue, self.event_queue, cache_size), daemon=True)
+                        for _ in range(workers)]
+        for worker in self.workers:
+            worker.start()
+        self.dispatcher = threading.Thread(target=self.dispatch_events, daemon=True)
+        self.dispatcher.start()
+        super().__init__(socket_path, SimulationRequestHandler)
+
+    def register_job(self):
+        with self.lock:
+            job_id = next(self.job_ids)
+            self.job_events[job_id] = queue.Queue()
+            return job_id, self.job_events[job_id]
+
+    def unregister_job(self, job_id):
+        with self.lock:
+            self.job_events.pop(job_id, None)
+
+    def is_worker_alive(self, pid=None):
+        """Check whether the worker of the given process id, or any worker if None, is alive."""
+        return any(worker.is_alive() for worker in self.workers if pid is None or worker.pid == pid)
+
+    def dispatch_events(self):
+        for job_id, event in iter(self.event_queue.get, None):
+            with self.lock:
+                events = self.job_events.get(job_id)
+            if events is not None:
+                events.put(event)
+
+    def server_close(self):
+        super().server_close()
+        for _ in self.workers:
+            self.job_queue.put(None)
+        for worker in self.workers:
+            worker.join()
+        self.event_queue.put(None)
+        self.dispatcher.join()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+def submit_simulation(parameters, socket_path=DEFAULT_SOCKET_PATH, working_directory=None):
+    """
+    Submit a run request to a simulation daemon and yield its averages as they are produced.
+
+    Args:
+        parameters (dict): The simulation parameters, keyed by the destination names of the command-line options.
+        socket_path (str): The path of the daemon's Unix socket.
+        working_directory (str): The directory in which the run writes its output files. Defaults to
+            the current directory.
+
+    Raises:
+        RuntimeError: If the daemon reports an error for the run.
+
+    Yields:
+        dict: The averages events of the run, with 'timestep', 'time', 'mice' and 'foxes' entries.
+    """
+    request = {"parameters": parameters, "working_directory": working_directory or os.getcwd()}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        connection.sendall((json.dumps(request) + "\n").encode("utf-8"))
+        with connection.makefile("r", encoding="utf-8") as events:
+            for line in events:
+                event = json.loads(line)
+                if event["event"] == "error":
+                    raise RuntimeError(event["message"])
+                if event["event"] == "done":
+                    return
+                yield event
+    raise RuntimeError("The simulation daemon closed the connection before the run finished")
+
+def daemonCommLineIntf():
+    par=ArgumentParser(description="Serve predator-prey simulation runs from pre-warmed worker processes")
+    par.add_argument("-s","--socket",type=str,default=DEFAULT_SOCKET_PATH,help="Path of the Unix socket to listen on")
+    par.add_argument("-w","--workers",type=int,default=os.cpu_count(),help="Number of worker processes")
+    par.add_argument("-c","--landscape-cache-size",type=int,default=8,
+                        help="Number of recently used landscapes kept in memory by each worker")
+    par.add_argument("--log-level",type=str,default="INFO",choices=LOG_LEVELS,help="Level of the console log")
+    par.add_argument("-q","--quiet",action="store_true",help="Only log warnings and errors")
+    args=par.parse_args()
+    configure_logging(args.log_level, args.quiet)
+
+    if args.workers <= 0:
+        raise ValueError("Number of worker processes must be a positive integer greater than 0")
+    if args.landscape_cache_size <= 0:
+        raise ValueError("Landscape cache size must be a positive integer greater than 0")
+
+    with SimulationServer(args.socket, args.workers, args.landscape_cache_size) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == "__main__":
+    daemonCommLineIntf()
@@ -0,0 +1,443 @@
+'''Alternative engines for updating the population densities.
+
+Every engine gives bit-identical results: the vectorized kernel evaluates the same floating point
+operations, in the same order, as `update_population_density` does for each land square.
+Single-step engines have the signature of `update_population_densities`; `create_advance_function`
+turns any engine into a function advancing the densities by several time steps at once.
+'''
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import atexit
+import os
+import threading
+import numpy as np
+from predator_prey.helper_functions import update_population_densities
+
+STEP_ENGINES = ["loop", "vectorized", "threaded"]
+ENGINES = STEP_ENGINES + ["blocked"]
+
+# Number of bytes of the rows of a band (and its halo) of the blocked engine that should fit into the CPU cache
+BLOCK_CACHE_BYTES = 1 << 20
+
+# Maximum number of thread pools kept warm; beyond it the least recently used pool is shut down
+MAX_THREAD_POOLS = 4
+
+# Thread pools by number of threads, kept warm between time steps and runs, least recently used first
+thread_pools = OrderedDict()
+
+def create_workspace(rows, width):
+    """
+    Allocate the working arrays of `update_population_densities_rows` for bands of up to `rows` rows.
+
+    Args:
+        rows (int): The maximum number of rows of a band.
+        width (int): The width of the landscape.
+
+    Returns:
+        tuple: Three float arrays and a boolean array of shape (rows, width).
+    """
+    return (np.empty((rows, width)), np.empty((rows, width)), np.empty((rows, width)), np.empty((rows, width), bool))
+
+def calculate_workspace_bytes(rows, width):
+    """
+    Calculate the size of the working arrays allocated by `create_workspace`.
+
+    Args:
+        rows (int): The maximum number of rows of a band.
+        width (int): The width of the landscape.
+
+    Returns:
+        int: The number of bytes.
+    """
+    return rows * width * (3 * 8 + 1)
+
+def update_population_densities_rows(mice_birth_rate, mice_death_rate, mice_diffusion_rate, foxes_birth_rate,
+                                     foxes_death_rate, foxes_diffusion_rate, time_step_size, width, first_row,
+                                     last_row, landscape, neighbouring_land_count, initial_mice_densities,
+                                     new_mice_densities, initial_foxes_densities, new_foxes_densities, workspace=None):
+    """
+    Update population densities for mice and foxes in the land squares of a band of rows.
+
+    The band is read from the initial densities together with its one-cell halo and only
+    its own rows of the new densities are written.
+
+    Args:
+        mice_birth_rate (float): The birth rate of mice.
+        mice_death_rate (float): The death rate of mice.
+        mice_diffusion_rate (float): The diffusion rate of mice.
+        foxes_birth_rate (float): The birth rate of foxes.
+        foxes_death_rate (float): The death rate of foxes.
+        foxes_diffusion_rate (float): The diffusion rate of foxes.
+        time_step_size (float): The time step size.
+        width (int): The width of the landscape.
+        first_row (int): The first row of the band (in halo coordinates, at least 1).
+        last_row (int): The row after the last row of the band (at most height + 1).
+        landscape (numpy.ndarray): A 2D array representing the landscape.
+        neighbouring_land_count (numpy.ndarray): A 2D array representing land neighbors count for each land square.
+        initial_mice_densities (numpy.ndarray): A 2D array representing initial mice densities.
+        new_mice_densities (numpy.ndarray): A 2D array representing new mice population densities.
+        initial_foxes_densities (numpy.ndarray): A 2D array representing initial foxes densities.
+        new_foxes_densities (numpy.ndarray): A 2D array representing new foxes population densities.
+        workspace (tuple): Working arrays from `create_workspace` with at least as many rows as the band,
+            reused between calls. If None, they are allocated for this call.
+
+    Returns:
+        None
+    """
+    rows = slice(first_row, last_row)
+    columns = slice(1, width + 1)
+    if workspace is None:
+        workspace = create_workspace(last_row - first_row, width)
+    total, term, other_term, clamped = [array[:last_row - first_row] for array in workspace]
+    land = landscape[rows, columns]
+    if land.dtype != bool:
+        land = land != 0
+    land_neighbours = neighbouring_land_count[rows, columns]
+    mice = initial_mice_densities[rows, columns]
+    foxes = initial_foxes_densities[rows, columns]
+
+    for densities, new_densities, birth_rate, death_rate, diffusion_rate, species in (
+            (initial_mice_densities, new_mice_densities, mice_birth_rate, mice_death_rate, mice_diffusion_rate, "mice"),
+            (initial_foxes_densities, new_foxes_densities, foxes_birth_rate, foxes_death_rate, foxes_diffusion_rate, "foxes")):
+        current = densities[rows, columns]
+        # Neighbours are summed in the order of calculate_total_neighbours: north, south, west, east
+        np.add(densities[first_row - 1:last_row - 1, columns], densities[first_row + 1:last_row + 1, columns], out=total)
+        np.add(total, densities[rows, 0:width], out=total)
+        np.add(total, densities[rows, 2:width + 2], out=total)
+        # Migration term: diffusion_rate * (neighbouring densities - land neighbours * density)
+        np.multiply(land_neighbours, current, out=term)
+        np.subtract(total, term, out=total)
+        np.multiply(diffusion_rate, total, out=total)
+        if species == "mice":
+            # birth_rate * mice - death_rate * mice * foxes
+            np.multiply(birth_rate, mice, out=term)
+            np.multiply(death_rate, mice, out=other_term)
+            np.multiply(other_term, foxes, out=other_term)
+        else:
+            # birth_rate * mice * foxes - death_rate * foxes
+            np.multiply(birth_rate, mice, out=term)
+            np.multiply(term, foxes, out=term)
+            np.multiply(death_rate, foxes, out=other_term)
+        np.subtract(term, other_term, out=term)
+        # density + time_step_size * ((birth_term - death_term) + migration_term)
+        np.add(term, total, out=term)
+        np.multiply(time_step_size, term, out=term)
+        np.add(current, term, out=term)
+        # Densities are clamped at 0 as by max(0, density)
+        np.greater(term, 0, out=clamped)
+        np.logical_not(clamped, out=clamped)
+        np.copyto(term, 0.0, where=clamped)
+        np.copyto(new_densities[rows, columns], term, where=land)
+
+def update_population_densities_vectorized(mice_birth_rate, mice_death_rate, mice_diffusion_rate, foxes_birth_rate,
+                                           foxes_death_rate, foxes_diffusion_rate, time_step_size, width, height,
+                                           landscape, neighbouring_land_count, initial_mice_densities,
+                                           new_mice_densities, initial_foxes_densities, new_foxes_densities):
+    """
+    Update population densities for mice and foxes in land squares of the landscape, with array operations.
+
+    Takes the same arguments as `update_population_densities`.
+
+    Returns:
+        None
+    """
+    update_population_densities_rows(mice_birth_rate, mice_death_rate, mice_diffusion_rate, foxes_birth_rate,
+                                     foxes_death_rate, foxes_diffusion_rate, time_step_size, width, 1, height + 1,
+                                     landscape, neighbouring_land_count, initial_mice_densities, new_mice_densities,
+                                     initial_foxes_densities, new_foxes_densities)
+
+def get_workspace(workspaces, key, rows, width):
+    """
+    Get reusable working arrays for bands of up to `rows` rows, allocating them on first use.
+
+    Args:
+        workspaces (dict): The working arrays allocated so far, by key.
+        key: The key of the working arrays, e.g. a band or a thread. Working arrays must not
+            be used by two bands concurrently.
+        rows (int): The maximum number of rows of a band.
+        width (int): The width of the landscape.
+
+    Returns:
+        tuple: The working arrays, as from `create_workspace`.
+    """
+    workspace = workspaces.get(key)
+    if workspace is None or workspace[0].shape[0] < rows or workspace[0].shape[1] != width:
+        workspace = workspaces[key] = create_workspace(rows, width)
+    return workspace
+
+def calculate_row_bands(height, bands):
+    """
+    Split the rows of the landscape into contiguous bands of (almost) equal size.
+
+    Args:
+        height (int): The height of the landscape.
+        bands (int): The number of bands.
+
+    Returns:
+        list: The (first row, last row) of each non-empty band, in halo coordinates.
+    """
+    bands = max(1, min(bands, height))
+    boundaries = [1 + (height * band) // bands for band in range(bands + 1)]
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+def get_thread_pool(threads):
+    """
+    Get the pool with the given number of threads, creating it on first use.
+
+    At most `MAX_THREAD_POOLS` pools are kept, so the least recently used pool is shut down when a
+    pool with yet another number of threads is created. Functions running over several calls
+    should therefore get their pool on each call rather than keep it.
+
+    Args:
+        threads (int): The number of threads.
+
+    Returns:
+        concurrent.futures.ThreadPoolExecutor: The thread pool.
+    """
+    if threads in thread_pools:
+        thread_pools.move_to_end(threads)
+        return thread_pools[threads]
+    pool = thread_pools[threads] = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="predator_prey")
+    while len(thread_pools) > MAX_THREAD_POOLS:
+        # Tasks already submitted to the evicted pool still run to completion
+        thread_pools.popitem(last=False)[1].shutdown(wait=False)
+    return pool
+
+def shutdown_thread_pools():
+    """
+    Shut down all the kept thread pools, waiting for their tasks to finish.
+
+    Returns:
+        None
+    """
+    while thread_pools:
+        thread_pools.popitem()[1].shutdown()
+
+atexit.register(shutdown_thread_pools)
+
+def create_threaded_update_function(threads=None):
+    """
+    Create an engine updating bands of rows concurrently on a pool of threads.
+
+    numpy releases the GIL during array arithmetic, so the bands are updated in parallel
+    within one process, sharing the density arrays.
+
+    Args:
+        threads (int): The number of threads, or None to use one per core.
+
+    Returns:
+        callable: A function with the signature of `update_population_densities`.
+    """
+    threads = threads or os.cpu_count()
+    workspaces = {}
+
+    def update_population_densities_threaded(mice_birth_rate, mice_death_rate, mice_diffusion_rate, foxes_birth_rate,
+                                             foxes_death_rate, foxes_diffusion_rate, time_step_size, width, height,
+                                             landscape, neighbouring_land_count, initial_mice_densities,
+                                             new_mice_densities, initial_foxes_densities, new_foxes_densities):
+        pool = get_thread_pool(threads)
+        futures = [pool.submit(update_population_densities_rows, mice_birth_rate, mice_death_rate,
+                               mice_diffusion_rate, foxes_birth_rate, foxes_death_rate, foxes_diffusion_rate,
+                               time_step_size, width, first_row, last_row, landscape, neighbouring_land_count,
+                               initial_mice_densities, new_mice_densities, initial_foxes_densities,
+                               new_foxes_densities, get_workspace(workspaces, band, last_row - first_row, width))
+                   for band, (first_row, last_row) in enumerate(calculate_row_bands(height, threads))]
+        for future in futures:
+            future.result()
+
+    return update_population_densities_threaded
+
+def create_update_function(engine="loop", threads=None):
+    """
+    Get the function that updates the population densities with the given engine.
+
+    Args:
+        engine (str): 'loop' (the reference implementation), 'vectorized' or 'threaded'.
+        threads (int): The number of threads of the 'threaded' engine, or None to use one per core.
+
+    Raises:
+        ValueError: If the engine is unknown.
+
+    Returns:
+        callable: A function with the signature of `update_population_densities`.
+    """
+    if engine == "loop":
+        return update_population_densities
+    if engine == "vectorized":
+        workspaces = {}
+
+        def update_population_densities_in_place(mice_birth_rate, mice_death_rate, mice_diffusion_rate,
+                                                 foxes_birth_rate, foxes_death_rate, foxes_diffusion_rate,
+                                                 time_step_size, width, height, landscape, neighbouring_land_count,
+                                                 initial_mice_densities, new_mice_densities, initial_foxes_densities,
+                                                 new_foxes_densities):
+            update_population_densities_rows(mice_birth_rate, mice_death_rate, mice_diffusion_rate, foxes_birth_rate,
+                                             foxes_death_rate, foxes_diffusion_rate, time_step_size, width, 1,
+                                             height + 1, landscape, neighbouring_land_count, initial_mice_densities,
+                                             new_mice_densities, initial_foxes_densities, new_foxes_densities,
+                                             get_workspace(workspaces, None, height, width))
+        return update_population_densities_in_place
+    if engine == "threaded":
+        return create_threaded_update_function(threads)
+    raise ValueError("Engine must be one of: {}".format(", ".join(STEP_ENGINES)))
+
+def calculate_band_rows(width, block_steps):
+    """
+    Calculate the number of rows per band of the blocked engine for a band and its halo to fit into the CPU cache.
+
+    Args:
+        width (int): The width of the landscape.
+        block_steps (int): The maximum number of time steps a band is advanced by at once.
+
+    Returns:
+        int: The number of rows per band.
+    """
+    # Two density arrays for each species, plus working arrays of about the same size
+    return max(4 * block_steps, BLOCK_CACHE_BYTES // (12 * 8 * (width + 2)) - 2 * block_steps)
+
+def estimate_engine_memory(engine, width, height, threads=None, block_steps=8, band_rows=None):
+    """
+    Estimate the working memory of an engine, in addition to the density arrays of the simulation.
+
+    Args:
+        engine (str): One of `ENGINES`.
+        width (int): The width of the landscape.
+        height (int): The height of the landscape.
+        threads (int): The number of threads, as for `create_advance_function`.
+        block_steps (int): The maximum number of time steps the 'blocked' engine advances a band by at once.
+        band_rows (int): The number of rows per band of the 'blocked' engine, or None for the default.
+
+    Returns:
+        int: The estimated number of bytes.
+    """
+    if engine in ("vectorized", "threaded"):
+        return calculate_workspace_bytes(height, width)
+    if engine == "blocked":
+        slab_rows = min(height, band_rows or calculate_band_rows(width, block_steps)) + 2 * block_steps + 2
+        per_thread = 4 * 8 * slab_rows * (width + 2) + calculate_workspace_bytes(slab_rows, width)
+        return per_thread * (threads if threads is not None and threads > 1 else 1)
+    return 0
+
+def advance_population_densities_blocked(time_steps, block_steps, band_rows, pool, workspaces, mice_birth_rate,
+                                         mice_death_rate, mice_diffusion_rate, foxes_birth_rate, foxes_death_rate, foxes_diffusion_rate,
+                                         time_step_size, width, height, landscape, neighbouring_land_count,
+                                         initial_mice_densities, new_mice_densities, initial_foxes_densities,
+                                         new_foxes_densities):
+    """
+    Advance population densities by several time steps, a band of rows at a time.
+
+    Each band is copied together with a halo of `block_steps` rows of the current densities and
+    advanced by up to `block_steps` time steps while it is in the CPU cache. The halo rows are
+    advanced too (overlapping the neighbouring bands), and the errors that creep in from the
+    halo's edge, one row per time step, never reach the band itself. Only the band is written back.
+
+    Args:
+        time_steps (int): The number of time steps to advance by.
+        block_steps (int): The maximum number of time steps a band is advanced by at once.
+        band_rows (int): The number of rows of each band.
+        pool (concurrent.futures.Executor): A pool on which the bands are advanced concurrently, or None.
+        workspaces (dict): The reusable copies of the bands and working arrays of each thread.
+        mice_birth_rate, ..., new_foxes_densities: As for `update_population_densities`.
+
+    Returns:
+        tuple: The current mice densities, the spare mice densities array, the current foxes densities
+            and the spare foxes densities array after the last time step.
+    """
+    def advance_band(first_row, last_row, steps):
+        first_slab_row = max(0, first_row - steps)
+        last_slab_row = min(height + 2, last_row + steps)
+        slab = slice(first_slab_row, last_slab_row)
+        slab_rows = last_slab_row - first_slab_row
+        # Copies of the band and its halo, and working arrays, are reused by each thread
+        thread = threading.get_ident()
+        copies = workspaces.get(thread)
+        if copies is None or copies[0].shape[0] < slab_rows or copies[0].shape[1] != width + 2:
+            copies = workspaces[thread] = tuple(np.empty((slab_rows, width + 2)) for _ in range(4))
+        mice, new_mice, foxes, new_foxes = [copy[:slab_rows] for copy in copies]
+        for copy in (mice, new_mice):
+            np.copyto(copy, initial_mice_densities[slab])
+        for copy in (foxes, new_foxes):
+            np.copyto(copy, initial_foxes_densities[slab])
+        workspace = get_workspace(workspaces, ("kernel", thread), slab_rows, width)
+        slab_landscape, slab_neighbours = landscape[slab], neighbouring_land_count[slab]
+        # All rows of the slab but its first and last (the landscape's halo or the edge of the band's halo)
+        for _ in range(steps):
+            update_population_densities_rows(mice_birth_rate, mice_death_rate, mice_diffusion_rate,
+                                             foxes_birth_rate, foxes_death_rate, foxes_diffusion_rate,
+                                             time_step_size, width, 1, last_slab_row - first_slab_row - 1,
+                                             slab_landscape, slab_neighbours, mice, new_mice, foxes, new_foxes,
+                                             workspace)
+            mice, new_mice = new_mice, mice
+            foxes, new_foxes = new_foxes, foxes
+        band = slice(first_row - first_slab_row, last_row - first_slab_row)
+        new_mice_densities[first_row:last_row] = mice[band]
+        new_foxes_densities[first_row:last_row] = foxes[band]
+
+    bands = [(first_row, min(first_row + band_rows, height + 1)) for first_row in range(1, height + 1, band_rows)]
+    while time_steps > 0:
+        steps = min(block_steps, time_steps)
+        if pool is None:
+            for first_row, last_row in bands:
+                advance_band(first_row, last_row, steps)
+        else:
+            for future in [pool.submit(advance_band, first_row, last_row, steps) for first_row, last_row in bands]:
+                future.result()
+        initial_mice_densities, new_mice_densities = new_mice_densities, initial_mice_densities
+        initial_foxes_densities, new_foxes_densities = new_foxes_densities, initial_foxes_densities
+        time_steps -= steps
+    return initial_mice_densities, new_mice_densities, initial_foxes_densities, new_foxes_densities
+
+def create_advance_function(engine="loop", threads=None, block_steps=8, band_rows=None):
+    """
+    Get a function advancing the population densities by a number of time steps with the given engine.
+
+    The returned function takes the number of time steps followed by the arguments of
+    `update_population_densities`, and returns the current mice densities, the spare mice densities
+    array, the current foxes densities and the spare foxes densities array after the last time step.
+
+    Args:
+        engine (str): One of `ENGINES`. The 'blocked' engine advances bands of rows by several time
+            steps at once (temporal blocking) for cache locality on large landscapes.
+        threads (int): The number of threads of the 'threaded' engine, or None to use one per core.
+            The 'blocked' engine only uses threads if given a number of threads greater than 1.
+        block_steps (int): The maximum number of time steps the 'blocked' engine advances a band by at once.
+        band_rows (int): The number of rows per band of the 'blocked' engine, or None to fit a band
+            and its halo into `BLOCK_CACHE_BYTES`.
+
+    Raises:
+        ValueError: If the engine is unknown.
+
+    Returns:
+        callable: The function advancing the population densities.
+    """
+    if engine == "blocked":
+        workspaces = {}
+
+        def advance_population_densities(time_steps, mice_birth_rate, mice_death_rate, mice_diffusion_rate,
+                                         foxes_birth_rate, foxes_death_rate, foxes_diffusion_rate, time_step_size,
+                                         width, height, *arrays):
+            rows = band_rows or calculate_band_rows(width, block_steps)
+            pool = get_thread_pool(threads) if threads is not None and threads > 1 else None
+            return advance_population_densities_blocked(time_steps, block_steps, rows, pool, workspaces, mice_birth_rate,
+                                                        mice_death_rate, mice_diffusion_rate, foxes_birth_rate,
+                                                        foxes_death_rate, foxes_diffusion_rate, time_step_size,
+                                                        width, height, *arrays)
+        return advance_population_densities
+
+    update_function = create_update_function(engine, threads)
+
+    def advance_population_densities(time_steps, mice_birth_rate, mice_death_rate, mice_diffusion_rate,
+                                     foxes_birth_rate, foxes_death_rate, foxes_diffusion_rate, time_step_size, width,
+                                     height, landscape, neighbouring_land_count, initial_mice_densities,
+                                     new_mice_densities, initial_foxes_densities, new_foxes_densities):
+        for _ in range(time_steps):
+            update_function(mice_birth_rate, mice_death_rate, mice_diffusion_rate, foxes_birth_rate,
+                            foxes_death_rate, foxes_diffusion_rate, time_step_size, width, height, landscape,
+                            neighbouring_land_count, initial_mice_densities, new_mice_densities,
+                            initial_foxes_densities, new_foxes_densities)
+            # Swap initial and new population densities for next iteration.
+            initial_mice_densities, new_mice_densities = new_mice_densities, initial_mice_densities
+            initial_foxes_densities, new_foxes_densities = new_foxes_densities, initial_foxes_densities
+        return initial_mice_densities, new_mice_densities, initial_foxes_densities, new_foxes_densities
+
+    return advance_population_densities
@@ -0,0 +1,278 @@
+'''Streaming ensemble statistics of the predator-prey simulation.
+
+The same configuration is run with a set of mouse and fox seed pairs, one member after the other. At every output
+step each member's densities are merged into per-square running mean, variance (Welford's
+algorithm), minimum and maximum accumulators, kept in memory-mapped files, so that no member's
+output is stored and the memory use does not depend on the number of members.
+'''
+import logging
+import os
+import numpy as np
+from predator_prey.validate_arguments import *
+from predator_prey.helper_functions import *
+from predator_prey.engines import create_advance_function
+from predator_prey.logging_config import configure_logging
+from predator_prey.simulate_predator_prey import create_argument_parser
+from predator_prey.landscape_cache import load_compiled_landscape
+
+logger = logging.getLogger("predator_prey.ensemble")
+
+SPECIES = ("mice", "foxes")
+STATISTICS = ("mean", "variance", "min", "max")
+
+# Options of the simulation parser for outputs and modes that ensemble runs do not support. --no-maps is
+# accepted, ensemble runs write no maps anyway.
+UNSUPPORTED_OPTIONS = ["snapshot_directory", "cache_directory", "cache_size", "max_memory", "output_threshold",
+                       "output_criterion", "min_output_interval", "max_output_interval", "region",
+                       "region_pattern", "overview_factor", "overview_pattern", "tile_directory", "tile_size",
+                       "sensitivities", "landscape_changes", "flooded_density_policy", "shared_frames",
+                       "shared_frame_slots", "out_of_core"]
+
+def parse_seed_pairs(text):
+    """
+    Parse a comma-separated list of seed pairs given as 'MOUSE_SEED:FOX_SEED'.
+
+    Args:
+        text (str): The seed pairs, e.g. '1:5,7:3'.
+
+    Raises:
+        ValueError: If a pair is not two integers separated by ':'.
+
+    Returns:
+        list: The (mouse seed, fox seed) of each member.
+    """
+    seed_pairs = []
+    for pair in text.split(","):
+        mouse_seed, fox_seed = [int(value) for value in pair.split(":")]
+        seed_pairs.append((mouse_seed, fox_seed))
+    return seed_pairs
+
+def load_seed_pairs(seeds_file):
+    """
+    Read the seed pairs of the ensemble members from a file.
+
+    Each line of the file is 'MOUSE_SEED FOX_SEED'. Empty lines and lines starting with '#' are ignored.
+
+    Args:
+        seeds_file (str): The path to the seeds file.
+
+    Raises:
+        ValueError: If a line is not two integers, or the file lists no seed pairs.
+        FileNotFoundError: If the seeds file does not exist.
+
+    Returns:
+        list: The (mouse seed, fox seed) of each member, in the order of the file.
+    """
+    seed_pairs = []
+    with open(seeds_file, "r") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip() or line.lstrip().startswith("#"):
+                continue
+            try:
+                mouse_seed, fox_seed = [int(value) for value in line.split()]
+            except ValueError:
+                raise ValueError("Invalid seed pair on line {}: expected 'MOUSE_SEED FOX_SEED'".format(line_number))
+            seed_pairs.append((mouse_seed, fox_seed))
+    if not seed_pairs:
+        raise ValueError("The seeds file {} lists no seed pairs".format(seeds_file))
+    return seed_pairs
+
+def create_ensemble_accumulators(ensemble_directory, shape):
+    """
+    Create the running statistics accumulators of the density fields of both species.
+
+    Args:
+        ensemble_directory (str): The directory of the memory-mapped accumulators.
+        shape (tuple): The shape of the accumulators: the number of output steps, then the shape
+            of the density arrays.
+
+    Returns:
+        dict: For each species, the (mean, sum of squared differences, minimum, maximum) accumulators.
+    """
+    accumulators = {}
+    for species in SPECIES:
+        arrays = []
+        for statistic, initial_value in (("mean", 0.0), ("m2", 0.0), ("min", np.inf), ("max", -np.inf)):
+            array = np.lib.format.open_memmap(os.path.join(ensemble_directory, "{}_{}.npy".format(species, statistic)),
+                                              mode="w+", dtype=float, shape=shape)
+            if initial_value:
+                array.fill(initial_value)
+            arrays.append(array)
+        accumulators[species] = tuple(arrays)
+    return accumulators
+
+def update_running_statistics(count, mean, m2, minimum, maximum, values):
+    """
+    Merge the values of one more ensemble member into running statistics, in place.
+
+    Args:
+        count (int): The number of members including this one.
+        mean (numpy.ndarray): The running mean.
+        m2 (numpy.ndarray): The running sum of squared differences from the mean.
+        minimum (numpy.ndarray): The running minimum.
+        maximum (numpy.ndarray): The running maximum.
+        values (numpy.ndarray): The values of the member.
+
+    Returns:
+        None
+    """
+    delta = values - mean
+    mean += delta / count
+    m2 += delta * (values - mean)
+    np.minimum(minimum, values, out=minimum)
+    np.maximum(maximum, values, out=maximum)
+
+def calculate_variance(count, m2):
+    """
+    Calculate the sample variance from a running sum of squared differences.
+
+    Args:
+        count (int): The number of members.
+        m2 (numpy.ndarray): The running sum of squared differences from the mean.
+
+    Returns:
+        numpy.ndarray: The sample variance, or zeros for a single member.
+    """
+    return m2 / (count - 1) if count > 1 else np.zeros_like(m2)
+
+def run_ensemble(mice_birth_rate, mice_death_rate, mice_diffusion_rate, foxes_birth_rate,
+        foxes_death_rate, foxes_diffusion_rate, time_step_size, output_time_step,
+        simulation_duration, landscape_file, mouse_seed, fox_seed, members, ensemble_directory,
+        engine="loop", threads=None, block_steps=8, landscape_data=None, seed_pairs=None):
+    """
+    Run an ensemble of simulations and write the statistics of their densities and averages.
+
+    Member i is run with the i-th of `seed_pairs`, or by default with the mouse seed
+    `mouse_seed + i` and the fox seed `fox_seed + i`. The ensemble directory receives, for each
+    species, `<species>_mean.npy`, `<species>_variance.npy`, `<species>_min.npy` and
+    `<species>_max.npy` (each of shape (output steps, height + 2, width + 2)) and averages.csv with
+    the statistics of the members' average densities at each output step.
+
+    Args:
+        mice_birth_rate, ..., fox_seed: As for `run_simulation`.
+        members (int): The number of ensemble members.
+        ensemble_directory (str): The directory in which to write the statistics; created if needed.
+        engine (str): The engine updating the population densities, one of `predator_prey.engines.ENGINES`.
+        threads (int): The number of threads of the engine.
+        block_steps (int): The maximum number of time steps the 'blocked' engine advances a band of rows by at once.
+        landscape_data (tuple): The landscape already loaded with `load_landscape`, or None to load `landscape_file`.
+        seed_pairs (list): The (mouse seed, fox seed) of each member, or None for consecutive seeds
+            from `mouse_seed` and `fox_seed`.
+
+    Raises:
+        ValueError: If `seed_pairs` does not have `members` pairs, or a seed is negative.
+
+    Returns:
+        list: The time step indices of the output steps.
+    """
+    if seed_pairs is None:
+        seed_pairs = [(mouse_seed + member, fox_seed + member) for member in range(members)]
+    elif len(seed_pairs) != members:
+        raise ValueError("Expected {} seed pairs, one per ensemble member, got {}".format(members, len(seed_pairs)))
+    for member_mouse_seed, member_fox_seed in seed_pairs:
+        if member_mouse_seed < 0:
+            raise ValueError("Random seed for initializing mouse densities must be a non-negative integer")
+        if member_fox_seed < 0:
+            raise ValueError("Random seed for initializing fox densities must be a non-negative integer")
+    os.makedirs(ensemble_directory, exist_ok=True)
+    advance_function = create_advance_function(engine, threads, block_steps)
+    if landscape_data is None:
+        landscape_data = load_landscape(landscape_file)
+    width, height, width_with_halo, height_with_halo, landscape, num_lands, neighbouring_land_count = landscape_data
+    total_time_steps = int(simulation_duration / time_step_size)
+    output_time_step_indices = list(range(0, total_time_steps, output_time_step))
+    accumulators = create_ensemble_accumulators(ensemble_directory,
+                                                (len(output_time_step_indices), height_with_halo, width_with_halo))
+    # Running statistics of the average densities: mean, m2, min and max of each species at each output step
+    averages = np.zeros((4, len(output_time_step_indices), len(SPECIES)))
+    averages[2], averages[3] = np.inf, -np.inf
+
+    for member, (member_mouse_seed, member_fox_seed) in enumerate(seed_pairs):
+        logger.info("Ensemble member %d of %d (mouse seed %d, fox seed %d)", member + 1, members,
+                    member_mouse_seed, member_fox_seed,
+                    extra={"event": {"event": "member", "member": member + 1, "members": members}})
+        mice_densities, new_mice_densities, _ = initialize_arrays(member_mouse_seed, width, height, landscape,
+                                                                  colours=False)
+        foxes_densities, new_foxes_densities, _ = initialize_arrays(member_fox_seed, width, height, landscape,
+                                                                    colours=False)
+        time_step_index = 0
+        for output, next_output_time_step_index in enumerate(output_time_step_indices):
+            mice_densities, new_mice_densities, foxes_densities, new_foxes_densities = \
+                advance_function(next_output_time_step_index - time_step_index, mice_birth_rate, mice_death_rate,
+                                 mice_diffusion_rate, foxes_birth_rate, foxes_death_rate, foxes_diffusion_rate,
+                                 time_step_size, width, height, landscape, neighbouring_land_count,
+                                 mice_densities, new_mice_densities, foxes_densities, new_foxes_densities)
+            time_step_index = next_output_time_step_index
+            for species, densities in zip(SPECIES, (mice_densities, foxes_densities)):
+                mean, m2, minimum, maximum = accumulators[species]
+                update_running_statistics(member + 1, mean[output], m2[output], minimum[output], maximum[output],
+                                          densities)
+            update_running_statistics(member + 1, averages[0, output], averages[1, output], averages[2, output],
+                                      averages[3, output],
+                                      np.array([calculate_average_density(num_lands, mice_densities),
+                                                calculate_average_density(num_lands, foxes_densities)]))
+
+    # Replace the sums of squared differences by the variances
+    for species in SPECIES:
+        mean, m2, minimum, maximum = accumulators.pop(species)
+        variance = np.lib.format.open_memmap(os.path.join(ensemble_directory, "{}_variance.npy".format(species)),
+                                             mode="w+", dtype=float, shape=m2.shape)
+        for output in range(len(output_time_step_indices)):
+            variance[output] = calculate_variance(members, m2[output])
+        for array in (mean, minimum, maximum, variance):
+            array.flush()
+        del m2
+        os.remove(os.path.join(ensemble_directory, "{}_m2.npy".format(species)))
+    averages[1] = calculate_variance(members, averages[1])
+
+    with open(os.path.join(ensemble_directory, "averages.csv"), "w") as f:
+        f.write("Timestep,Time," + ",".join("{} {}".format(species.capitalize(), statistic)
+                                            for species in SPECIES for statistic in STATISTICS) + "\n")
+        for output, time_step_index in enumerate(output_time_step_indices):
+            values = [averages[statistic, output, species] for species in range(len(SPECIES))
+                      for statistic in range(len(STATISTICS))]
+            f.write("{},{:.1f},".format(time_step_index, time_step_index * time_step_size)
+                    + ",".join("{:.17f}".format(value) for value in values) + "\n")
+    logger.info("Ensemble of %d members finished", members,
+                extra={"event": {"event": "finished", "members": members}})
+    return output_time_step_indices
+
+def ensembleCommLineIntf():
+    par=create_argument_parser()
+    par.description="Run the simulation with several seed pairs and write the statistics of the members"
+    par.add_argument("--members",type=int,default=None,
+                        help="Number of ensemble members (default: 10, or the number of given seed pairs); "
+                             "without seed pairs, member i uses the mouse and fox seeds plus i")
+    seeds=par.add_mutually_exclusive_group()
+    seeds.add_argument("--seed-pairs",type=parse_seed_pairs,default=None,metavar="MOUSE_SEED:FOX_SEED,...",
+                        help="Mouse and fox seeds of each member")
+    seeds.add_argument("--seeds-file",type=str,default=None,
+                        help="File listing the mouse and fox seeds of each member, as lines 'MOUSE_SEED FOX_SEED'")
+    par.add_argument("--ensemble-directory",type=str,default="ensemble",
+                        help="Directory in which to write the ensemble statistics")
+    args=par.parse_args()
+    for option in UNSUPPORTED_OPTIONS:
+        if getattr(args, option) != par.get_default(option):
+            par.error("--{} is not supported by ensemble runs".format(option.replace("_", "-")))
+    configure_logging(args.log_level, args.quiet, args.progress_file, args.progress_interval)
+
+    validate_arguments(args)
+    validate_input_file_argument(args.landscape_file)
+    seed_pairs = load_seed_pairs(args.seeds_file) if args.seeds_file is not None else args.seed_pairs
+    members = args.members
+    if members is None:
+        members = 10 if seed_pairs is None else len(seed_pairs)
+    if members <= 0:
+        raise ValueError("Number of ensemble members must be a positive integer greater than 0")
+    landscape_data = None
+    if args.landscape_cache_directory is not None:
+        landscape_data = load_compiled_landscape(args.landscape_file, args.landscape_cache_directory)
+
+    run_ensemble(args.birth_mice, args.death_mice, args.diffusion_mice, args.birth_foxes,
+        args.death_foxes, args.diffusion_foxes, args.delta_t, args.time_step,
+        args.duration, args.landscape_file, args.mouse_seed, args.fox_seed, members,
+        args.ensemble_directory, engine=args.engine, threads=args.threads, block_steps=args.block_steps,
+        landscape_data=landscape_data, seed_pairs=seed_pairs)
+
+if __name__ == "__main__":
+    ensembleCommLineIntf()
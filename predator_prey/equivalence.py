@@ -0,0 +1,325 @@
+'''Numerical equivalence harness for alternative engines.
+
+The reference implementation of the simulation is the loop code in `predator_prey.helper_functions`:
+`initialize_population_densities`, `update_population_densities`, `calculate_density_statistics`
+and `calculate_density_colors` with `save_ppm_file`. A candidate replaces any of these; the harness
+runs the reference and the candidate side by side on generated landscapes and parameter sets and
+compares the densities after every time step, the averages and the map pixels, reporting the first
+divergence. `check_equivalence` raises an `EquivalenceError` (an `AssertionError`), so that it can
+be called directly from tests.
+'''
+from argparse import ArgumentParser
+import logging
+import os
+import random
+import shutil
+import tempfile
+import numpy as np
+from predator_prey.helper_functions import *
+from predator_prey.engines import ENGINES, create_advance_function
+from predator_prey.logging_config import configure_logging
+
+logger = logging.getLogger("predator_prey.equivalence")
+
+class EquivalenceError(AssertionError):
+    """A candidate diverged from the reference beyond the tolerances."""
+
+def generate_landscape(width, height, land_fraction=0.7, seed=0):
+    """
+    Generate a random landscape.
+
+    Args:
+        width (int): The width of the landscape.
+        height (int): The height of the landscape.
+        land_fraction (float): The probability of a square being land.
+        seed (int): The random seed.
+
+    Returns:
+        numpy.ndarray: A 2D boolean array (with halo) of the landscape, land being True.
+    """
+    generator = random.Random(seed)
+    landscape = np.zeros((height + 2, width + 2), bool)
+    for x in range(1, height + 1):
+        for y in range(1, width + 1):
+            landscape[x, y] = generator.random() < land_fraction
+    return landscape
+
+def generate_rates(seed=0):
+    """
+    Generate a random set of the six rates and the time step size.
+
+    Args:
+        seed (int): The random seed.
+
+    Returns:
+        tuple: The mice birth, death and diffusion rates, the foxes birth, death and diffusion rates
+            and the time step size.
+    """
+    generator = random.Random(seed)
+    return (generator.uniform(0.01, 0.2), generator.uniform(0.01, 0.1), generator.uniform(0.05, 0.25),
+            generator.uniform(0.01, 0.1), generator.uniform(0.01, 0.2), generator.uniform(0.05, 0.25),
+            generator.choice([0.1, 0.25, 0.5, 1.0]))
+
+def calculate_ulp_distance(expected, actual):
+    """
+    Calculate the distance in units in the last place between float64 values.
+
+    Args:
+        expected (numpy.ndarray): The expected values.
+        actual (numpy.ndarray): The actual values, of the same shape.
+
+    Returns:
+        numpy.ndarray: The number of representable float64 values between each pair of values.
+    """
+    def ordered(values):
+        bits = np.array(values, dtype=np.float64).view(np.int64)
+        magnitude = bits & np.int64(0x7FFFFFFFFFFFFFFF)
+        return np.where(bits < 0, -magnitude, magnitude)
+    return np.abs(ordered(expected) - ordered(actual))
+
+def find_first_divergence(expected, actual, absolute_tolerance=0.0, ulp_tolerance=0):
+    """
+    Find the first value (in row-major order) at which two arrays differ beyond the tolerances.
+
+    Values are equivalent if they are equal, both NaN, within `absolute_tolerance` of each other,
+    or at most `ulp_tolerance` units in the last place apart.
+
+    Args:
+        expected (numpy.ndarray): The expected values.
+        actual (numpy.ndarray): The actual values, of the same shape.
+        absolute_tolerance (float): The absolute tolerance.
+        ulp_tolerance (int): The tolerance in units in the last place.
+
+    Returns:
+        tuple: The index of the first divergent value, or None if the arrays are equivalent.
+    """
+    expected = np.asarray(expected, dtype=np.float64)
+    actual = np.asarray(actual, dtype=np.float64)
+    if expected.shape != actual.shape:
+        raise EquivalenceError("Shapes differ: {} != {}".format(expected.shape, actual.shape))
+    with np.errstate(invalid="ignore"):
+        equivalent = (expected == actual) | (np.isnan(expected) & np.isnan(actual)) \
+            | (np.abs(expected - actual) <= absolute_tolerance) \
+            | (calculate_ulp_distance(expected, actual) <= ulp_tolerance)
+    divergent = np.argwhere(~equivalent)
+    return tuple(int(i) for i in divergent[0]) if len(divergent) else None
+
+def read_ppm_pixels(ppm_file):
+    """
+    Read the pixels of a plain (P3) or binary (P6) PPM file.
+
+    Args:
+        ppm_file (str): The path of the file.
+
+    Returns:
+        numpy.ndarray: The pixels, of shape (height, width, 3).
+    """
+    with open(ppm_file, "rb") as f:
+        data = f.read()
+    # The header is four whitespace-separated tokens: the magic number, width, height and maximum value
+    header, position = [], 0
+    while len(header) < 4:
+        while data[position:position + 1].isspace():
+            position += 1
+        end = position
+        while end < len(data) and not data[end:end + 1].isspace():
+            end += 1
+        header.append(data[position:end])
+        position = end
+    magic, width, height = header[0], int(header[1]), int(header[2])
+    if magic == b"P6":
+        # A single whitespace byte follows the maximum value, and the pixel bytes may be whitespace too
+        pixels = data[position + 1:position + 1 + width * height * 3]
+        return np.frombuffer(pixels, np.uint8).reshape(height, width, 3)
+    return np.array(data[position:].split(), dtype=np.int64).reshape(height, width, 3)
+
+def save_reference_map(width, height, landscape, mice_densities, maximum_mice_density, foxes_densities,
+                       maximum_foxes_density, time_step_index, output_directory="."):
+    """
+    Save a map with the reference output path, `calculate_density_colors` and `save_ppm_file`.
+
+    Args:
+        As for `save_ppm_file_from_densities`.
+
+    Returns:
+        None
+    """
+    mice_density_colours = np.zeros((height, width), np.uint8)
+    foxes_density_colours = np.zeros((height, width), np.uint8)
+    calculate_density_colors(height, width, landscape, mice_densities, maximum_mice_density, foxes_densities,
+                             maximum_foxes_density, mice_density_colours, foxes_density_colours)
+    save_ppm_file(width, height, landscape, foxes_density_colours, mice_density_colours, time_step_index,
+                  output_directory)
+
+def trace_simulation(landscape, rates, time_steps, mouse_seed=1, fox_seed=2, advance_function=None,
+                     initialize_function=initialize_population_densities,
+                     statistics_function=calculate_density_statistics, map_function=save_reference_map,
+                     comparison_interval=1, output_time_step=1):
+    """
+    Run a simulation in memory and yield its state at each comparison.
+
+    The defaults are the reference implementation.
+
+    Args:
+        landscape (numpy.ndarray): A 2D array (with halo) of the landscape.
+        rates (tuple): The six rates and the time step size, as from `generate_rates`.
+        time_steps (int): The number of time steps to run for.
+        mouse_seed (int): Random seed for initializing mouse densities.
+        fox_seed (int): Random seed for initializing fox densities.
+        advance_function (callable): An advance function as from `create_advance_function`, or None
+            for the reference 'loop' engine.
+        initialize_function (callable): A function with the signature of `initialize_population_densities`.
+        statistics_function (callable): A function with the signature of `calculate_density_statistics`.
+        map_function (callable): A function with the signature of `save_ppm_file_from_densities`,
+            or None to compare no maps.
+        comparison_interval (int): The number of time steps the densities are advanced by between two
+            comparisons.
+        output_time_step (int): The time steps at which averages and maps are compared.
+
+    Yields:
+        tuple: The time step index, the mice and foxes densities, and at output steps the
+            (average mice density, average foxes density) and the map pixels, or None otherwise.
+    """
+    advance_function = advance_function or create_advance_function("loop")
+    height, width = landscape.shape[0] - 2, landscape.shape[1] - 2
+    neighbouring_land_count = calculate_land_neighbours(width, height, width + 2, height + 2, landscape)
+    num_lands = np.count_nonzero(landscape)
+    mice = initialize_function(mouse_seed, width, height, landscape)
+    foxes = initialize_function(fox_seed, width, height, landscape)
+    new_mice, new_foxes = mice.copy(), foxes.copy()
+    output_directory = tempfile.mkdtemp()
+    try:
+        time_step_index = 0
+        while True:
+            averages = pixels = None
+            if not time_step_index % output_time_step:
+                maximum_mice_density, maximum_foxes_density, average_mice_density, average_foxes_density = \
+                    statistics_function(mice, foxes, num_lands)
+                averages = (average_mice_density, average_foxes_density)
+                if map_function is not None:
+                    map_function(width, height, landscape, mice, maximum_mice_density, foxes, maximum_foxes_density,
+                                 time_step_index, output_directory)
+                    pixels = read_ppm_pixels(os.path.join(output_directory, "map_{:04d}.ppm".format(time_step_index)))
+            yield time_step_index, mice, foxes, averages, pixels
+            if time_step_index >= time_steps:
+                return
+            steps = min(comparison_interval, time_steps - time_step_index)
+            mice, new_mice, foxes, new_foxes = advance_function(steps, *rates, width, height, landscape,
+                                                                neighbouring_land_count, mice, new_mice, foxes,
+                                                                new_foxes)
+            time_step_index += steps
+    finally:
+        shutil.rmtree(output_directory)
+
+def check_equivalence(landscape, rates, time_steps, absolute_tolerance=0.0, ulp_tolerance=0, pixel_tolerance=0,
+                      mouse_seed=1, fox_seed=2, comparison_interval=1, output_time_step=1, **candidate):
+    """
+    Check that a candidate implementation gives the same results as the reference.
+
+    The candidate advances by `comparison_interval` time steps at once, and the reference a time
+    step at a time; the densities are compared after each interval.
+
+    Args:
+        landscape (numpy.ndarray): A 2D array (with halo) of the landscape.
+        rates (tuple): The six rates and the time step size, as from `generate_rates`.
+        time_steps (int): The number of time steps to run for.
+        absolute_tolerance (float): The absolute tolerance of the densities and averages.
+        ulp_tolerance (int): The tolerance of the densities and averages in units in the last place.
+        pixel_tolerance (int): The tolerance of the map colour values.
+        mouse_seed (int): Random seed for initializing mouse densities.
+        fox_seed (int): Random seed for initializing fox densities.
+        comparison_interval (int): The number of time steps between two comparisons of the densities.
+        output_time_step (int): The time steps at which averages and maps are compared.
+        **candidate: The parts of the candidate implementation (`advance_function`, `initialize_function`,
+            `statistics_function`, `map_function`), as for `trace_simulation`.
+
+    Raises:
+        EquivalenceError: At the first divergence, with the time step, the quantity, the cell and the values.
+
+    Returns:
+        int: The number of comparisons made.
+    """
+    reference_trace = trace_simulation(landscape, rates, time_steps, mouse_seed, fox_seed,
+                                       output_time_step=output_time_step)
+    candidate_trace = trace_simulation(landscape, rates, time_steps, mouse_seed, fox_seed,
+                                       comparison_interval=comparison_interval, output_time_step=output_time_step,
+                                       **candidate)
+    comparisons = 0
+    expected = next(reference_trace)
+    for actual in candidate_trace:
+        while expected[0] < actual[0]:
+            expected = next(reference_trace)
+        time_step_index = actual[0]
+        checks = [("mice densities", expected[1], actual[1], absolute_tolerance, ulp_tolerance),
+                  ("foxes densities", expected[2], actual[2], absolute_tolerance, ulp_tolerance)]
+        if expected[3] is not None and actual[3] is not None:
+            checks.append(("averages (mice, foxes)", expected[3], actual[3], absolute_tolerance, ulp_tolerance))
+        if expected[4] is not None and actual[4] is not None:
+            checks.append(("map pixels (row, column, channel)", expected[4], actual[4], pixel_tolerance, 0))
+        for quantity, expected_values, actual_values, absolute, ulp in checks:
+            divergence = find_first_divergence(expected_values, actual_values, absolute, ulp)
+            if divergence is not None:
+                expected_value = np.asarray(expected_values, dtype=np.float64)[divergence]
+                actual_value = np.asarray(actual_values, dtype=np.float64)[divergence]
+                raise EquivalenceError(
+                    "The {} diverge at time step {}, index {}: {!r} (reference) != {!r} (candidate), {} ULP apart".format(
+                        quantity, time_step_index, divergence, float(expected_value), float(actual_value),
+                        int(calculate_ulp_distance(expected_value, actual_value))))
+        comparisons += 1
+    return comparisons
+
+def check_engine_equivalence(engine, cases=5, width=17, height=11, time_steps=20, seed=0, threads=None,
+                             block_steps=8, band_rows=None, **options):
+    """
+    Check an engine of `predator_prey.engines` against the reference on generated landscapes and rates.
+
+    Args:
+        engine (str): One of `ENGINES`.
+        cases (int): The number of generated landscape and rates pairs.
+        width (int): The width of the generated landscapes.
+        height (int): The height of the generated landscapes.
+        time_steps (int): The number of time steps to run each case for.
+        seed (int): The random seed of the first case; the others follow on.
+        threads, block_steps, band_rows: As for `create_advance_function`.
+        **options: Further keyword arguments passed on to `check_equivalence`.
+
+    Raises:
+        EquivalenceError: At the first divergence.
+
+    Returns:
+        None
+    """
+    advance_function = create_advance_function(engine, threads, block_steps, band_rows)
+    for case in range(seed, seed + cases):
+        landscape = generate_landscape(width, height, 0.5 + 0.5 * random.Random(case).random(), case)
+        try:
+            check_equivalence(landscape, generate_rates(case), time_steps, advance_function=advance_function,
+                              **options)
+        except EquivalenceError as error:
+            raise EquivalenceError("Case {}: {}".format(case, error)) from None
+
+def equivalenceCommLineIntf():
+    par=ArgumentParser(description="Check an engine against the reference loop implementation")
+    par.add_argument("-e","--engine",type=str,required=True,choices=ENGINES,help="Engine to check")
+    par.add_argument("--cases",type=int,default=5,help="Number of generated landscapes and parameter sets")
+    par.add_argument("--width",type=int,default=17,help="Width of the generated landscapes")
+    par.add_argument("--height",type=int,default=11,help="Height of the generated landscapes")
+    par.add_argument("--time-steps",type=int,default=20,help="Number of time steps of each case")
+    par.add_argument("--seed",type=int,default=0,help="Random seed of the first case")
+    par.add_argument("--threads",type=int,default=None,help="Number of threads of the engine")
+    par.add_argument("--block-steps",type=int,default=8,help="Block steps of the blocked engine")
+    par.add_argument("--comparison-interval",type=int,default=1,help="Number of time steps between comparisons")
+    par.add_argument("--absolute-tolerance",type=float,default=0.0,help="Absolute tolerance of densities and averages")
+    par.add_argument("--ulp-tolerance",type=int,default=0,help="Tolerance of densities and averages in units in the last place")
+    par.add_argument("--pixel-tolerance",type=int,default=0,help="Tolerance of map colour values")
+    args=par.parse_args()
+    configure_logging()
+
+    check_engine_equivalence(args.engine, args.cases, args.width, args.height, args.time_steps, args.seed,
+                             args.threads, args.block_steps, comparison_interval=args.comparison_interval,
+                             absolute_tolerance=args.absolute_tolerance, ulp_tolerance=args.ulp_tolerance,
+                             pixel_tolerance=args.pixel_tolerance)
+    logger.info("Engine %s is equivalent to the reference in %d cases", args.engine, args.cases)
+
+if __name__ == "__main__":
+    equivalenceCommLineIntf()
@@ -1,6 +1,11 @@
+import logging
+import math
+import os
 import numpy as np
 import random
 
+logger = logging.getLogger(__name__)
+
 def update_population_densities(mice_birth_rate, mice_death_rate, mice_diffusion_rate, foxes_birth_rate, 
                                 foxes_death_rate, foxes_diffusion_rate, time_step_size, width, height, 
                                 landscape, neighbouring_land_count, initial_mice_densities, new_mice_densities, 
@@ -89,7 +94,7 @@ def calculate_density_statistics(initial_mice_densities, initial_foxes_densities
     
     return maximum_mice_density, maximum_foxes_density, average_mice_density, average_foxes_density
 
-def initialize_arrays(seed, width, height, landscape):
+def initialize_arrays(seed, width, height, landscape, colours=True):
     """
     Initialize variables related to population densities and density colors.
 
@@ -98,12 +103,14 @@ def initialize_arrays(seed, width, height, landscape):
         width (int): The width of the simulation landscape.
         height (int): The height of the simulation landscape.
         landscape (numpy.ndarray): The landscape array.
+        colours (bool): Whether to allocate the density colors array.
 
     Returns:
         tuple: A tuple containing the following elements:
             initial_densities (numpy.ndarray): A 2D array representing the initial population density values.
             new_densities (numpy.ndarray): A 2D array representing the new population density values.
-            density_colors (numpy.ndarray): A 2D array representing  the density color values for PPM file maps.
+            density_colors (numpy.ndarray): A 2D array representing  the density color values for PPM file maps,
+                or None if `colours` is False.
     """
     # Initialize the population densities
     initial_densities = initialize_population_densities(seed, width, height, landscape)
@@ -111,8 +118,8 @@ def initialize_arrays(seed, width, height, landscape):
     # Initialize arrays to store new population density values
     new_densities = initial_densities.copy()
 
-    # Initialize arrays for storing density color values for PPM file maps
-    density_colors = np.zeros((height, width), int)
+    # Initialize arrays for storing density color values (0-255) for PPM file maps
+    density_colors = np.zeros((height, width), np.uint8) if colours else None
 
     return initial_densities, new_densities, density_colors
 
@@ -169,7 +176,7 @@ def calculate_migration_change(diffusion_rate, land_neighbours, initial_densitie
     neighbouring_density_count = calculate_total_neighbours(x, y, initial_densities)
     return diffusion_rate * ((neighbouring_density_count) - (land_neighbours[x,y] * initial_densities[x, y]))
 
-def save_ppm_file(width, height, landscape, foxes_density_colours, mice_density_colours, time_step_index):
+def save_ppm_file(width, height, landscape, foxes_density_colours, mice_density_colours, time_step_index, output_directory="."):
     """
     Save a PPM image file based on the densities of foxes and mice on the landscape.
 
@@ -180,11 +187,12 @@ def save_ppm_file(width, height, landscape, foxes_density_colours, mice_density_
         landscape (numpy.ndarray): A 2D array representing the landscape.
         foxes_density_colours (numpy.ndarray): A 2D array of foxes density colors.
         mice_density_colours (numpy.ndarray): A 2D array of mice density colors.
+        output_directory (str): The directory in which to write the file. Defaults to the current directory.
 
     Returns:
         None
     """
-    with open("map_{:04d}.ppm".format(time_step_index),"w") as f:
+    with open(os.path.join(output_directory, "map_{:04d}.ppm".format(time_step_index)),"w") as f:
         header="P3\n{} {}\n{}\n".format(width,height,255)
         f.write(header)
         for x in range(0,height):
@@ -194,6 +202,48 @@ def save_ppm_file(width, height, landscape, foxes_density_colours, mice_density_
                 else:
                     f.write("{} {} {}\n".format(0,200,255))
 
+def save_binary_ppm_file(width, height, landscape, foxes_density_colours, mice_density_colours, time_step_index, output_directory="."):
+    """
+    Save a binary (P6) PPM image file with the same pixel values as `save_ppm_file`.
+
+    Args:
+        width (int): The width of the landscape.
+        height (int): The height of the landscape.
+        landscape (numpy.ndarray): A 2D array representing the landscape.
+        foxes_density_colours (numpy.ndarray): A 2D array of foxes density colors.
+        mice_density_colours (numpy.ndarray): A 2D array of mice density colors.
+        time_step_index (int): The current time step index.
+        output_directory (str): The directory in which to write the file. Defaults to the current directory.
+
+    Returns:
+        None
+    """
+    land = landscape[1:height + 1, 1:width + 1].astype(bool)
+    pixels = np.zeros((height, width, 3), np.uint8)
+    pixels[:, :, 0] = np.where(land, foxes_density_colours[0:height, 0:width], 0)
+    pixels[:, :, 1] = np.where(land, mice_density_colours[0:height, 0:width], 200)
+    pixels[:, :, 2] = np.where(land, 0, 255)
+    with open(os.path.join(output_directory, "map_{:04d}.ppm".format(time_step_index)), "wb") as f:
+        f.write("P6\n{} {}\n{}\n".format(width, height, 255).encode("ascii"))
+        f.write(pixels.tobytes())
+
+def save_density_snapshot(snapshot_directory, time_step_index, time_in_secs, mice_densities, foxes_densities):
+    """
+    Save the raw population densities of an output step so that maps can be rendered later.
+
+    Args:
+        snapshot_directory (str): The directory in which to store the snapshot.
+        time_step_index (int): The current time step index.
+        time_in_secs (float): The simulated time of the snapshot.
+        mice_densities (numpy.ndarray): A 2D array (with halo) of mice densities.
+        foxes_densities (numpy.ndarray): A 2D array (with halo) of foxes densities.
+
+    Returns:
+        None
+    """
+    np.savez(os.path.join(snapshot_directory, "snapshot_{:04d}.npz".format(time_step_index)),
+             time=time_in_secs, mice=mice_densities, foxes=foxes_densities)
+
 def calculate_colour_value(current_density, maximum_density):
     """
     Calculate the color value based on densities and maximum_density.
@@ -212,10 +262,42 @@ def calculate_colour_value(current_density, maximum_density):
     else:
         return 0
     
+def calculate_row_sums(densities):
+    """
+    Sum each row of an array of densities.
+
+    Each row is summed whole, in an order fixed by its length, so the sums do not depend on how the
+    rows are split into bands.
+
+    Args:
+        densities (numpy.ndarray): A 2D array, or band of rows, of population densities.
+
+    Returns:
+        numpy.ndarray: The sum of each row.
+    """
+    return np.sum(densities, axis=-1)
+
+def calculate_total_density(row_sums):
+    """
+    Sum row sums into a total density that is the same whatever the order or grouping of the rows.
+
+    The row sums are added with `math.fsum`, which rounds their exact sum only once.
+
+    Args:
+        row_sums (iterable): The sums of the rows, as from `calculate_row_sums`, in any order.
+
+    Returns:
+        float: The total density.
+    """
+    return math.fsum(row_sums)
+
 def calculate_average_density(num_lands, densities):
     """
     Calculate the average population density.
 
+    The total density is reduced with `calculate_row_sums` and `calculate_total_density`, so the
+    average is bit-identical however the densities are partitioned into bands of rows.
+
     Args:
         num_lands (int): The number of land squares in the landscape.
         densities (numpy.ndarray): An array of initial population densities.
@@ -224,7 +306,7 @@ def calculate_average_density(num_lands, densities):
         float: The average population density if `num_lands` is not 0, or 0 otherwise.
     """
     if num_lands != 0:
-        return np.sum(densities) / num_lands
+        return calculate_total_density(calculate_row_sums(densities)) / num_lands
     else:
         return 0
   
@@ -248,7 +330,7 @@ def initialize_population_densities(seed, width, height, landscape):
         - For non-zero 'seed' values, population densities are generated for land squares
           using a random uniform distribution between 0 and 5.0.
     """
-    density_grid = landscape.astype(float).copy()
+    density_grid = landscape.astype(float)
     random.seed(seed)
     for x in range(1, height + 1):
         for y in range(1, width + 1):
@@ -277,7 +359,8 @@ def calculate_land_neighbours(width, height, width_with_halo, height_with_halo,
         numpy.ndarray: A 2D array containing the number of land neighbours for each
         land square in the landscape.
     """
-    neighbours = np.zeros((height_with_halo, width_with_halo), int)
+    # At most 4 land neighbours, so a byte per square is enough
+    neighbours = np.zeros((height_with_halo, width_with_halo), np.uint8)
     for x in range(1, height + 1):
         for y in range(1, width + 1):
             neighbours[x, y] = calculate_total_neighbours(x , y, landscape)
@@ -332,19 +415,145 @@ def read_landscape_file(landscape_file):
             int: The height of the landscape.
             int: The width of the landscape including halo.
             int: The height of the landscape including halo.
-            numpy.ndarray: A 2D array representing the processed landscape.
+            numpy.ndarray: A 2D boolean array representing the processed landscape (land is True).
     """
     with open(landscape_file, "r") as f:
         width, height = [int(i) for i in f.readline().split(" ")]
-        print("Width: {} Height: {}".format(width, height))
+        logger.info("Width: %d Height: %d", width, height)
         width_with_halo = width + 2  # Width including halo or border
         height_with_halo = height + 2  # Height including halo or border
-        landscape = np.zeros((height_with_halo, width_with_halo), int)
-        print(landscape)
+        landscape = np.zeros((height_with_halo, width_with_halo), bool)
         row = 1
-        for line in f.readlines():
+        for line in f:
             values = line.split(" ")
             # Read landscape into an array, padding with halo values.
             landscape[row] = [0] + [int(i) for i in values] + [0]
             row += 1
-    return width, height, width_with_halo, height_with_halo, landscape
\ No newline at end of file
+        logger.debug("%s", landscape)
+    return width, height, width_with_halo, height_with_halo, landscape
+
+def load_landscape(landscape_file):
+    """
+    Read a landscape file and derive the data a simulation needs from it.
+
+    Args:
+        landscape_file (str): The path to the input landscape file.
+
+    Returns:
+        tuple: A tuple containing the following elements:
+            int: The width of the landscape.
+            int: The height of the landscape.
+            int: The width of the landscape including halo.
+            int: The height of the landscape including halo.
+            numpy.ndarray: A 2D array representing the processed landscape.
+            int: The number of land-only squares.
+            numpy.ndarray: A 2D array containing the number of land neighbours of each square.
+    """
+    width, height, width_with_halo, height_with_halo, landscape = read_landscape_file(landscape_file)
+    num_lands = np.count_nonzero(landscape)
+    neighbouring_land_count = calculate_land_neighbours(width, height, width_with_halo, height_with_halo, landscape)
+    return width, height, width_with_halo, height_with_halo, landscape, num_lands, neighbouring_land_count
+
+def read_landscape_dimensions(landscape_file):
+    """
+    Read the width and height of a landscape from the first line of its file.
+
+    Args:
+        landscape_file (str): The path to the input landscape file.
+
+    Returns:
+        tuple: The width and the height of the landscape.
+    """
+    with open(landscape_file, "r") as f:
+        width, height = [int(i) for i in f.readline().split()]
+    return width, height
+
+def estimate_memory_usage(width, height, colour_maps=True, engine_bytes=0):
+    """
+    Estimate the memory used by the state of a simulation run.
+
+    The state consists of the landscape (a byte per square), the land neighbour counts (a byte per
+    square), two density arrays per species (8 bytes per square each), the density colours of the
+    maps (a byte per square per species) and the working memory of the engine.
+
+    Args:
+        width (int): The width of the landscape.
+        height (int): The height of the landscape.
+        colour_maps (bool): Whether density colours arrays are allocated for the maps.
+        engine_bytes (int): The working memory of the engine, in bytes.
+
+    Returns:
+        int: The estimated number of bytes.
+    """
+    squares_with_halo = (width + 2) * (height + 2)
+    state_bytes = squares_with_halo * (1 + 1 + 4 * 8)
+    if colour_maps:
+        state_bytes += 2 * width * height
+    return state_bytes + engine_bytes
+
+def calculate_colour_row(densities, maximum_density):
+    """
+    Calculate the colour values of a row of densities, as `calculate_colour_value` does for each density.
+
+    Args:
+        densities (numpy.ndarray): The densities.
+        maximum_density (float): The maximum density value.
+
+    Returns:
+        numpy.ndarray: The colour values in the range [0, 255].
+    """
+    if maximum_density != 0:
+        return ((densities / maximum_density) * 255).astype(np.uint8)
+    return np.zeros(densities.shape, np.uint8)
+
+def save_ppm_file_from_densities(width, height, landscape, mice_densities, maximum_mice_density, foxes_densities,
+                                 maximum_foxes_density, time_step_index, output_directory=".", file_name=None):
+    """
+    Save the PPM image file of `save_ppm_file` directly from the densities, a row at a time.
+
+    No full-size density colours arrays are needed; the file is identical to the one written
+    after `calculate_density_colors`.
+
+    Args:
+        width (int): The width of the landscape.
+        height (int): The height of the landscape.
+        landscape (numpy.ndarray): A 2D array representing the landscape.
+        mice_densities (numpy.ndarray): A 2D array (with halo) of mice densities.
+        maximum_mice_density (float): The maximum density of mice.
+        foxes_densities (numpy.ndarray): A 2D array (with halo) of foxes densities.
+        maximum_foxes_density (float): The maximum density of foxes.
+        time_step_index (int): The current time step index.
+        output_directory (str): The directory in which to write the file. Defaults to the current directory.
+        file_name (str): The name of the file, instead of map_<time step index>.ppm.
+
+    Returns:
+        None
+    """
+    file_name = file_name or "map_{:04d}.ppm".format(time_step_index)
+    with open(os.path.join(output_directory, file_name), "w") as f:
+        f.write("P3\n{} {}\n{}\n".format(width, height, 255))
+        for x in range(1, height + 1):
+            land = landscape[x, 1:width + 1] != 0
+            foxes_colours = calculate_colour_row(foxes_densities[x, 1:width + 1], maximum_foxes_density)
+            mice_colours = calculate_colour_row(mice_densities[x, 1:width + 1], maximum_mice_density)
+            f.write("".join("{} {} 0\n".format(foxes_colour, mice_colour) if is_land else "0 200 255\n"
+                            for is_land, foxes_colour, mice_colour in zip(land.tolist(), foxes_colours.tolist(),
+                                                                          mice_colours.tolist())))
+
+def calculate_relative_change(previous_values, current_values):
+    """
+    Calculate the largest change between two sets of values, relative to the largest previous value.
+
+    Args:
+        previous_values (numpy.ndarray): The previous values (or a single value).
+        current_values (numpy.ndarray): The current values, of the same shape.
+
+    Returns:
+        float: The largest absolute difference divided by the largest absolute previous value, or
+            infinity if the previous values are all 0 and the current ones are not.
+    """
+    scale = float(np.max(np.abs(previous_values)))
+    difference = float(np.max(np.abs(np.subtract(current_values, previous_values))))
+    if scale == 0:
+        return 0.0 if difference == 0 else float("inf")
+    return difference / scale
@@ -0,0 +1,108 @@
+'''Cache of compiled landscapes.
+
+Compiling a landscape file validates and parses it once, and stores the data a simulation derives
+from it (the landscape with halo, the number of land squares and the land neighbour counts) as
+.npy files in a directory named by the hash of the file contents.
+Later runs on a file with the same contents memory-map these files, skipping the parsing, the
+validation and the counting of neighbours.
+'''
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import numpy as np
+from predator_prey.helper_functions import *
+from predator_prey.validate_arguments import validate_input_file_argument
+
+logger = logging.getLogger(__name__)
+
+LANDSCAPE_CACHE_FORMAT_VERSION = 2
+
+def calculate_landscape_hash(landscape_file):
+    """
+    Calculate the hash of the contents of a landscape file.
+
+    Args:
+        landscape_file (str): The path to the input landscape file.
+
+    Returns:
+        str: The hexadecimal SHA-256 digest of the contents and of the cache format version.
+    """
+    digest = hashlib.sha256()
+    with open(landscape_file, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    digest.update(json.dumps([LANDSCAPE_CACHE_FORMAT_VERSION]).encode("utf-8"))
+    return digest.hexdigest()
+
+def compile_landscape(landscape_file, entry_directory):
+    """
+    Validate a landscape file and store its compiled data in a cache entry.
+
+    The entry is written to a temporary directory and renamed into place, so that an entry is
+    always complete, even if several runs compile the same landscape at once.
+
+    Args:
+        landscape_file (str): The path to the input landscape file.
+        entry_directory (str): The directory of the cache entry.
+
+    Raises:
+        ValueError: If the landscape file is invalid, as from `validate_input_file_argument`.
+        FileNotFoundError: If the landscape file does not exist.
+
+    Returns:
+        None
+    """
+    validate_input_file_argument(landscape_file)
+    width, height, _, _, landscape, num_lands, neighbouring_land_count = load_landscape(landscape_file)
+    temporary_directory = "{}.{}.{}.tmp".format(entry_directory, os.getpid(), threading.get_ident())
+    os.makedirs(temporary_directory)
+    try:
+        np.save(os.path.join(temporary_directory, "landscape.npy"), landscape)
+        np.save(os.path.join(temporary_directory, "neighbours.npy"), neighbouring_land_count)
+        with open(os.path.join(temporary_directory, "metadata.json"), "w") as f:
+            json.dump({"width": width, "height": height, "num_lands": int(num_lands)}, f)
+        os.rename(temporary_directory, entry_directory)
+    except OSError:
+        # Another run compiled the same landscape first
+        shutil.rmtree(temporary_directory, ignore_errors=True)
+        if not os.path.isdir(entry_directory):
+            raise
+
+def load_compiled_landscape(landscape_file, cache_directory):
+    """
+    Load the compiled data of a landscape from the cache, compiling the landscape first if needed.
+
+    Args:
+        landscape_file (str): The path to the input landscape file.
+        cache_directory (str): The directory of the landscape cache; created if needed.
+
+    Raises:
+        ValueError: If the landscape file is invalid, as from `validate_input_file_argument`.
+        FileNotFoundError: If the landscape file does not exist.
+
+    Returns:
+        tuple: The landscape data, as returned by `load_landscape`, with the landscape and the
+            land neighbour counts memory-mapped read-only.
+    """
+    if not os.path.exists(landscape_file):
+        raise FileNotFoundError('The file {} does not exist.'.format(landscape_file))
+    entry_directory = os.path.join(cache_directory, calculate_landscape_hash(landscape_file))
+    if os.path.isdir(entry_directory):
+        logger.debug("Landscape %s found in the landscape cache", landscape_file)
+    else:
+        logger.info("Compiling landscape %s into the landscape cache", landscape_file)
+        os.makedirs(cache_directory, exist_ok=True)
+        compile_landscape(landscape_file, entry_directory)
+
+    with open(os.path.join(entry_directory, "metadata.json")) as f:
+        metadata = json.load(f)
+    # Plain arrays backed by the memory maps, for fast indexing by the loop engine
+    landscape, neighbouring_land_count = [
+        np.asarray(np.load(os.path.join(entry_directory, name + ".npy"), mmap_mode="r"))
+        for name in ("landscape", "neighbours")]
+    width, height = metadata["width"], metadata["height"]
+    landscape_data = (width, height, width + 2, height + 2, landscape, metadata["num_lands"], neighbouring_land_count)
+    return landscape_data
@@ -0,0 +1,160 @@
+'''Landscapes changing during a run, e.g. by flooding and land reclamation.
+
+A timeline file lists squares that turn into water or back into land at given time steps. The
+changes of a time step are applied once the densities of that time step are reached, before its
+output and the following time steps. Each change updates only the square, the land neighbour
+counts of its four neighbours and the number of land squares, instead of recounting the
+neighbours of the whole landscape.
+
+The densities of a flooded square are dropped (set to 0) or displaced, shared equally between its
+land neighbours. A reclaimed square starts with densities of 0 and is populated by diffusion.
+'''
+import bisect
+
+FLOODED_DENSITY_POLICIES = ["drop", "displace"]
+
+def load_landscape_changes(changes_file, width, height):
+    """
+    Read a timeline of landscape changes.
+
+    Each line of the file is 'TIMESTEP ROW COLUMN LAND', where the row and column are counted from
+    0 at the top left of the landscape (as for regions of interest) and LAND is 1 for a square
+    turning into land and 0 for a square turning into water. Empty lines and lines starting with
+    '#' are ignored. The changes of a time step are applied in the order of the file.
+
+    Args:
+        changes_file (str): The path to the timeline file.
+        width (int): The width of the landscape.
+        height (int): The height of the landscape.
+
+    Raises:
+        ValueError: If a line is not four integers, its time step is not positive, its square is not
+            within the landscape, or LAND is not 0 or 1.
+        FileNotFoundError: If the timeline file does not exist.
+
+    Returns:
+        dict: The changes of each time step, as lists of (x, y, land) in the coordinates of the
+            arrays with halo.
+    """
+    changes = {}
+    with open(changes_file, "r") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip() or line.lstrip().startswith("#"):
+                continue
+            try:
+                time_step_index, row, column, land = [int(value) for value in line.split()]
+            except ValueError:
+                raise ValueError("Invalid landscape change on line {}: expected 'TIMESTEP ROW COLUMN LAND'"
+                                 .format(line_number))
+            if time_step_index <= 0:
+                raise ValueError("Invalid landscape change on line {}: the time step must be a positive integer "
+                                 "greater than 0".format(line_number))
+            if not (0 <= row < height and 0 <= column < width):
+                raise ValueError("Invalid landscape change on line {}: square ({}, {}) does not lie within the "
+                                 "{} x {} landscape".format(line_number, row, column, width, height))
+            if land not in (0, 1):
+                raise ValueError("Invalid landscape change on line {}: LAND must be 0 or 1".format(line_number))
+            changes.setdefault(time_step_index, []).append((row + 1, column + 1, bool(land)))
+    return changes
+
+def find_next_change_time_step(change_time_steps, time_step_index):
+    """
+    Find the first time step with landscape changes after a time step.
+
+    Args:
+        change_time_steps (list): The sorted time steps with landscape changes.
+        time_step_index (int): The current time step index.
+
+    Returns:
+        int: The next time step with changes, or None if there is none.
+    """
+    position = bisect.bisect_right(change_time_steps, time_step_index)
+    return change_time_steps[position] if position < len(change_time_steps) else None
+
+def calculate_land_neighbour_squares(x, y, width, height, landscape):
+    """
+    List the land squares among the four neighbours of a square.
+
+    Args:
+        x (int): The row of the square (with halo).
+        y (int): The column of the square (with halo).
+        width (int): The width of the landscape.
+        height (int): The height of the landscape.
+        landscape (numpy.ndarray): A 2D array (with halo) representing the landscape.
+
+    Returns:
+        list: The (x, y) of the land neighbours, in the order north, south, west, east.
+    """
+    return [(neighbour_x, neighbour_y) for neighbour_x, neighbour_y in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1))
+            if 1 <= neighbour_x <= height and 1 <= neighbour_y <= width and landscape[neighbour_x, neighbour_y]]
+
+def flip_square(x, y, land, width, height, landscape, neighbouring_land_count):
+    """
+    Turn a square into land or water, updating the land neighbour counts of its neighbours.
+
+    Args:
+        x (int): The row of the square (with halo).
+        y (int): The column of the square (with halo).
+        land (bool): Whether the square turns into land.
+        width (int): The width of the landscape.
+        height (int): The height of the landscape.
+        landscape (numpy.ndarray): A 2D array (with halo) representing the landscape, updated in place.
+        neighbouring_land_count (numpy.ndarray): A 2D array (with halo) of the land neighbours of each
+            square, updated in place.
+
+    Returns:
+        int: The change of the number of land squares: 1, -1, or 0 if the square was land (or water) already.
+    """
+    if bool(landscape[x, y]) == land:
+        return 0
+    landscape[x, y] = land
+    change = 1 if land else -1
+    for neighbour_x, neighbour_y in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+        if 1 <= neighbour_x <= height and 1 <= neighbour_y <= width:
+            neighbouring_land_count[neighbour_x, neighbour_y] = int(neighbouring_land_count[neighbour_x, neighbour_y]) + change
+    return change
+
+def apply_landscape_changes(changes, width, height, landscape, neighbouring_land_count, densities,
+                            spare_densities, policy="drop"):
+    """
+    Apply the landscape changes of a time step, and handle the densities of the flooded squares.
+
+    Args:
+        changes (list): The (x, y, land) of the changes, as from `load_landscape_changes`.
+        width (int): The width of the landscape.
+        height (int): The height of the landscape.
+        landscape (numpy.ndarray): A 2D array (with halo) representing the landscape, updated in place.
+        neighbouring_land_count (numpy.ndarray): A 2D array (with halo) of the land neighbours of each
+            square, updated in place.
+        densities (list): The current density arrays (e.g. of the mice and the foxes), whose last two
+            axes are the rows and columns with halo, updated in place according to `policy`.
+        spare_densities (list): The spare density arrays, of which the flooded squares are set to 0,
+            as the time steps do not write water squares.
+        policy (str): One of `FLOODED_DENSITY_POLICIES`: 'drop' sets the densities of a flooded square
+            to 0, 'displace' shares them equally between its land neighbours (and drops them if it has none).
+
+    Raises:
+        ValueError: If the policy is not one of `FLOODED_DENSITY_POLICIES`.
+
+    Returns:
+        int: The change of the number of land squares.
+    """
+    if policy not in FLOODED_DENSITY_POLICIES:
+        raise ValueError("Unknown flooded density policy {}, expected one of: {}".format(
+            policy, ", ".join(FLOODED_DENSITY_POLICIES)))
+    land_count_change = 0
+    for x, y, land in changes:
+        change = flip_square(x, y, land, width, height, landscape, neighbouring_land_count)
+        land_count_change += change
+        if change == -1:
+            land_neighbours = calculate_land_neighbour_squares(x, y, width, height, landscape) \
+                if policy == "displace" else []
+            for array in densities:
+                if land_neighbours:
+                    share = array[..., x, y] / len(land_neighbours)
+                    for neighbour_x, neighbour_y in land_neighbours:
+                        array[..., neighbour_x, neighbour_y] += share
+                array[..., x, y] = 0.0
+            for array in spare_densities:
+                array[..., x, y] = 0.0
+    return land_count_change
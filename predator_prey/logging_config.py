@@ -0,0 +1,78 @@
+'''Logging of the predator-prey simulation.
+
+All modules log to children of the 'predator_prey' logger. Records carrying an `event` (a dict,
+passed with `extra={"event": ...}`) can additionally be written as JSON lines progress events.
+'''
+import json
+import logging
+import sys
+import time
+
+LOG_LEVELS = ["DEBUG", "INFO", "WARNING", "ERROR"]
+
+class ProgressEventFilter(logging.Filter):
+    """Pass only records with a progress event, at most one per `interval` seconds.
+
+    Events whose type is in `always` (e.g. the end of a run) are never dropped.
+    """
+
+    def __init__(self, interval, always=("finished",)):
+        super().__init__()
+        self.interval = interval
+        self.always = always
+        self.last_emitted = None
+
+    def filter(self, record):
+        event = getattr(record, "event", None)
+        if event is None:
+            return False
+        now = time.monotonic()
+        if event.get("event") not in self.always and self.last_emitted is not None \
+                and now - self.last_emitted < self.interval:
+            return False
+        self.last_emitted = now
+        return True
+
+class ProgressEventFormatter(logging.Formatter):
+    """Format the progress event of a record as a JSON line."""
+
+    def format(self, record):
+        return json.dumps(dict(record.event, wall_time=record.created))
+
+def configure_logging(level="INFO", quiet=False, progress_file=None, progress_interval=1.0):
+    """
+    Configure the logging of the simulation.
+
+    Args:
+        level (str): The level of the console log, one of `LOG_LEVELS`.
+        quiet (bool): Only log warnings and errors to the console, whatever `level` is.
+        progress_file (str): If given, the file to which progress events are appended as JSON lines,
+            or '-' for the standard output.
+        progress_interval (float): The minimum number of seconds between two progress events.
+
+    Returns:
+        logging.Logger: The configured 'predator_prey' logger.
+    """
+    logger = logging.getLogger("predator_prey")
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        # Only the standard streams are kept open, handlers without a stream (e.g. a NullHandler) are closed
+        if not isinstance(handler, logging.StreamHandler) or handler.stream not in (sys.stdout, sys.stderr):
+            handler.close()
+    logger.propagate = False
+
+    console_level = logging.WARNING if quiet else getattr(logging, level)
+    console = logging.StreamHandler(sys.stdout)
+    console.setLevel(console_level)
+    console.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(console)
+    logger.setLevel(console_level)
+
+    if progress_file is not None:
+        progress = logging.StreamHandler(sys.stdout) if progress_file == "-" else logging.FileHandler(progress_file)
+        progress.addFilter(ProgressEventFilter(progress_interval))
+        progress.setFormatter(ProgressEventFormatter())
+        logger.addHandler(progress)
+        # Progress events are logged at INFO level, whatever the console level
+        logger.setLevel(min(console_level, logging.INFO))
+    return logger
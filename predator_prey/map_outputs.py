@@ -0,0 +1,156 @@
+'''Additional map outputs: regions of interest and downsampled overviews.
+
+Each map output is a function called at every output step with the landscape, the densities and
+their maxima, which writes its own file. Only the squares a map output shows are colour-mapped.
+'''
+import os
+import numpy as np
+from predator_prey.helper_functions import *
+
+DEFAULT_REGION_PATTERN = "region{region}_{time_step:04d}.ppm"
+DEFAULT_OVERVIEW_PATTERN = "overview{factor}_{time_step:04d}.ppm"
+
+def parse_region(text):
+    """
+    Parse a region of interest given as 'LEFT,TOP,WIDTH,HEIGHT'.
+
+    Args:
+        text (str): The region, in squares from the top left corner of the landscape.
+
+    Raises:
+        ValueError: If the region is not four integers, or is empty.
+
+    Returns:
+        tuple: The left column, top row, width and height of the region.
+    """
+    left, top, width, height = [int(value) for value in text.split(",")]
+    if left < 0 or top < 0 or width <= 0 or height <= 0:
+        raise ValueError("A region must have a non-negative position and a positive size")
+    return left, top, width, height
+
+def save_region_ppm_file(region, file_name, landscape, mice_densities, maximum_mice_density, foxes_densities,
+                         maximum_foxes_density):
+    """
+    Save the PPM map of a region of the landscape, with the colours of the full map.
+
+    Args:
+        region (tuple): The left column, top row, width and height of the region.
+        file_name (str): The path of the file.
+        landscape (numpy.ndarray): A 2D array (with halo) representing the landscape.
+        mice_densities (numpy.ndarray): A 2D array (with halo) of mice densities.
+        maximum_mice_density (float): The maximum density of mice over the whole landscape.
+        foxes_densities (numpy.ndarray): A 2D array (with halo) of foxes densities.
+        maximum_foxes_density (float): The maximum density of foxes over the whole landscape.
+
+    Returns:
+        None
+    """
+    left, top, width, height = region
+    # The region with a border of one square, which stands in for the halo
+    window = (slice(top, top + height + 2), slice(left, left + width + 2))
+    save_ppm_file_from_densities(width, height, landscape[window], mice_densities[window], maximum_mice_density,
+                                 foxes_densities[window], maximum_foxes_density, None, file_name=file_name)
+
+def calculate_block_average(width, height, landscape, densities, factor):
+    """
+    Downsample densities by averaging them over the land squares of blocks of `factor` x `factor` squares.
+
+    Args:
+        width (int): The width of the landscape.
+        height (int): The height of the landscape.
+        landscape (numpy.ndarray): A 2D array (with halo) representing the landscape.
+        densities (numpy.ndarray): A 2D array (with halo) of densities.
+        factor (int): The size of the blocks. Blocks at the right and bottom edges may be smaller.
+
+    Returns:
+        tuple: The downsampled densities and landscape (a block is land if any of its squares is),
+            both with a halo.
+    """
+    block_width, block_height = -(-width // factor), -(-height // factor)
+    block_densities = np.zeros((block_height + 2, block_width + 2))
+    block_landscape = np.zeros((block_height + 2, block_width + 2), bool)
+    # Only a band of `factor` rows is read at a time, so that the densities may be memory-mapped
+    sums = np.zeros((factor, block_width * factor))
+    counts = np.zeros((factor, block_width * factor), np.int64)
+    for block_row in range(block_height):
+        first_row, last_row = block_row * factor, min((block_row + 1) * factor, height)
+        rows = last_row - first_row
+        sums[:rows, :width] = densities[first_row + 1:last_row + 1, 1:width + 1]
+        counts[:rows, :width] = landscape[first_row + 1:last_row + 1, 1:width + 1] != 0
+        sums[rows:], counts[rows:] = 0.0, 0
+        band_sums = sums.reshape(factor, block_width, factor).sum(axis=(0, 2))
+        band_counts = counts.reshape(factor, block_width, factor).sum(axis=(0, 2))
+        block_densities[block_row + 1, 1:-1] = band_sums / np.maximum(band_counts, 1)
+        block_landscape[block_row + 1, 1:-1] = band_counts > 0
+    return block_densities, block_landscape
+
+def save_overview_ppm_file(factor, file_name, width, height, landscape, mice_densities, foxes_densities):
+    """
+    Save a downsampled PPM map of the whole landscape, coloured by the block-averaged densities.
+
+    Args:
+        factor (int): The downsampling factor.
+        file_name (str): The path of the file.
+        width (int): The width of the landscape.
+        height (int): The height of the landscape.
+        landscape (numpy.ndarray): A 2D array (with halo) representing the landscape.
+        mice_densities (numpy.ndarray): A 2D array (with halo) of mice densities.
+        foxes_densities (numpy.ndarray): A 2D array (with halo) of foxes densities.
+
+    Returns:
+        None
+    """
+    block_mice_densities, block_landscape = calculate_block_average(width, height, landscape, mice_densities, factor)
+    block_foxes_densities, _ = calculate_block_average(width, height, landscape, foxes_densities, factor)
+    save_ppm_file_from_densities(block_landscape.shape[1] - 2, block_landscape.shape[0] - 2, block_landscape,
+                                 block_mice_densities, np.max(block_mice_densities), block_foxes_densities,
+                                 np.max(block_foxes_densities), None, file_name=file_name)
+
+def create_map_outputs(width, height, regions=None, overview_factor=None, region_pattern=DEFAULT_REGION_PATTERN,
+                       overview_pattern=DEFAULT_OVERVIEW_PATTERN, output_directory="."):
+    """
+    Create the map outputs of regions of interest and of a downsampled overview.
+
+    Args:
+        width (int): The width of the landscape.
+        height (int): The height of the landscape.
+        regions (list): The (left, top, width, height) of each region of interest, or None.
+        overview_factor (int): The downsampling factor of the overview, or None for no overview.
+        region_pattern (str): The file name pattern of the region maps, formatted with the `region`
+            number (from 0) and the `time_step` index.
+        overview_pattern (str): The file name pattern of the overview maps, formatted with the
+            downsampling `factor` and the `time_step` index.
+        output_directory (str): The directory in which to write the files.
+
+    Raises:
+        ValueError: If a region does not lie within the landscape or the factor is not positive.
+
+    Returns:
+        list: Functions taking the width, height, landscape, mice densities, maximum mice density,
+            foxes densities, maximum foxes density and time step index, which write the maps.
+    """
+    map_outputs = []
+    for number, region in enumerate(regions or []):
+        left, top, region_width, region_height = region
+        if left + region_width > width or top + region_height > height:
+            raise ValueError("Region {} does not lie within the {} x {} landscape".format(region, width, height))
+
+        def save_region(width, height, landscape, mice_densities, maximum_mice_density, foxes_densities,
+                        maximum_foxes_density, time_step_index, number=number, region=region):
+            file_name = os.path.join(output_directory, region_pattern.format(region=number, time_step=time_step_index))
+            save_region_ppm_file(region, file_name, landscape, mice_densities, maximum_mice_density, foxes_densities,
+                                 maximum_foxes_density)
+        map_outputs.append(save_region)
+
+    if overview_factor is not None:
+        if overview_factor <= 0:
+            raise ValueError("Downsampling factor of the overview must be a positive integer greater than 0")
+
+        def save_overview(width, height, landscape, mice_densities, maximum_mice_density, foxes_densities,
+                          maximum_foxes_density, time_step_index):
+            file_name = os.path.join(output_directory,
+                                     overview_pattern.format(factor=overview_factor, time_step=time_step_index))
+            save_overview_ppm_file(overview_factor, file_name, width, height, landscape, mice_densities,
+                                   foxes_densities)
+        map_outputs.append(save_overview)
+    return map_outputs
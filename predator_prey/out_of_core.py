@@ -0,0 +1,256 @@
+'''Out-of-core predator-prey simulation.
+
+The landscape, the land neighbour counts and the density fields are kept in memory-mapped .npy
+files in a work directory, and every pass over them (loading, initialization, the time steps, the
+statistics and the maps) streams through them in bands of rows, so that only a band and its halo
+rows are resident at a time. The time steps are advanced with the 'blocked' engine, which reads and
+writes each band once per block of time steps.
+'''
+import logging
+import mmap
+import os
+import random
+import numpy as np
+from predator_prey.helper_functions import *
+from predator_prey.engines import advance_population_densities_blocked, calculate_workspace_bytes, get_thread_pool
+
+logger = logging.getLogger(__name__)
+
+# Size of the copy of a band and its halo of each density array (of the 'blocked' engine)
+OUT_OF_CORE_BAND_BYTES = 64 << 20
+
+def calculate_out_of_core_band_rows(width, block_steps, band_bytes=OUT_OF_CORE_BAND_BYTES):
+    """
+    Calculate the number of rows of the bands streamed through the memory-mapped arrays.
+
+    Args:
+        width (int): The width of the landscape.
+        block_steps (int): The maximum number of time steps a band is advanced by at once.
+        band_bytes (int): The size of the copy of a band and its halo of each density array.
+
+    Returns:
+        int: The number of rows per band.
+    """
+    return max(4 * block_steps, band_bytes // (8 * (width + 2)) - 2 * block_steps)
+
+def estimate_out_of_core_memory(width, band_rows, block_steps, threads=None):
+    """
+    Estimate the memory resident at a time in the out-of-core mode.
+
+    Args:
+        width (int): The width of the landscape.
+        band_rows (int): The number of rows per band.
+        block_steps (int): The maximum number of time steps a band is advanced by at once.
+        threads (int): The number of bands advanced concurrently, or None for one.
+
+    Returns:
+        int: The estimated number of bytes.
+    """
+    slab_rows = band_rows + 2 * block_steps + 2
+    per_band = 4 * 8 * slab_rows * (width + 2) + calculate_workspace_bytes(slab_rows, width)
+    return per_band * (threads if threads is not None and threads > 1 else 1)
+
+def create_memory_mapped_array(work_directory, name, shape, dtype):
+    """
+    Create a zero-filled array in a memory-mapped .npy file, advising the OS that it is read sequentially.
+
+    Args:
+        work_directory (str): The directory of the file.
+        name (str): The name of the array; the file is `<name>.npy`.
+        shape (tuple): The shape of the array.
+        dtype (numpy.dtype): The data type of the array.
+
+    Returns:
+        numpy.memmap: The array.
+    """
+    array = np.lib.format.open_memmap(os.path.join(work_directory, name + ".npy"), mode="w+", dtype=dtype,
+                                      shape=shape)
+    if hasattr(mmap, "MADV_SEQUENTIAL") and getattr(array, "_mmap", None) is not None:
+        array._mmap.madvise(mmap.MADV_SEQUENTIAL)
+    return array
+
+def calculate_row_band_slices(height, band_rows):
+    """
+    Split the rows of a landscape (without halo) into bands.
+
+    Args:
+        height (int): The height of the landscape.
+        band_rows (int): The number of rows per band.
+
+    Returns:
+        list: The (first row, last row + 1) of each band, in the coordinates of the arrays with halo.
+    """
+    return [(first_row, min(first_row + band_rows, height + 1)) for first_row in range(1, height + 1, band_rows)]
+
+def load_landscape_out_of_core(landscape_file, work_directory, band_rows):
+    """
+    Load a landscape into memory-mapped arrays, streaming its file a line at a time.
+
+    Args:
+        landscape_file (str): The path to the input landscape file.
+        work_directory (str): The directory of the memory-mapped arrays.
+        band_rows (int): The number of rows per band.
+
+    Returns:
+        tuple: The landscape data, as returned by `load_landscape`, with memory-mapped landscape
+            and land neighbour count arrays.
+    """
+    width, height = read_landscape_dimensions(landscape_file)
+    logger.info("Width: %d Height: %d", width, height)
+    width_with_halo, height_with_halo = width + 2, height + 2
+    landscape = create_memory_mapped_array(work_directory, "landscape", (height_with_halo, width_with_halo), bool)
+    with open(landscape_file, "r") as f:
+        f.readline()
+        for row, line in enumerate(f, 1):
+            landscape[row, 1:width + 1] = np.array(line.split(), dtype=np.int8) != 0
+
+    num_lands = 0
+    neighbouring_land_count = create_memory_mapped_array(work_directory, "neighbours",
+                                                         (height_with_halo, width_with_halo), np.uint8)
+    for first_row, last_row in calculate_row_band_slices(height, band_rows):
+        land = landscape[first_row - 1:last_row + 1].astype(np.uint8)
+        num_lands += int(np.count_nonzero(land[1:-1]))
+        neighbouring_land_count[first_row:last_row, 1:width + 1] = \
+            land[:-2, 1:-1] + land[2:, 1:-1] + land[1:-1, :-2] + land[1:-1, 2:]
+    return width, height, width_with_halo, height_with_halo, landscape, num_lands, neighbouring_land_count
+
+def initialize_population_densities_out_of_core(seed, width, height, landscape, densities):
+    """
+    Initialize population densities in place, a row at a time, as `initialize_population_densities` does.
+
+    Args:
+        seed (int): The random seed used for density initialization.
+        width (int): The width of the landscape.
+        height (int): The height of the landscape.
+        landscape (numpy.ndarray): A 2D array representing the landscape.
+        densities (numpy.ndarray): The zero-filled 2D array (with halo) of densities to initialize.
+
+    Returns:
+        None
+    """
+    if seed == 0:
+        return
+    random.seed(seed)
+    for x in range(1, height + 1):
+        densities[x, 1:width + 1] = [random.uniform(0, 5.0) if land else 0.0
+                                     for land in landscape[x, 1:width + 1].tolist()]
+
+def calculate_density_statistics_out_of_core(mice_densities, foxes_densities, num_lands, band_rows):
+    """
+    Calculate maximum and average densities for mice and foxes, accumulating them a band of rows at a time.
+
+    Args:
+        mice_densities (numpy.ndarray): A 2D array (with halo) of mice densities.
+        foxes_densities (numpy.ndarray): A 2D array (with halo) of foxes densities.
+        num_lands (int): The number of land squares in the landscape.
+        band_rows (int): The number of rows per band.
+
+    Returns:
+        tuple: As returned by `calculate_density_statistics`.
+    """
+    maximum_mice_density = maximum_foxes_density = 0.0
+    mice_row_sums, foxes_row_sums = [], []
+    for first_row, last_row in calculate_row_band_slices(mice_densities.shape[0] - 2, band_rows):
+        mice_band, foxes_band = mice_densities[first_row:last_row], foxes_densities[first_row:last_row]
+        maximum_mice_density = max(maximum_mice_density, float(np.max(mice_band)))
+        maximum_foxes_density = max(maximum_foxes_density, float(np.max(foxes_band)))
+        mice_row_sums.extend(calculate_row_sums(mice_band))
+        foxes_row_sums.extend(calculate_row_sums(foxes_band))
+    average_mice_density = calculate_total_density(mice_row_sums) / num_lands if num_lands != 0 else 0
+    average_foxes_density = calculate_total_density(foxes_row_sums) / num_lands if num_lands != 0 else 0
+    return maximum_mice_density, maximum_foxes_density, average_mice_density, average_foxes_density
+
+def run_simulation_out_of_core(mice_birth_rate, mice_death_rate, mice_diffusion_rate, foxes_birth_rate,
+        foxes_death_rate, foxes_diffusion_rate, time_step_size, output_time_step,
+        simulation_duration, landscape_file, mouse_seed, fox_seed, work_directory, save_maps=True,
+        averages_callback=None, threads=None, block_steps=8, band_rows=None, max_memory=None, map_outputs=None,
+        output_directory="."):
+    """
+    Run a predator-prey simulation on memory-mapped arrays, for landscapes larger than the memory.
+
+    The output files are those of `run_simulation`, and are identical to them: the averages are
+    accumulated a band at a time from row sums, which are reduced independently of the bands.
+
+    Args:
+        mice_birth_rate, ..., fox_seed: As for `run_simulation`.
+        work_directory (str): The directory of the memory-mapped arrays; created if needed.
+        save_maps (bool): Whether to write a PPM map at each output step.
+        averages_callback (callable): As for `run_simulation`.
+        threads (int): The number of bands advanced concurrently, or None for one.
+        block_steps (int): The maximum number of time steps a band is advanced by at once.
+        band_rows (int): The number of rows per band, or None for bands of about `OUT_OF_CORE_BAND_BYTES`.
+        max_memory (int): If given, the memory budget of the run in bytes, to which the bands are narrowed.
+        map_outputs (list): As for `run_simulation`.
+        output_directory (str): As for `run_simulation`.
+
+    Raises:
+        MemoryError: If even bands of a single row exceed `max_memory`.
+
+    Returns:
+        tuple: The time step index reached at the end of the run and the (memory-mapped) mice and
+            foxes densities at that time step.
+    """
+    from predator_prey.simulate_predator_prey import getVersion, report_averages
+    logger.info("Predator-prey simulation %s (out of core, in %s)", getVersion(), work_directory)
+    os.makedirs(work_directory, exist_ok=True)
+    width, height = read_landscape_dimensions(landscape_file)
+    band_rows = band_rows or calculate_out_of_core_band_rows(width, block_steps)
+    if max_memory is not None:
+        while band_rows > 1 and estimate_out_of_core_memory(width, band_rows, block_steps, threads) > max_memory:
+            band_rows //= 2
+        if estimate_out_of_core_memory(width, band_rows, block_steps, threads) > max_memory:
+            raise MemoryError("Estimated resident memory of {:.1f} MB exceeds the maximum of {:.1f} MB".format(
+                estimate_out_of_core_memory(width, band_rows, block_steps, threads) / (1024 * 1024),
+                max_memory / (1024 * 1024)))
+    logger.info("Estimated resident memory: %.1f MB",
+                estimate_out_of_core_memory(width, band_rows, block_steps, threads) / (1024 * 1024))
+
+    width, height, width_with_halo, height_with_halo, landscape, num_lands, neighbouring_land_count = \
+        load_landscape_out_of_core(landscape_file, work_directory, band_rows)
+    logger.info("Number of land-only squares: %d", num_lands)
+
+    shape = (height_with_halo, width_with_halo)
+    initial_mice_densities = create_memory_mapped_array(work_directory, "mice", shape, float)
+    new_mice_densities = create_memory_mapped_array(work_directory, "new_mice", shape, float)
+    initial_foxes_densities = create_memory_mapped_array(work_directory, "foxes", shape, float)
+    new_foxes_densities = create_memory_mapped_array(work_directory, "new_foxes", shape, float)
+    initialize_population_densities_out_of_core(mouse_seed, width, height, landscape, initial_mice_densities)
+    initialize_population_densities_out_of_core(fox_seed, width, height, landscape, initial_foxes_densities)
+
+    with open(os.path.join(output_directory, "averages.csv"), "w") as f:
+        f.write("Timestep,Time,Mice,Foxes\n")
+
+    pool = get_thread_pool(threads) if threads is not None and threads > 1 else None
+    workspaces = {}
+    total_time_steps = int(simulation_duration / time_step_size)
+    time_step_index = 0
+    while time_step_index < total_time_steps:
+        if not time_step_index % output_time_step:
+            maximum_mice_density, maximum_foxes_density, average_mice_density, average_foxes_density = \
+                calculate_density_statistics_out_of_core(initial_mice_densities, initial_foxes_densities,
+                                                         num_lands, band_rows)
+            report_averages(time_step_index, time_step_index * time_step_size, average_mice_density,
+                            average_foxes_density, averages_callback, output_directory)
+            if save_maps:
+                save_ppm_file_from_densities(width, height, landscape, initial_mice_densities, maximum_mice_density,
+                                             initial_foxes_densities, maximum_foxes_density, time_step_index,
+                                             output_directory)
+            for map_output in map_outputs or []:
+                map_output(width, height, landscape, initial_mice_densities, maximum_mice_density,
+                           initial_foxes_densities, maximum_foxes_density, time_step_index)
+
+        next_time_step_index = min(total_time_steps, (time_step_index // output_time_step + 1) * output_time_step)
+        initial_mice_densities, new_mice_densities, initial_foxes_densities, new_foxes_densities = \
+            advance_population_densities_blocked(next_time_step_index - time_step_index, block_steps, band_rows,
+                                                 pool, workspaces, mice_birth_rate, mice_death_rate,
+                                                 mice_diffusion_rate, foxes_birth_rate, foxes_death_rate,
+                                                 foxes_diffusion_rate, time_step_size, width, height, landscape,
+                                                 neighbouring_land_count, initial_mice_densities,
+                                                 new_mice_densities, initial_foxes_densities, new_foxes_densities)
+        time_step_index = next_time_step_index
+
+    initial_mice_densities.flush()
+    initial_foxes_densities.flush()
+    logger.info("Simulation finished after %d time steps", total_time_steps,
+                extra={"event": {"event": "finished", "timestep": total_time_steps}})
+    return total_time_steps, initial_mice_densities, initial_foxes_densities
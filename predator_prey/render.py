@@ -0,0 +1,180 @@
+'''Offline rendering of density snapshots stored by `run_simulation`.
+
+Snapshots are rendered into map images in parallel, independently of the simulation.
+'''
+from argparse import ArgumentParser
+from multiprocessing import Pool
+import os
+import re
+import numpy as np
+from predator_prey.helper_functions import *
+
+IMAGE_FORMATS = {"ppm": save_ppm_file, "ppm-binary": save_binary_ppm_file}
+
+def list_snapshots(snapshot_directory):
+    """
+    List the time step indices of the density snapshots stored in a directory.
+
+    Args:
+        snapshot_directory (str): The directory containing the snapshots.
+
+    Returns:
+        list: The sorted time step indices of the stored snapshots.
+    """
+    time_step_indices = []
+    for file_name in os.listdir(snapshot_directory):
+        match = re.fullmatch(r"snapshot_(\d+)\.npz", file_name)
+        if match:
+            time_step_indices.append(int(match.group(1)))
+    return sorted(time_step_indices)
+
+def select_snapshots(time_step_indices, start=None, stop=None, every=1):
+    """
+    Select a subset of snapshot time step indices.
+
+    Args:
+        time_step_indices (list): The available time step indices.
+        start (int): The first time step index to include, or None to start from the first snapshot.
+        stop (int): The time step index at which to stop (exclusive), or None to include all later snapshots.
+        every (int): Keep only every `every`-th of the remaining snapshots.
+
+    Returns:
+        list: The selected time step indices.
+    """
+    selected = [index for index in time_step_indices
+                if (start is None or index >= start) and (stop is None or index < stop)]
+    return selected[::every]
+
+def load_density_snapshot(snapshot_directory, time_step_index):
+    """
+    Load the densities stored for an output step.
+
+    Args:
+        snapshot_directory (str): The directory containing the snapshots.
+        time_step_index (int): The time step index of the snapshot.
+
+    Returns:
+        tuple: A tuple containing the following elements:
+            time_in_secs (float): The simulated time of the snapshot.
+            mice_densities (numpy.ndarray): A 2D array (with halo) of mice densities.
+            foxes_densities (numpy.ndarray): A 2D array (with halo) of foxes densities.
+    """
+    with np.load(os.path.join(snapshot_directory, "snapshot_{:04d}.npz".format(time_step_index))) as snapshot:
+        return float(snapshot["time"]), snapshot["mice"], snapshot["foxes"]
+
+def calculate_maximum_densities(snapshot_directory, time_step_indices):
+    """
+    Calculate the maximum mice and foxes densities over a set of snapshots, for a fixed colour scale.
+
+    Args:
+        snapshot_directory (str): The directory containing the snapshots.
+        time_step_indices (list): The time step indices of the snapshots.
+
+    Returns:
+        tuple: The maximum mice density and the maximum foxes density.
+    """
+    maximum_mice_density = 0.0
+    maximum_foxes_density = 0.0
+    for time_step_index in time_step_indices:
+        _, mice_densities, foxes_densities = load_density_snapshot(snapshot_directory, time_step_index)
+        maximum_mice_density = max(maximum_mice_density, np.max(mice_densities))
+        maximum_foxes_density = max(maximum_foxes_density, np.max(foxes_densities))
+    return maximum_mice_density, maximum_foxes_density
+
+def render_snapshot(snapshot_directory, time_step_index, output_directory=".", image_format="ppm",
+                    maximum_mice_density=None, maximum_foxes_density=None):
+    """
+    Render a single density snapshot into a map image.
+
+    Colours are calculated as during the simulation. If no maximum densities are given,
+    each map is scaled by its own maximum densities, otherwise by the given (fixed) ones.
+
+    Args:
+        snapshot_directory (str): The directory containing the snapshots.
+        time_step_index (int): The time step index of the snapshot.
+        output_directory (str): The directory in which to write the map.
+        image_format (str): One of the keys of `IMAGE_FORMATS`.
+        maximum_mice_density (float): The mice density mapped to the full colour value, or None.
+        maximum_foxes_density (float): The foxes density mapped to the full colour value, or None.
+
+    Returns:
+        None
+    """
+    landscape = np.load(os.path.join(snapshot_directory, "landscape.npy"))
+    height, width = landscape.shape[0] - 2, landscape.shape[1] - 2
+    _, mice_densities, foxes_densities = load_density_snapshot(snapshot_directory, time_step_index)
+    if maximum_mice_density is None:
+        maximum_mice_density = np.max(mice_densities)
+    if maximum_foxes_density is None:
+        maximum_foxes_density = np.max(foxes_densities)
+
+    mice_density_colours = np.zeros((height, width), int)
+    foxes_density_colours = np.zeros((height, width), int)
+    calculate_density_colors(height, width, landscape, mice_densities, maximum_mice_density,
+                             foxes_densities, maximum_foxes_density, mice_density_colours, foxes_density_colours)
+    IMAGE_FORMATS[image_format](width, height, landscape, foxes_density_colours, mice_density_colours,
+                                time_step_index, output_directory)
+
+def render_snapshots(snapshot_directory, output_directory=".", time_step_indices=None, image_format="ppm",
+                     colour_scale="frame", processes=None):
+    """
+    Render density snapshots into map images in parallel.
+
+    Args:
+        snapshot_directory (str): The directory containing the snapshots.
+        output_directory (str): The directory in which to write the maps.
+        time_step_indices (list): The time step indices to render, or None to render all snapshots.
+        image_format (str): One of the keys of `IMAGE_FORMATS`.
+        colour_scale (str): 'frame' to scale each map by its own maximum densities (as during the
+            simulation) or 'fixed' to scale all maps by the maximum densities over the rendered snapshots.
+        processes (int): The number of worker processes, or None to use all cores.
+
+    Returns:
+        list: The rendered time step indices.
+    """
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError("Image format must be one of: {}".format(", ".join(IMAGE_FORMATS)))
+    if colour_scale not in ("frame", "fixed"):
+        raise ValueError("Colour scale must be 'frame' or 'fixed'")
+    if time_step_indices is None:
+        time_step_indices = list_snapshots(snapshot_directory)
+    os.makedirs(output_directory, exist_ok=True)
+
+    maximum_mice_density, maximum_foxes_density = None, None
+    if colour_scale == "fixed":
+        maximum_mice_density, maximum_foxes_density = calculate_maximum_densities(snapshot_directory, time_step_indices)
+
+    tasks = [(snapshot_directory, time_step_index, output_directory, image_format,
+              maximum_mice_density, maximum_foxes_density) for time_step_index in time_step_indices]
+    if processes == 1 or len(tasks) <= 1:
+        for task in tasks:
+            render_snapshot(*task)
+    else:
+        with Pool(processes) as pool:
+            pool.starmap(render_snapshot, tasks)
+    return time_step_indices
+
+def renderCommLineIntf():
+    par=ArgumentParser(description="Render stored density snapshots into map images")
+    par.add_argument("-s","--snapshot-directory",type=str,required=True,help="Directory containing the density snapshots")
+    par.add_argument("-o","--output-directory",type=str,default=".",help="Directory in which to write the maps")
+    par.add_argument("--start",type=int,default=None,help="First time step index to render")
+    par.add_argument("--stop",type=int,default=None,help="Time step index at which to stop rendering (exclusive)")
+    par.add_argument("--every",type=int,default=1,help="Render only every n-th of the selected snapshots")
+    par.add_argument("--format",type=str,default="ppm",choices=sorted(IMAGE_FORMATS),help="Image format")
+    par.add_argument("--colour-scale",type=str,default="frame",choices=["frame","fixed"],
+                        help="Scale colours per map or by the maximum over all rendered maps")
+    par.add_argument("-p","--processes",type=int,default=None,help="Number of worker processes (default: all cores)")
+    args=par.parse_args()
+
+    if args.every <= 0:
+        raise ValueError("Snapshot interval must be a positive integer greater than 0")
+    if args.processes is not None and args.processes <= 0:
+        raise ValueError("Number of worker processes must be a positive integer greater than 0")
+
+    time_step_indices = select_snapshots(list_snapshots(args.snapshot_directory), args.start, args.stop, args.every)
+    render_snapshots(args.snapshot_directory, args.output_directory, time_step_indices, args.format,
+                     args.colour_scale, args.processes)
+
+if __name__ == "__main__":
+    renderCommLineIntf()
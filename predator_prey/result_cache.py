@@ -0,0 +1,275 @@
+'''Content-addressed cache of simulation results.
+
+A run is fully determined by the landscape contents, the six rates, the time step size, the
+output time step and the seeds. Its averages, maps and final densities are stored under a hash
+of these inputs, so that an identical run is answered from the cache, and a longer run resumes
+from the end of the longest cached one instead of starting again from time step 0.
+
+Options of `run_simulation` that change the outputs beyond these inputs (e.g. landscape changes,
+sensitivities, adaptive output or further map outputs) are not part of the key, and are refused.
+An entry is written to a temporary directory and renamed into place, so that runs sharing a
+cache directory only ever see complete entries.
+'''
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CACHE_FORMAT_VERSION = 1
+
+# Options of `run_simulation` that leave the outputs unchanged, and so may be used with the cache
+CACHEABLE_OPTIONS = ["engine", "threads", "block_steps", "max_memory", "averages_callback", "landscape_data"]
+
+def calculate_cache_key(landscape_file, mice_birth_rate, mice_death_rate, mice_diffusion_rate, foxes_birth_rate,
+                        foxes_death_rate, foxes_diffusion_rate, time_step_size, output_time_step, mouse_seed, fox_seed):
+    """
+    Calculate the key under which the results of a run are cached.
+
+    Args:
+        landscape_file (str): Path to the landscape input file, whose contents are hashed.
+        mice_birth_rate (float): Birth rate of mice.
+        mice_death_rate (float): Death rate of mice.
+        mice_diffusion_rate (float): Diffusion rate of mice.
+        foxes_birth_rate (float): Birth rate of foxes.
+        foxes_death_rate (float): Death rate of foxes.
+        foxes_diffusion_rate (float): Diffusion rate of foxes.
+        time_step_size (float): Size of the time step.
+        output_time_step (int): Time step at which to output simulation results.
+        mouse_seed (int): Random seed for initializing mouse densities.
+        fox_seed (int): Random seed for initializing fox densities.
+
+    Returns:
+        str: The hexadecimal SHA-256 digest of the inputs.
+    """
+    digest = hashlib.sha256()
+    with open(landscape_file, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    rates = [mice_birth_rate, mice_death_rate, mice_diffusion_rate, foxes_birth_rate, foxes_death_rate,
+             foxes_diffusion_rate, time_step_size]
+    parameters = [CACHE_FORMAT_VERSION] + [float(rate) for rate in rates] + [int(output_time_step), int(mouse_seed), int(fox_seed)]
+    digest.update(json.dumps(parameters).encode("utf-8"))
+    return digest.hexdigest()
+
+def load_cache_entry(entry_directory):
+    """
+    Load the metadata and cached averages rows of a cache entry.
+
+    Args:
+        entry_directory (str): The directory of the cache entry.
+
+    Returns:
+        tuple: The metadata (a dict with the cached 'time_step_index' and whether 'maps' are cached)
+            and the list of cached averages.csv rows, or (None, []) if there is no such entry.
+    """
+    try:
+        with open(os.path.join(entry_directory, "meta.json")) as f:
+            metadata = json.load(f)
+        with open(os.path.join(entry_directory, "averages.csv")) as f:
+            rows = f.readlines()
+    except (FileNotFoundError, ValueError):
+        return None, []
+    return metadata, rows
+
+def calculate_directory_size(directory):
+    """
+    Calculate the total size in bytes of the files in a directory.
+
+    Args:
+        directory (str): The directory.
+
+    Returns:
+        int: The total size of the files.
+    """
+    return sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+
+def evict_cache_entries(cache_directory, cache_size, keep=None):
+    """
+    Remove the least recently used cache entries until the cache fits into its size limit.
+
+    Args:
+        cache_directory (str): The cache directory.
+        cache_size (int): The size limit of the cache in bytes.
+        keep (str): The key of an entry that is only removed if it exceeds the limit on its own.
+
+    Returns:
+        list: The keys of the removed entries.
+    """
+    entries = []
+    for entry in os.scandir(cache_directory):
+        metadata_file = os.path.join(entry.path, "meta.json")
+        # Entries being written or replaced by other runs are left to them
+        if entry.is_dir() and not entry.name.endswith((".tmp", ".old")) and os.path.exists(metadata_file):
+            entries.append((os.stat(metadata_file).st_mtime_ns, entry.name == keep, entry.name,
+                            calculate_directory_size(entry.path)))
+    # Least recently used first, the entry to keep last
+    entries.sort(key=lambda entry: (entry[1], entry[0]))
+    total_size = sum(entry[3] for entry in entries)
+    evicted = []
+    for _, _, key, size in entries:
+        if total_size <= cache_size:
+            break
+        shutil.rmtree(os.path.join(cache_directory, key), ignore_errors=True)
+        total_size -= size
+        evicted.append(key)
+    return evicted
+
+def store_cache_entry(entry_directory, time_step_index, maps, rows, mice_densities, foxes_densities,
+                      output_directory="."):
+    """
+    Store the results of a run in a cache entry, replacing the results already stored there.
+
+    The entry is written to a temporary directory and renamed into place, so that an entry is
+    always complete, even if several runs store the same entry at once.
+
+    Args:
+        entry_directory (str): The directory of the cache entry.
+        time_step_index (int): The time step index reached at the end of the run.
+        maps (bool): Whether the entry holds the maps of all its output steps, copied from
+            `output_directory`.
+        rows (list): All averages.csv rows (without header) up to `time_step_index`.
+        mice_densities (numpy.ndarray): The mice densities at `time_step_index`.
+        foxes_densities (numpy.ndarray): The foxes densities at `time_step_index`.
+        output_directory (str): The directory of the maps of the run.
+
+    Returns:
+        None
+    """
+    suffix = "{}.{}".format(os.getpid(), threading.get_ident())
+    temporary_directory = "{}.{}.tmp".format(entry_directory, suffix)
+    old_directory = "{}.{}.old".format(entry_directory, suffix)
+    os.makedirs(temporary_directory)
+    try:
+        if maps:
+            for row in rows:
+                file_name = "map_{:04d}.ppm".format(int(row.split(",")[0]))
+                shutil.copyfile(os.path.join(output_directory, file_name), os.path.join(temporary_directory, file_name))
+        np.savez(os.path.join(temporary_directory, "state.npz"), mice=mice_densities, foxes=foxes_densities)
+        with open(os.path.join(temporary_directory, "averages.csv"), "w") as f:
+            f.writelines(rows)
+        with open(os.path.join(temporary_directory, "meta.json"), "w") as f:
+            json.dump({"time_step_index": time_step_index, "maps": maps}, f)
+        # A directory is only renamed over an empty one, so the old entry is moved aside first
+        try:
+            os.rename(entry_directory, old_directory)
+        except FileNotFoundError:
+            pass
+        try:
+            os.replace(temporary_directory, entry_directory)
+        except OSError:
+            # Another run stored the entry first
+            if not os.path.isdir(entry_directory):
+                raise
+    finally:
+        shutil.rmtree(temporary_directory, ignore_errors=True)
+        shutil.rmtree(old_directory, ignore_errors=True)
+
+def run_cached_simulation(mice_birth_rate, mice_death_rate, mice_diffusion_rate, foxes_birth_rate,
+        foxes_death_rate, foxes_diffusion_rate, time_step_size, output_time_step,
+        simulation_duration, landscape_file, mouse_seed, fox_seed, cache_directory, cache_size,
+        save_maps=True, snapshot_directory=None, output_directory=".", **options):
+    """
+    Run a predator-prey simulation, reusing the results of earlier identical runs.
+
+    The output files are the same as those of `run_simulation`. On a cache hit they are copied from
+    the cache. Otherwise the run resumes from the longest cached prefix (or starts from time step 0)
+    and its results are added to the cache, evicting the least recently used entries beyond `cache_size`.
+    Runs storing density snapshots bypass the cache.
+
+    Args:
+        mice_birth_rate (float): Birth rate of mice.
+        mice_death_rate (float): Death rate of mice.
+        mice_diffusion_rate (float): Diffusion rate of mice.
+        foxes_birth_rate (float): Birth rate of foxes.
+        foxes_death_rate (float): Death rate of foxes.
+        foxes_diffusion_rate (float): Diffusion rate of foxes.
+        time_step_size (float): Size of the time step.
+        output_time_step (int): Time step at which to output simulation results.
+        simulation_duration (int): Duration of the simulation.
+        landscape_file (str): Path to the landscape input file.
+        mouse_seed (int): Random seed for initializing mouse densities.
+        fox_seed (int): Random seed for initializing fox densities.
+        cache_directory (str): The directory of the result cache.
+        cache_size (int): The size limit of the result cache in bytes.
+        save_maps (bool): Whether to write a PPM map at each output step.
+        snapshot_directory (str): If given, the directory in which raw density snapshots are stored.
+        output_directory (str): The directory of the output files. Defaults to the current directory.
+        **options: Further keyword arguments passed on to `run_simulation`, of `CACHEABLE_OPTIONS`.
+
+    Raises:
+        ValueError: If an option other than `CACHEABLE_OPTIONS` is given, as it would change the
+            outputs without changing the cache key.
+
+    Returns:
+        None
+    """
+    from predator_prey.simulate_predator_prey import run_simulation
+    for name, value in options.items():
+        if name not in CACHEABLE_OPTIONS and value is not None:
+            raise ValueError("The option {} of run_simulation is not supported with the result cache".format(name))
+    parameters = (mice_birth_rate, mice_death_rate, mice_diffusion_rate, foxes_birth_rate, foxes_death_rate,
+                  foxes_diffusion_rate, time_step_size, output_time_step, simulation_duration, landscape_file,
+                  mouse_seed, fox_seed)
+    if snapshot_directory is not None:
+        logger.info("Density snapshots are not cached, running without the result cache")
+        run_simulation(*parameters, save_maps=save_maps, snapshot_directory=snapshot_directory,
+                       output_directory=output_directory, **options)
+        return
+
+    key = calculate_cache_key(landscape_file, mice_birth_rate, mice_death_rate, mice_diffusion_rate, foxes_birth_rate,
+                              foxes_death_rate, foxes_diffusion_rate, time_step_size, output_time_step,
+                              mouse_seed, fox_seed)
+    entry_directory = os.path.join(cache_directory, key)
+    metadata, rows = load_cache_entry(entry_directory)
+    if metadata is not None and save_maps and not metadata["maps"]:
+        metadata, rows = None, []
+    cached_time_steps = metadata["time_step_index"] if metadata is not None else 0
+    total_time_steps = int(simulation_duration / time_step_size)
+
+    # Write the cached prefix of the results
+    prefix_rows = [row for row in rows if int(row.split(",")[0]) < total_time_steps]
+    with open(os.path.join(output_directory, "averages.csv"), "w") as f:
+        f.write("Timestep,Time,Mice,Foxes\n")
+        f.writelines(prefix_rows)
+    averages_callback = options.get("averages_callback")
+    for row in prefix_rows:
+        time_step_index, time_in_secs, average_mice_density, average_foxes_density = row.split(",")
+        logger.info("Averages. Timestep: %s Time (s): %s Mice: %s Foxes: %s", time_step_index, time_in_secs,
+                    average_mice_density, average_foxes_density.strip(),
+                    extra={"event": {"event": "averages", "timestep": int(time_step_index), "time": float(time_in_secs),
+                                     "mice": float(average_mice_density), "foxes": float(average_foxes_density)}})
+        if averages_callback is not None:
+            averages_callback(int(time_step_index), float(time_in_secs), float(average_mice_density),
+                              float(average_foxes_density))
+    if save_maps:
+        for row in prefix_rows:
+            file_name = "map_{:04d}.ppm".format(int(row.split(",")[0]))
+            shutil.copyfile(os.path.join(entry_directory, file_name), os.path.join(output_directory, file_name))
+
+    if metadata is not None and cached_time_steps >= total_time_steps:
+        logger.info("Result cache hit: %s", key)
+        os.utime(os.path.join(entry_directory, "meta.json"))
+        return
+
+    initial_state = None
+    if metadata is not None:
+        logger.info("Result cache: resuming from time step %d", cached_time_steps)
+        with np.load(os.path.join(entry_directory, "state.npz")) as state:
+            initial_state = (cached_time_steps, state["mice"], state["foxes"])
+    time_step_index, mice_densities, foxes_densities = run_simulation(*parameters, save_maps=save_maps,
+                                                                      initial_state=initial_state,
+                                                                      output_directory=output_directory, **options)
+
+    with open(os.path.join(output_directory, "averages.csv")) as f:
+        rows = f.readlines()[1:]
+    # The maps of the cached prefix were copied to the output directory, so all maps are there
+    maps = save_maps and (metadata is None or metadata["maps"])
+    os.makedirs(cache_directory, exist_ok=True)
+    store_cache_entry(entry_directory, time_step_index, maps, rows, mice_densities, foxes_densities,
+                      output_directory)
+    evict_cache_entries(cache_directory, cache_size, keep=key)
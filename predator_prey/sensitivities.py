@@ -0,0 +1,217 @@
+'''Forward-mode sensitivities of the average densities to the rates.
+
+Alongside the densities, the derivative of the densities of every square with respect to each
+selected rate (a tangent-linear field) is propagated through the linearization of the update of
+`update_population_density`. Where the update is clamped at 0 (or on water), the derivative is 0.
+All selected rates are propagated together with numpy, in one pass over the time steps.
+'''
+import numpy as np
+from predator_prey.helper_functions import calculate_average_density
+
+# The rates, in the order of the arguments of `update_population_densities`
+SENSITIVITY_PARAMETERS = ["birth_mice", "death_mice", "diffusion_mice", "birth_foxes", "death_foxes",
+                          "diffusion_foxes"]
+
+def parse_sensitivity_parameters(text):
+    """
+    Parse a comma-separated list of rates, or 'all'.
+
+    Args:
+        text (str): The rates, by the names of their command-line options (e.g. 'birth_mice,death_foxes').
+
+    Raises:
+        ValueError: If a name is not one of `SENSITIVITY_PARAMETERS`.
+
+    Returns:
+        list: The rates, in the order of `SENSITIVITY_PARAMETERS`.
+    """
+    if text == "all":
+        return list(SENSITIVITY_PARAMETERS)
+    parameters = [parameter.strip().replace("-", "_") for parameter in text.split(",")]
+    for parameter in parameters:
+        if parameter not in SENSITIVITY_PARAMETERS:
+            raise ValueError("Unknown rate {}, expected one of: {}".format(parameter, ", ".join(SENSITIVITY_PARAMETERS)))
+    return [parameter for parameter in SENSITIVITY_PARAMETERS if parameter in parameters]
+
+def create_tangent_arrays(parameters, shape):
+    """
+    Create the tangent-linear fields of the initial densities, which do not depend on the rates.
+
+    Args:
+        parameters (list): The selected rates.
+        shape (tuple): The shape of the density arrays (with halo).
+
+    Returns:
+        tuple: The mice and foxes tangents, each of shape (number of rates,) + `shape`, and spare
+            arrays of the same shapes.
+    """
+    return tuple(np.zeros((len(parameters),) + shape) for _ in range(4))
+
+def create_tangent_workspace(parameters, width, height):
+    """
+    Allocate the working arrays of `update_tangents`, reused between time steps.
+
+    Args:
+        parameters (list): The selected rates.
+        width (int): The width of the landscape.
+        height (int): The height of the landscape.
+
+    Returns:
+        tuple: Three float arrays of shape (number of rates, height, width), three float arrays and a
+            boolean array of shape (height, width).
+    """
+    return (np.empty((len(parameters), height, width)), np.empty((len(parameters), height, width)),
+            np.empty((len(parameters), height, width)), np.empty((height, width)), np.empty((height, width)),
+            np.empty((height, width)), np.empty((height, width), bool))
+
+def calculate_tangent_workspace_bytes(parameters, width, height):
+    """
+    Calculate the size of the working arrays allocated by `create_tangent_workspace`.
+
+    Args:
+        parameters (list): The selected rates.
+        width (int): The width of the landscape.
+        height (int): The height of the landscape.
+
+    Returns:
+        int: The number of bytes.
+    """
+    return height * width * (3 * 8 * len(parameters) + 3 * 8 + 1)
+
+def estimate_sensitivity_memory(parameters, width, height):
+    """
+    Estimate the memory of the sensitivities: the tangents of `create_tangent_arrays` and the
+    working arrays of `update_tangents`.
+
+    Args:
+        parameters (list): The selected rates.
+        width (int): The width of the landscape.
+        height (int): The height of the landscape.
+
+    Returns:
+        int: The estimated number of bytes.
+    """
+    return 4 * 8 * len(parameters) * (width + 2) * (height + 2) + calculate_tangent_workspace_bytes(parameters, width,
+                                                                                                       height)
+
+def calculate_neighbour_sum(densities, out):
+    """
+    Sum the densities of the four neighbours of each square, as `calculate_total_neighbours` does.
+
+    Args:
+        densities (numpy.ndarray): An array whose last two axes are the rows and columns (with halo).
+        out (numpy.ndarray): The array receiving the sums for the squares without halo.
+
+    Returns:
+        numpy.ndarray: `out`.
+    """
+    np.add(densities[..., :-2, 1:-1], densities[..., 2:, 1:-1], out=out)
+    np.add(out, densities[..., 1:-1, :-2], out=out)
+    return np.add(out, densities[..., 1:-1, 2:], out=out)
+
+def update_tangents(parameters, mice_birth_rate, mice_death_rate, mice_diffusion_rate, foxes_birth_rate,
+                    foxes_death_rate, foxes_diffusion_rate, time_step_size, landscape, neighbouring_land_count,
+                    mice_densities, foxes_densities, new_mice_densities, new_foxes_densities, mice_tangents,
+                    foxes_tangents, new_mice_tangents, new_foxes_tangents, workspace=None):
+    """
+    Advance the tangent-linear fields by the time step from `mice_densities` to `new_mice_densities`.
+
+    Args:
+        parameters (list): The selected rates, in the order of the tangents.
+        mice_birth_rate, ..., time_step_size: As for `update_population_densities`.
+        landscape (numpy.ndarray): A 2D array (with halo) representing the landscape.
+        neighbouring_land_count (numpy.ndarray): A 2D array (with halo) of the land neighbours of each square.
+        mice_densities (numpy.ndarray): The mice densities before the time step.
+        foxes_densities (numpy.ndarray): The foxes densities before the time step.
+        new_mice_densities (numpy.ndarray): The mice densities after the time step.
+        new_foxes_densities (numpy.ndarray): The foxes densities after the time step.
+        mice_tangents (numpy.ndarray): The mice tangents before the time step.
+        foxes_tangents (numpy.ndarray): The foxes tangents before the time step.
+        new_mice_tangents (numpy.ndarray): The array receiving the mice tangents after the time step.
+        new_foxes_tangents (numpy.ndarray): The array receiving the foxes tangents after the time step.
+        workspace (tuple): Working arrays from `create_tangent_workspace`, reused between calls. If
+            None, they are allocated for this call.
+
+    Returns:
+        None
+    """
+    interior = (slice(1, -1), slice(1, -1))
+    if workspace is None:
+        workspace = create_tangent_workspace(parameters, landscape.shape[1] - 2, landscape.shape[0] - 2)
+    d_predation, total, term, neighbours, other_total, other_term, clamped = workspace
+    mice, foxes = mice_densities[interior], foxes_densities[interior]
+    np.copyto(neighbours, neighbouring_land_count[interior])
+    d_mice, d_foxes = mice_tangents[(slice(None),) + interior], foxes_tangents[(slice(None),) + interior]
+    d_new_mice = new_mice_tangents[(slice(None),) + interior]
+    d_new_foxes = new_foxes_tangents[(slice(None),) + interior]
+
+    # Derivatives through the densities: d_predation = d_mice * foxes + mice * d_foxes
+    np.multiply(d_mice, foxes, out=d_predation)
+    np.multiply(mice, d_foxes, out=term)
+    np.add(d_predation, term, out=d_predation)
+    for d_densities, d_new_densities, tangents, birth_rate, death_rate, diffusion_rate, species in (
+            (d_mice, d_new_mice, mice_tangents, mice_birth_rate, mice_death_rate, mice_diffusion_rate, "mice"),
+            (d_foxes, d_new_foxes, foxes_tangents, foxes_birth_rate, foxes_death_rate, foxes_diffusion_rate, "foxes")):
+        # diffusion_rate * (neighbouring tangents - land neighbours * tangent)
+        calculate_neighbour_sum(tangents, total)
+        np.multiply(neighbours, d_densities, out=term)
+        np.subtract(total, term, out=total)
+        np.multiply(diffusion_rate, total, out=total)
+        if species == "mice":
+            # birth_rate * d_mice - death_rate * d_predation
+            np.multiply(birth_rate, d_densities, out=term)
+            np.multiply(death_rate, d_predation, out=d_new_densities)
+        else:
+            # birth_rate * d_predation - death_rate * d_foxes
+            np.multiply(birth_rate, d_predation, out=term)
+            np.multiply(death_rate, d_densities, out=d_new_densities)
+        np.subtract(term, d_new_densities, out=term)
+        np.add(term, total, out=term)
+        np.multiply(time_step_size, term, out=term)
+        np.add(d_densities, term, out=d_new_densities)
+
+    # Direct derivatives with respect to each rate
+    for index, parameter in enumerate(parameters):
+        if parameter in ("birth_mice", "death_foxes"):
+            np.multiply(time_step_size, mice if parameter == "birth_mice" else foxes, out=other_total)
+        elif parameter in ("death_mice", "birth_foxes"):
+            np.multiply(time_step_size, mice, out=other_total)
+            np.multiply(other_total, foxes, out=other_total)
+        else:
+            densities = mice_densities if parameter == "diffusion_mice" else foxes_densities
+            calculate_neighbour_sum(densities, other_total)
+            np.multiply(neighbours, densities[interior], out=other_term)
+            np.subtract(other_total, other_term, out=other_total)
+            np.multiply(time_step_size, other_total, out=other_total)
+        if parameter in ("birth_mice", "diffusion_mice"):
+            np.add(d_new_mice[index], other_total, out=d_new_mice[index])
+        elif parameter == "death_mice":
+            np.subtract(d_new_mice[index], other_total, out=d_new_mice[index])
+        elif parameter in ("birth_foxes", "diffusion_foxes"):
+            np.add(d_new_foxes[index], other_total, out=d_new_foxes[index])
+        else:
+            np.subtract(d_new_foxes[index], other_total, out=d_new_foxes[index])
+
+    # Water squares do not change, and neither do squares clamped at 0
+    land = landscape[interior]
+    if land.dtype != bool:
+        land = land != 0
+    for new_densities, d_new_densities in ((new_mice_densities, d_new_mice), (new_foxes_densities, d_new_foxes)):
+        np.greater(new_densities[interior], 0, out=clamped)
+        np.logical_and(clamped, land, out=clamped)
+        np.logical_not(clamped, out=clamped)
+        np.copyto(d_new_densities, 0.0, where=clamped)
+
+def calculate_average_sensitivities(num_lands, tangents):
+    """
+    Calculate the derivatives of the average density with respect to each rate.
+
+    Args:
+        num_lands (int): The number of land squares in the landscape.
+        tangents (numpy.ndarray): The tangents of the densities, one field per rate.
+
+    Returns:
+        numpy.ndarray: The derivative of the average density for each rate, or zeros if `num_lands` is 0.
+    """
+    return np.array([calculate_average_density(num_lands, parameter_tangents) for parameter_tangents in tangents],
+                    dtype=float)
@@ -0,0 +1,297 @@
+'''Live density frames in a shared-memory ring buffer.
+
+A running simulation publishes the densities, maxima and averages of each output step into a
+named shared-memory block, which local processes attach to and read as NumPy views, without
+copies or files. The block starts with a header:
+
+    magic (8 bytes), format version, slots, height with halo, width with halo, latest frame
+
+(each an int64), followed by `slots` slots. Each slot has a header:
+
+    sequence (int64), time step index (int64), time, maximum mice density, maximum foxes density,
+    average mice density, average foxes density (each a float64)
+
+followed by the mice and foxes densities (with halo) as float64 arrays. Frames are numbered from 1,
+and frame n is written to slot (n - 1) % slots. The sequence of a slot is a seqlock: it is set to
+2n - 1 while frame n is written and to 2n once it is complete, after which the latest frame of the
+header is set to n. A reader checks the sequence before and after using a frame, and the frame is
+intact if it is 2n both times. A frame is only overwritten `slots` frames later, so a reader
+keeping up with the output steps can use the views of a frame in place.
+'''
+from argparse import ArgumentParser
+import logging
+import time
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+from predator_prey.logging_config import LOG_LEVELS, configure_logging
+
+logger = logging.getLogger("predator_prey.shared_frames")
+
+FRAME_MAGIC = b"PPFRAMES"
+FRAME_FORMAT_VERSION = 1
+DEFAULT_FRAME_SLOTS = 4
+HEADER_BYTES = 64
+SLOT_HEADER_BYTES = 64
+
+# Names of the blocks created by this process, which it tracks for removal
+created_block_names = set()
+
+def calculate_frame_buffer_bytes(width, height, slots=DEFAULT_FRAME_SLOTS):
+    """
+    Calculate the size of the shared-memory block of a frame buffer.
+
+    Args:
+        width (int): The width of the landscape.
+        height (int): The height of the landscape.
+        slots (int): The number of frames kept in the ring buffer.
+
+    Returns:
+        int: The number of bytes.
+    """
+    return HEADER_BYTES + slots * (SLOT_HEADER_BYTES + 2 * 8 * (width + 2) * (height + 2))
+
+class SharedFrameBuffer:
+    """A ring buffer of density frames in a named shared-memory block, see the module documentation."""
+
+    def __init__(self, block, owner):
+        self.block = block
+        self.owner = owner
+        if bytes(block.buf[:8]) != FRAME_MAGIC:
+            raise ValueError("The shared memory block {} is not a frame buffer".format(block.name))
+        self.header = np.ndarray((7,), np.int64, block.buf, 8)
+        version, self.slots, height_with_halo, width_with_halo = [int(value) for value in self.header[:4]]
+        if version != FRAME_FORMAT_VERSION:
+            raise ValueError("Unsupported frame buffer format version {}".format(version))
+        self.shape = (height_with_halo, width_with_halo)
+        slot_bytes = SLOT_HEADER_BYTES + 2 * 8 * height_with_halo * width_with_halo
+        self.sequences, self.time_step_indices, self.values, self.mice_densities, self.foxes_densities = \
+            [], [], [], [], []
+        for slot in range(self.slots):
+            offset = HEADER_BYTES + slot * slot_bytes
+            self.sequences.append(np.ndarray((1,), np.int64, block.buf, offset))
+            self.time_step_indices.append(np.ndarray((1,), np.int64, block.buf, offset + 8))
+            self.values.append(np.ndarray((5,), np.float64, block.buf, offset + 16))
+            self.mice_densities.append(np.ndarray(self.shape, np.float64, block.buf, offset + SLOT_HEADER_BYTES))
+            self.foxes_densities.append(np.ndarray(self.shape, np.float64, block.buf,
+                                                   offset + SLOT_HEADER_BYTES + 8 * height_with_halo * width_with_halo))
+
+    @classmethod
+    def create(cls, name, width, height, slots=DEFAULT_FRAME_SLOTS):
+        """
+        Create a frame buffer, to publish frames into.
+
+        Args:
+            name (str): The name of the shared-memory block.
+            width (int): The width of the landscape.
+            height (int): The height of the landscape.
+            slots (int): The number of frames kept in the ring buffer.
+
+        Raises:
+            ValueError: If the number of slots is not positive.
+            FileExistsError: If a shared-memory block of that name exists already.
+
+        Returns:
+            SharedFrameBuffer: The frame buffer, which removes the block when closed.
+        """
+        if slots <= 0:
+            raise ValueError("Number of frame slots must be a positive integer greater than 0")
+        block = shared_memory.SharedMemory(name, create=True, size=calculate_frame_buffer_bytes(width, height, slots))
+        created_block_names.add(block._name)
+        block.buf[:8] = FRAME_MAGIC
+        np.ndarray((7,), np.int64, block.buf, 8)[:] = [FRAME_FORMAT_VERSION, slots, height + 2, width + 2, 0, 0, 0]
+        return cls(block, True)
+
+    @classmethod
+    def attach(cls, name):
+        """
+        Attach to the frame buffer of a running simulation, to read frames from.
+
+        Args:
+            name (str): The name of the shared-memory block.
+
+        Raises:
+            FileNotFoundError: If there is no shared-memory block of that name.
+            ValueError: If the block is not a frame buffer.
+
+        Returns:
+            SharedFrameBuffer: The frame buffer, which leaves the block in place when closed.
+        """
+        block = shared_memory.SharedMemory(name)
+        # Only the publisher removes the block, so it is not tracked for removal at the exit of readers
+        if block._name not in created_block_names:
+            resource_tracker.unregister(block._name, "shared_memory")
+        return cls(block, False)
+
+    @property
+    def latest_frame(self):
+        """int: The number of the latest complete frame, or 0 if no frame has been published yet."""
+        return int(self.header[4])
+
+    def publish(self, time_step_index, time_in_secs, mice_densities, maximum_mice_density, foxes_densities,
+                maximum_foxes_density, average_mice_density, average_foxes_density):
+        """
+        Publish the densities and statistics of an output step as the next frame.
+
+        Args:
+            time_step_index (int): The time step index.
+            time_in_secs (float): The time.
+            mice_densities (numpy.ndarray): A 2D array (with halo) of mice densities.
+            maximum_mice_density (float): The maximum density of mice.
+            foxes_densities (numpy.ndarray): A 2D array (with halo) of foxes densities.
+            maximum_foxes_density (float): The maximum density of foxes.
+            average_mice_density (float): The average density of mice.
+            average_foxes_density (float): The average density of foxes.
+
+        Returns:
+            int: The number of the frame.
+        """
+        frame = self.latest_frame + 1
+        slot = (frame - 1) % self.slots
+        self.sequences[slot][0] = 2 * frame - 1
+        self.time_step_indices[slot][0] = time_step_index
+        self.values[slot][:] = [time_in_secs, maximum_mice_density, maximum_foxes_density, average_mice_density,
+                                average_foxes_density]
+        np.copyto(self.mice_densities[slot], mice_densities)
+        np.copyto(self.foxes_densities[slot], foxes_densities)
+        self.sequences[slot][0] = 2 * frame
+        self.header[4] = frame
+        return frame
+
+    def read_frame(self, frame):
+        """
+        Read a frame as views of the shared memory.
+
+        The views stay valid until the frame is overwritten, `slots` frames later, which
+        `is_frame_intact` tells.
+
+        Args:
+            frame (int): The number of the frame.
+
+        Returns:
+            dict: The 'frame' number, 'time_step' index, 'time', 'maximum_mice_density',
+                'maximum_foxes_density', 'average_mice_density', 'average_foxes_density' and the
+                'mice_densities' and 'foxes_densities' views, or None if the frame is not (or no
+                longer) in the buffer.
+        """
+        slot = (frame - 1) % self.slots
+        if frame <= 0 or self.sequences[slot][0] != 2 * frame:
+            return None
+        time_in_secs, maximum_mice_density, maximum_foxes_density, average_mice_density, average_foxes_density = \
+            [float(value) for value in self.values[slot]]
+        contents = {"frame": frame, "time_step": int(self.time_step_indices[slot][0]), "time": time_in_secs,
+                    "maximum_mice_density": maximum_mice_density, "maximum_foxes_density": maximum_foxes_density,
+                    "average_mice_density": average_mice_density, "average_foxes_density": average_foxes_density,
+                    "mice_densities": self.mice_densities[slot], "foxes_densities": self.foxes_densities[slot]}
+        # The statistics were read intact only if the frame was not overwritten meanwhile
+        return contents if self.is_frame_intact(frame) else None
+
+    def read_latest_frame(self):
+        """
+        Read the latest complete frame as views of the shared memory.
+
+        Returns:
+            dict: As returned by `read_frame`, or None if no frame has been published yet.
+        """
+        while True:
+            frame = self.latest_frame
+            if frame == 0:
+                return None
+            contents = self.read_frame(frame)
+            if contents is not None:
+                return contents
+
+    def is_frame_intact(self, frame):
+        """
+        Check that a frame has not been overwritten, e.g. after using its views.
+
+        Args:
+            frame (int): The number of the frame.
+
+        Returns:
+            bool: Whether the slot of the frame still holds the complete frame.
+        """
+        return self.sequences[(frame - 1) % self.slots][0] == 2 * frame
+
+    def close(self):
+        """Detach from the shared-memory block, removing it if this frame buffer created it."""
+        # The views into the block must be released before it can be closed
+        self.header = self.sequences = self.time_step_indices = self.values = None
+        self.mice_densities = self.foxes_densities = None
+        self.block.close()
+        if self.owner:
+            self.block.unlink()
+            created_block_names.discard(self.block._name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def follow_frames(name, poll_interval=0.1, count=None, timeout=None):
+    """
+    Attach to a frame buffer and yield its new frames as they are published.
+
+    A frame buffer not created yet (e.g. by a simulation still starting) is waited for. Frames
+    published faster than they are polled are skipped, as a dashboard would.
+
+    Args:
+        name (str): The name of the shared-memory block.
+        poll_interval (float): The number of seconds between two polls of the latest frame.
+        count (int): The number of frames after which to stop, or None to follow the frames until `timeout`.
+        timeout (float): The number of seconds without a new frame (or without the frame buffer) after
+            which to stop, or None to wait forever.
+
+    Raises:
+        FileNotFoundError: If the frame buffer does not appear within `timeout`.
+
+    Yields:
+        dict: The latest frame, as returned by `SharedFrameBuffer.read_frame`, which is emptied when
+            the next frame is requested.
+    """
+    start_time = time.monotonic()
+    while True:
+        try:
+            frame_buffer = SharedFrameBuffer.attach(name)
+            break
+        except FileNotFoundError:
+            if timeout is not None and time.monotonic() - start_time > timeout:
+                raise
+            time.sleep(poll_interval)
+
+    with frame_buffer:
+        last_frame, last_time = 0, time.monotonic()
+        while count is None or count > 0:
+            contents = frame_buffer.read_latest_frame()
+            if contents is not None and contents["frame"] != last_frame:
+                last_frame, last_time = contents["frame"], time.monotonic()
+                if count is not None:
+                    count -= 1
+                yield contents
+                # Drop the views, so that the frame buffer can be closed
+                contents.clear()
+            elif timeout is not None and time.monotonic() - last_time > timeout:
+                return
+            else:
+                time.sleep(poll_interval)
+
+def frameReaderCommLineIntf():
+    par=ArgumentParser(description="Follow the live density frames published by a running simulation")
+    par.add_argument("name",type=str,help="Name of the shared-memory frame buffer (as given to --shared-frames)")
+    par.add_argument("--poll-interval",type=float,default=0.1,help="Number of seconds between two polls")
+    par.add_argument("--count",type=int,default=None,help="Number of frames after which to stop")
+    par.add_argument("--timeout",type=float,default=None,help="Number of seconds without a new frame after which to stop")
+    par.add_argument("--log-level",type=str,default="INFO",choices=LOG_LEVELS,help="Level of the console log")
+    par.add_argument("-q","--quiet",action="store_true",help="Only log warnings and errors")
+    args=par.parse_args()
+    configure_logging(args.log_level, args.quiet)
+
+    if args.poll_interval <= 0:
+        raise ValueError("Poll interval must be a positive number greater than 0")
+    for contents in follow_frames(args.name, args.poll_interval, args.count, args.timeout):
+        logger.info("Frame: %d Timestep: %d Time (s): %.1f Mice: %.17f Foxes: %.17f", contents["frame"],
+                    contents["time_step"], contents["time"], contents["average_mice_density"],
+                    contents["average_foxes_density"])
+
+if __name__ == "__main__":
+    frameReaderCommLineIntf()
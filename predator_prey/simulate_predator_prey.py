@@ -3,14 +3,33 @@
 Version 3.0
 '''
 from argparse import ArgumentParser
+import logging
+import os
 import numpy as np
 from predator_prey.validate_arguments import *
 from predator_prey.helper_functions import *
+from predator_prey.logging_config import LOG_LEVELS, configure_logging
+from predator_prey.engines import ENGINES, create_advance_function, estimate_engine_memory
+from predator_prey.map_outputs import DEFAULT_OVERVIEW_PATTERN, DEFAULT_REGION_PATTERN, create_map_outputs, parse_region
+from predator_prey.tiles import DEFAULT_TILE_SIZE, create_tile_output
+from predator_prey.sensitivities import *
+from predator_prey.shared_frames import DEFAULT_FRAME_SLOTS, SharedFrameBuffer
+from predator_prey.landscape_changes import *
+
+logger = logging.getLogger("predator_prey.simulate_predator_prey")
+
+OUTPUT_CRITERIA = ["averages", "densities"]
 
 def getVersion():
     return 3.0
 
-def simCommLineIntf():
+def create_argument_parser():
+    """
+    Create the command-line argument parser of the simulation.
+
+    Returns:
+        argparse.ArgumentParser: The parser for the simulation parameters.
+    """
     par=ArgumentParser()
     par.add_argument("-r","--birth-mice",type=float,default=0.1,help="Birth rate of mice")
     par.add_argument("-a","--death-mice",type=float,default=0.05,help="Rate at which foxes eat mice")
@@ -25,18 +44,168 @@ def simCommLineIntf():
                         help="Input landscape file")
     par.add_argument("-ms","--mouse-seed",type=int,default=1,help="Random seed for initialising mouse densities")
     par.add_argument("-fs","--fox-seed",type=int,default=1,help="Random seed for initialising fox densities")
-    args=par.parse_args()
+    par.add_argument("--landscape-cache-directory",type=str,default=None,
+                        help="Directory of compiled landscapes, from which the landscape is memory-mapped instead of parsed")
+    par.add_argument("-sd","--snapshot-directory",type=str,default=None,
+                        help="Directory in which to store raw density snapshots for offline rendering")
+    par.add_argument("--no-maps",action="store_true",help="Do not write PPM maps during the simulation")
+    par.add_argument("--cache-directory",type=str,default=None,
+                        help="Directory of a result cache from which identical or shorter earlier runs are reused")
+    par.add_argument("--cache-size",type=float,default=1024,help="Size limit of the result cache (in MB)")
+    par.add_argument("-e","--engine",type=str,default="loop",choices=ENGINES,
+                        help="Engine updating the population densities (all give identical results)")
+    par.add_argument("--threads",type=int,default=None,help="Number of threads of the threaded engine (default: all cores)")
+    par.add_argument("--block-steps",type=int,default=8,
+                        help="Maximum number of time steps the blocked engine advances a band of rows by at once")
+    par.add_argument("--max-memory",type=float,default=None,
+                        help="Memory budget of the run (in MB); a leaner mode is used, or the run refused, above it")
+    par.add_argument("--output-threshold",type=float,default=None,
+                        help="Output only when the relative change since the last output reaches this threshold, instead of every --time_step time steps")
+    par.add_argument("--output-criterion",type=str,default="averages",choices=OUTPUT_CRITERIA,
+                        help="Quantity whose relative change is compared with --output-threshold")
+    par.add_argument("--min-output-interval",type=int,default=1,
+                        help="Minimum number of time steps between two adaptive outputs")
+    par.add_argument("--max-output-interval",type=int,default=None,
+                        help="Maximum number of time steps between two adaptive outputs (default: unbounded)")
+    par.add_argument("--region",type=parse_region,action="append",default=None,metavar="LEFT,TOP,WIDTH,HEIGHT",
+                        help="Also write maps of this region of interest (repeatable)")
+    par.add_argument("--region-pattern",type=str,default=DEFAULT_REGION_PATTERN,
+                        help="File name pattern of the region maps, with {region} and {time_step} fields")
+    par.add_argument("--overview-factor",type=int,default=None,
+                        help="Also write overview maps downsampled by this factor, averaging the densities of each block")
+    par.add_argument("--overview-pattern",type=str,default=DEFAULT_OVERVIEW_PATTERN,
+                        help="File name pattern of the overview maps, with {factor} and {time_step} fields")
+    par.add_argument("--tile-directory",type=str,default=None,
+                        help="Also write each map as a pyramid of tiles, with a manifest per frame, to this directory")
+    par.add_argument("--tile-size",type=int,default=DEFAULT_TILE_SIZE,help="Width and height of the tiles (in pixels)")
+    par.add_argument("--sensitivities",type=parse_sensitivity_parameters,default=None,metavar="RATES",
+                        help="Also write the derivatives of the averages with respect to these rates (e.g. 'birth_mice,death_foxes' or 'all') to sensitivities.csv")
+    par.add_argument("--landscape-changes",type=str,default=None,metavar="CHANGES_FILE",
+                        help="Timeline of squares turning into water or land during the run, as lines 'TIMESTEP ROW COLUMN LAND'")
+    par.add_argument("--flooded-density-policy",type=str,default="drop",choices=FLOODED_DENSITY_POLICIES,
+                        help="Whether the densities of flooded squares are dropped or displaced to their land neighbours")
+    par.add_argument("--shared-frames",type=str,default=None,metavar="NAME",
+                        help="Publish the densities and averages of each output step into a shared-memory ring buffer of this name")
+    par.add_argument("--shared-frame-slots",type=int,default=DEFAULT_FRAME_SLOTS,
+                        help="Number of frames kept in the shared-memory ring buffer")
+    par.add_argument("--out-of-core",type=str,default=None,metavar="WORK_DIRECTORY",
+                        help="Keep the landscape and densities in memory-mapped files in this directory, for landscapes larger than the memory")
+    par.add_argument("--log-level",type=str,default="INFO",choices=LOG_LEVELS,help="Level of the console log")
+    par.add_argument("-q","--quiet",action="store_true",help="Only log warnings and errors")
+    par.add_argument("--progress-file",type=str,default=None,
+                        help="File to which progress events are appended as JSON lines ('-' for the standard output)")
+    par.add_argument("--progress-interval",type=float,default=1.0,
+                        help="Minimum number of seconds between two progress events")
+    return par
+
+def simCommLineIntf():
+    args=create_argument_parser().parse_args()
+    configure_logging(args.log_level, args.quiet, args.progress_file, args.progress_interval)
     
     validate_arguments(args) # validates all arguments aside from the landscape file
-    validate_input_file_argument(args.landscape_file)
+    if args.landscape_cache_directory is None:
+        validate_input_file_argument(args.landscape_file) # compiled landscapes are validated when compiled
     
+    run_simulation_from_arguments(args)
+
+def run_simulation_from_arguments(args, output_directory=".", **options):
+    """
+    Run a simulation with parameters parsed by the parser from `create_argument_parser`.
+
+    Args:
+        args (argparse.Namespace): The simulation parameters.
+        output_directory (str): The directory of the averages and of the full, region and overview
+            maps. Defaults to the current directory.
+        **options: Further keyword arguments passed on to `run_simulation`.
+
+    Returns:
+        None
+    """
+    max_memory = None if args.max_memory is None else int(args.max_memory * 1024 * 1024)
+    if args.landscape_cache_directory is not None and "landscape_data" not in options:
+        from predator_prey.landscape_cache import load_compiled_landscape
+        options["landscape_data"] = load_compiled_landscape(args.landscape_file, args.landscape_cache_directory)
+    dimensions = options["landscape_data"][:2] if "landscape_data" in options \
+        else read_landscape_dimensions(args.landscape_file)
+    if args.region or args.overview_factor is not None:
+        options["map_outputs"] = create_map_outputs(*dimensions, args.region, args.overview_factor,
+                                                    args.region_pattern, args.overview_pattern, output_directory)
+    if args.tile_directory is not None:
+        options["map_outputs"] = options.get("map_outputs", []) + [create_tile_output(args.tile_directory,
+                                                                                      args.tile_size, args.threads)]
+    if args.out_of_core is not None:
+        from predator_prey.out_of_core import run_simulation_out_of_core
+        run_simulation_out_of_core(args.birth_mice, args.death_mice, args.diffusion_mice, args.birth_foxes,
+            args.death_foxes, args.diffusion_foxes, args.delta_t, args.time_step,
+            args.duration, args.landscape_file, args.mouse_seed, args.fox_seed, args.out_of_core,
+            save_maps=not args.no_maps, threads=args.threads, block_steps=args.block_steps,
+            max_memory=max_memory, averages_callback=options.get("averages_callback"),
+            map_outputs=options.get("map_outputs"), output_directory=output_directory)
+        return
+    options = dict(save_maps=not args.no_maps, snapshot_directory=args.snapshot_directory, engine=args.engine,
+                   threads=args.threads, block_steps=args.block_steps, max_memory=max_memory,
+                   output_directory=output_directory, **options)
+    if args.sensitivities:
+        options["sensitivities"] = args.sensitivities
+    if args.landscape_changes is not None:
+        options.update(landscape_changes=load_landscape_changes(args.landscape_changes, *dimensions),
+                       flooded_density_policy=args.flooded_density_policy)
+    if args.output_threshold is not None:
+        options.update(output_threshold=args.output_threshold, output_criterion=args.output_criterion,
+                       min_output_interval=args.min_output_interval, max_output_interval=args.max_output_interval)
+    if args.cache_directory is not None:
+        from predator_prey.result_cache import run_cached_simulation
+        run_cached_simulation(args.birth_mice, args.death_mice, args.diffusion_mice, args.birth_foxes,
+            args.death_foxes, args.diffusion_foxes, args.delta_t, args.time_step,
+            args.duration, args.landscape_file, args.mouse_seed, args.fox_seed,
+            args.cache_directory, int(args.cache_size * 1024 * 1024), **options)
+        return
+    if args.shared_frames is not None:
+        with SharedFrameBuffer.create(args.shared_frames, *dimensions, args.shared_frame_slots) as frame_buffer:
+            run_simulation(args.birth_mice, args.death_mice, args.diffusion_mice, args.birth_foxes,
+                args.death_foxes, args.diffusion_foxes, args.delta_t, args.time_step,
+                args.duration, args.landscape_file, args.mouse_seed, args.fox_seed, frame_buffer=frame_buffer,
+                **options)
+        return
     run_simulation(args.birth_mice, args.death_mice, args.diffusion_mice, args.birth_foxes, 
         args.death_foxes, args.diffusion_foxes, args.delta_t, args.time_step, 
-        args.duration, args.landscape_file, args.mouse_seed, args.fox_seed)
+        args.duration, args.landscape_file, args.mouse_seed, args.fox_seed, **options)
+
+def report_averages(time_step_index, time_in_secs, average_mice_density, average_foxes_density,
+                    averages_callback=None, output_directory="."):
+    """
+    Log the average densities of an output step and append them to averages.csv.
+
+    Args:
+        time_step_index (int): The current time step index.
+        time_in_secs (float): The current time.
+        average_mice_density (float): The average density of mice.
+        average_foxes_density (float): The average density of foxes.
+        averages_callback (callable): If given, called with the above.
+        output_directory (str): The directory of averages.csv. Defaults to the current directory.
+
+    Returns:
+        None
+    """
+    logger.info("Averages. Timestep: %d Time (s): %.1f Mice: %.17f Foxes: %.17f", time_step_index,
+                time_in_secs, average_mice_density, average_foxes_density,
+                extra={"event": {"event": "averages", "timestep": time_step_index, "time": time_in_secs,
+                                 "mice": float(average_mice_density), "foxes": float(average_foxes_density)}})
+    with open(os.path.join(output_directory, "averages.csv"),"a") as f:
+        f.write("{},{:.1f},{:.17f},{:.17f}\n".format(time_step_index,
+                                                     time_in_secs,
+                                                     average_mice_density,
+                                                     average_foxes_density))
+    if averages_callback is not None:
+        averages_callback(time_step_index, time_in_secs, average_mice_density, average_foxes_density)
 
 def run_simulation(mice_birth_rate, mice_death_rate, mice_diffusion_rate, foxes_birth_rate, 
         foxes_death_rate, foxes_diffusion_rate, time_step_size, output_time_step, 
-        simulation_duration, landscape_file, mouse_seed, fox_seed):
+        simulation_duration, landscape_file, mouse_seed, fox_seed, save_maps=True, snapshot_directory=None,
+        landscape_data=None, averages_callback=None, initial_state=None, engine="loop", threads=None,
+        block_steps=8, max_memory=None, output_threshold=None, output_criterion="averages",
+        min_output_interval=1, max_output_interval=None, map_outputs=None, sensitivities=None, frame_buffer=None,
+        landscape_changes=None, flooded_density_policy="drop", output_directory="."):
     """
     Run a predator-prey simulation with the given parameters.
 
@@ -53,83 +222,293 @@ def run_simulation(mice_birth_rate, mice_death_rate, mice_diffusion_rate, foxes_
         landscape_file (str): Path to the landscape input file.
         mouse_seed (int): Random seed for initializing mouse densities.
         fox_seed (int): Random seed for initializing fox densities.
+        save_maps (bool): Whether to write a PPM map at each output step.
+        snapshot_directory (str): If given, the directory in which raw density snapshots are stored at each
+            output step, so that maps can be rendered afterwards with `predator_prey.render`.
+        landscape_data (tuple): The landscape already loaded with `load_landscape`, in which case
+            `landscape_file` is not read again.
+        averages_callback (callable): If given, called with the time step index, the time and the average
+            mice and foxes densities at each output step.
+        initial_state (tuple): If given, the (time step index, mice densities, foxes densities) from which to
+            resume an earlier run. The averages of the earlier time steps are expected to be in averages.csv
+            already, so the file is appended to.
+        engine (str): The engine updating the population densities, one of `predator_prey.engines.ENGINES`.
+        threads (int): The number of threads of the 'threaded' engine, or None to use one per core.
+        block_steps (int): The maximum number of time steps the 'blocked' engine advances a band of rows by at once.
+        max_memory (int): If given, the memory budget of the run in bytes. If the estimated memory use exceeds
+            it, maps are written without density colours arrays and the 'vectorized' and 'threaded' engines are
+            replaced by the 'blocked' engine, which gives identical results.
+        output_threshold (float): If given, `output_time_step` is ignored and the averages and maps are
+            written only when the relative change of `output_criterion` since the last output reaches this
+            threshold, and at least every `max_output_interval` time steps. The output time steps are
+            listed in output_index.csv.
+        output_criterion (str): 'averages' for the average densities or 'densities' for the densities of
+            all squares, the largest change of the two species counting.
+        min_output_interval (int): The minimum number of time steps between two adaptive outputs.
+        max_output_interval (int): The maximum number of time steps between two adaptive outputs, or None.
+        map_outputs (list): Further map outputs, as from `predator_prey.map_outputs.create_map_outputs`,
+            called at each output step whether or not `save_maps` is set.
+        sensitivities (list): If given, rates of `predator_prey.sensitivities.SENSITIVITY_PARAMETERS` for which
+            the derivatives of the average densities are propagated alongside the densities, a time step at
+            a time, and written to sensitivities.csv at each output step. Their memory counts towards
+            `max_memory`. Not supported when resuming.
+        frame_buffer (predator_prey.shared_frames.SharedFrameBuffer): If given, the frame buffer into which the
+            densities, maxima and averages are published at each output step, for live readers.
+        landscape_changes (dict): If given, the changes of the landscape at each time step, as from
+            `predator_prey.landscape_changes.load_landscape_changes`, applied when the time step is reached,
+            before its output. The landscape data is copied first. Not supported when resuming or with
+            `snapshot_directory`.
+        flooded_density_policy (str): How the densities of flooded squares are handled, one of
+            `predator_prey.landscape_changes.FLOODED_DENSITY_POLICIES`.
+        output_directory (str): The directory in which averages.csv, the maps, sensitivities.csv and
+            output_index.csv are written. Defaults to the current directory.
+
+    Raises:
+        MemoryError: If even the lean mode is estimated to exceed `max_memory`.
+        ValueError: If `sensitivities` or `landscape_changes` are given when resuming, `landscape_changes`
+            with `snapshot_directory`, or an unknown `flooded_density_policy`.
 
     Returns:
-        None
+        tuple: The time step index reached at the end of the run and the mice and foxes densities at
+            that time step, from which the run can be resumed.
     """
     
-    print("Predator-prey simulation",getVersion())
-    
-    # Read landscape file and get dimensions
-    width, height, width_with_halo, height_with_halo, landscape = read_landscape_file(landscape_file)
-    
-    # Calculate the number of land-only squares
-    num_lands=np.count_nonzero(landscape)
-    print("Number of land-only squares: {}".format(num_lands))
-    
-    # Pre-calculate number of land neighbours of each land square.
-    neighbouring_land_count = calculate_land_neighbours(width, height, width_with_halo, height_with_halo, landscape)
-    
-    # Initializing the population densities, new densities, and density colors for mice and foxes
-    initial_mice_densities, new_mice_densities, mice_density_colours = initialize_arrays(mouse_seed, width, height, landscape)
-    initial_foxes_densities, new_foxes_densities, foxes_density_colours = initialize_arrays(fox_seed, width, height, landscape)
+    logger.info("Predator-prey simulation %s", getVersion())
+
+    # Estimate the memory use before allocating anything, switching to the lean mode if over budget
+    if landscape_data is None:
+        width, height = read_landscape_dimensions(landscape_file)
+    else:
+        width, height = landscape_data[:2]
+    colour_maps = save_maps
+    # The tangents of the sensitivities and their working arrays are needed whichever the engine
+    sensitivity_memory = estimate_sensitivity_memory(sensitivities, width, height) if sensitivities else 0
+    estimated_memory = estimate_memory_usage(width, height, colour_maps,
+                                             estimate_engine_memory(engine, width, height, threads, block_steps)
+                                             + sensitivity_memory)
+    logger.info("Estimated memory use: %.1f MB", estimated_memory / (1024 * 1024))
+    if max_memory is not None and estimated_memory > max_memory:
+        colour_maps = False
+        if engine in ("vectorized", "threaded"):
+            engine = "blocked"
+        estimated_memory = estimate_memory_usage(width, height, colour_maps,
+                                                 estimate_engine_memory(engine, width, height, threads, block_steps)
+                                                 + sensitivity_memory)
+        if estimated_memory > max_memory:
+            raise MemoryError("Estimated memory use of {:.1f} MB exceeds the maximum of {:.1f} MB, "
+                              "consider running out of core".format(estimated_memory / (1024 * 1024),
+                                                                   max_memory / (1024 * 1024)))
+        logger.warning("Memory budget of %.1f MB exceeded, using the lean mode (engine '%s', %.1f MB)",
+                       max_memory / (1024 * 1024), engine, estimated_memory / (1024 * 1024))
+    advance_function = create_advance_function(engine, threads, block_steps)
     
-    # Calculate the average density for mice and foxes
-    average_mice_density = calculate_average_density(num_lands, initial_mice_densities)
-    average_foxes_density = calculate_average_density(num_lands, initial_foxes_densities)
+    # Read landscape file, count its land-only squares and pre-calculate the land neighbours of each square
+    if landscape_data is None:
+        landscape_data = load_landscape(landscape_file)
+    width, height, width_with_halo, height_with_halo, landscape, num_lands, neighbouring_land_count = landscape_data
+    logger.info("Number of land-only squares: %d", num_lands)
     
-    print("Averages. Timestep: {} Time (s): {:.1f} Mice: {:.17f} Foxes: {:.17f}".format(0,0,average_mice_density,average_foxes_density))
+    if initial_state is None:
+        # Initializing the population densities, new densities, and density colors for mice and foxes
+        start_time_step_index = 0
+        initial_mice_densities, new_mice_densities, mice_density_colours = initialize_arrays(mouse_seed, width, height, landscape, colour_maps)
+        initial_foxes_densities, new_foxes_densities, foxes_density_colours = initialize_arrays(fox_seed, width, height, landscape, colour_maps)
+        
+        # Calculate the average density for mice and foxes
+        average_mice_density = calculate_average_density(num_lands, initial_mice_densities)
+        average_foxes_density = calculate_average_density(num_lands, initial_foxes_densities)
+        
+        logger.debug("Initial averages. Mice: %.17f Foxes: %.17f", average_mice_density, average_foxes_density)
+
+        with open(os.path.join(output_directory, "averages.csv"),"w") as f:
+            header="Timestep,Time,Mice,Foxes\n"
+            f.write(header)
+    else:
+        # Resume from the given population densities
+        start_time_step_index = initial_state[0]
+        initial_mice_densities, new_mice_densities = initial_state[1].copy(), initial_state[1].copy()
+        initial_foxes_densities, new_foxes_densities = initial_state[2].copy(), initial_state[2].copy()
+        mice_density_colours = np.zeros((height, width), np.uint8) if colour_maps else None
+        foxes_density_colours = np.zeros((height, width), np.uint8) if colour_maps else None
 
-    with open("averages.csv","w") as f:
-        header="Timestep,Time,Mice,Foxes\n"
-        f.write(header)
+    if snapshot_directory is not None:
+        # A snapshot directory holds a single landscape, which changes would make stale
+        if landscape_changes:
+            raise ValueError("Landscape changes cannot be combined with density snapshots")
+        os.makedirs(snapshot_directory, exist_ok=True)
+        np.save(os.path.join(snapshot_directory, "landscape.npy"), landscape)
     
     # Calculate the total number of time steps based on the simulation duration and time step size.  
     total_time_steps = int(simulation_duration / time_step_size)
+
+    if sensitivities:
+        if initial_state is not None:
+            raise ValueError("Sensitivities cannot be calculated when resuming a run")
+        mice_tangents, new_mice_tangents, foxes_tangents, new_foxes_tangents = \
+            create_tangent_arrays(sensitivities, initial_mice_densities.shape)
+        tangent_workspace = create_tangent_workspace(sensitivities, width, height)
+        with open(os.path.join(output_directory, "sensitivities.csv"), "w") as f:
+            f.write("Timestep,Time," + ",".join("dMice/d{0},dFoxes/d{0}".format(parameter)
+                                                for parameter in sensitivities) + "\n")
     
-    # Loop over time steps
-    for time_step_index in range(0,total_time_steps):
-        # Check if the current time step index is a multiple of the output time step
-        # to control the timing of file output, such as averages and maps.  
-        if not time_step_index % output_time_step:
-            
-            # Calculate maximum and average densities for mice and foxes 
+    if landscape_changes:
+        if initial_state is not None:
+            raise ValueError("Landscape changes cannot be applied when resuming a run")
+        if flooded_density_policy not in FLOODED_DENSITY_POLICIES:
+            raise ValueError("Unknown flooded density policy {}, expected one of: {}".format(
+                flooded_density_policy, ", ".join(FLOODED_DENSITY_POLICIES)))
+        # The landscape changes in place, so landscape data shared with other runs is left as it was
+        landscape, neighbouring_land_count = np.array(landscape), np.array(neighbouring_land_count)
+        change_time_steps = sorted(landscape_changes)
+
+    adaptive_output = output_threshold is not None
+    if adaptive_output:
+        with open(os.path.join(output_directory, "output_index.csv"), "w") as f:
+            f.write("Output,Timestep,Time\n")
+        last_output_time_step_index = None
+        if output_criterion == "densities":
+            last_output_mice_densities = np.empty_like(initial_mice_densities)
+            last_output_foxes_densities = np.empty_like(initial_foxes_densities)
+
+    # Loop over output steps
+    time_step_index = start_time_step_index
+    output_count = 0
+    while time_step_index < total_time_steps:
+        if landscape_changes and time_step_index in landscape_changes:
+            densities, spare_densities = [initial_mice_densities, initial_foxes_densities], \
+                [new_mice_densities, new_foxes_densities]
+            if sensitivities:
+                densities += [mice_tangents, foxes_tangents]
+                spare_densities += [new_mice_tangents, new_foxes_tangents]
+            num_lands += apply_landscape_changes(landscape_changes[time_step_index], width, height, landscape,
+                                                 neighbouring_land_count, densities, spare_densities,
+                                                 flooded_density_policy)
+            logger.info("Landscape changed at time step %d. Number of land-only squares: %d", time_step_index,
+                        num_lands)
+
+        if adaptive_output:
+            # Output if the averages or densities changed enough since the last output, or it is overdue
             maximum_mice_density, maximum_foxes_density, average_mice_density, average_foxes_density = \
             calculate_density_statistics(initial_mice_densities, initial_foxes_densities, num_lands)
+            if last_output_time_step_index is None or (max_output_interval is not None and
+                    time_step_index - last_output_time_step_index >= max_output_interval):
+                output_due = True
+            elif output_criterion == "densities":
+                output_due = max(calculate_relative_change(last_output_mice_densities, initial_mice_densities),
+                                 calculate_relative_change(last_output_foxes_densities, initial_foxes_densities)) \
+                    >= output_threshold
+            else:
+                output_due = max(calculate_relative_change(last_output_averages[0], average_mice_density),
+                                 calculate_relative_change(last_output_averages[1], average_foxes_density)) \
+                    >= output_threshold
+        else:
+            # Check if the current time step index is a multiple of the output time step
+            # to control the timing of file output, such as averages and maps.  
+            output_due = not time_step_index % output_time_step
+            if output_due:
+                # Calculate maximum and average densities for mice and foxes 
+                maximum_mice_density, maximum_foxes_density, average_mice_density, average_foxes_density = \
+                calculate_density_statistics(initial_mice_densities, initial_foxes_densities, num_lands)
+
+        if output_due:
             
             # Calculate time in seconds
             time_in_secs = time_step_index*time_step_size
             
             # Print and save average densities to a CSV file
-            print("Averages. Timestep: {} Time (s): {:.1f} Mice: {:.17f} Foxes: {:.17f}".format(time_step_index,
-                                                                                                time_in_secs,
-                                                                                                average_mice_density,
-                                                                                                average_foxes_density))
-            with open("averages.csv","a") as f:
-                f.write("{},{:.1f},{:.17f},{:.17f}\n".format(time_step_index,
-                                                             time_in_secs,
-                                                             average_mice_density,
-                                                             average_foxes_density))
+            report_averages(time_step_index, time_in_secs, average_mice_density, average_foxes_density,
+                            averages_callback, output_directory)
+            if sensitivities:
+                mice_sensitivities = calculate_average_sensitivities(num_lands, mice_tangents)
+                foxes_sensitivities = calculate_average_sensitivities(num_lands, foxes_tangents)
+                with open(os.path.join(output_directory, "sensitivities.csv"), "a") as f:
+                    f.write("{},{:.1f},".format(time_step_index, time_in_secs) + ",".join(
+                        "{:.17g},{:.17g}".format(mice_sensitivity, foxes_sensitivity)
+                        for mice_sensitivity, foxes_sensitivity in zip(mice_sensitivities, foxes_sensitivities)) + "\n")
             
-            # Update the color representations of mice and foxes densities in mice_density_colours and 
-            # foxes_density_colours variables on the landscape
-            calculate_density_colors(height, width, landscape, initial_mice_densities, maximum_mice_density, 
-                                     initial_foxes_densities, maximum_foxes_density, mice_density_colours, 
-                                     foxes_density_colours)
-
-            # Save the population density colours as a PPM file
-            save_ppm_file(width, height, landscape, foxes_density_colours, mice_density_colours, time_step_index)
+            # Publish the densities to live readers
+            if frame_buffer is not None:
+                frame_buffer.publish(time_step_index, time_in_secs, initial_mice_densities, maximum_mice_density,
+                                     initial_foxes_densities, maximum_foxes_density, average_mice_density,
+                                     average_foxes_density)
+
+            # Store the raw densities so that maps can be rendered offline
+            if snapshot_directory is not None:
+                save_density_snapshot(snapshot_directory, time_step_index, time_in_secs,
+                                      initial_mice_densities, initial_foxes_densities)
+
+            if save_maps and not colour_maps:
+                # Write the map straight from the densities, a row at a time
+                save_ppm_file_from_densities(width, height, landscape, initial_mice_densities, maximum_mice_density,
+                                             initial_foxes_densities, maximum_foxes_density, time_step_index,
+                                             output_directory)
+            elif save_maps:
+                # Update the color representations of mice and foxes densities in mice_density_colours and 
+                # foxes_density_colours variables on the landscape
+                calculate_density_colors(height, width, landscape, initial_mice_densities, maximum_mice_density, 
+                                         initial_foxes_densities, maximum_foxes_density, mice_density_colours, 
+                                         foxes_density_colours)
+
+                # Save the population density colours as a PPM file
+                save_ppm_file(width, height, landscape, foxes_density_colours, mice_density_colours, time_step_index,
+                              output_directory)
+
+            # Write the maps of regions of interest, overviews, etc.
+            for map_output in map_outputs or []:
+                map_output(width, height, landscape, initial_mice_densities, maximum_mice_density,
+                           initial_foxes_densities, maximum_foxes_density, time_step_index)
+
+            if adaptive_output:
+                # Record the output time step and what the next ones are compared with
+                with open(os.path.join(output_directory, "output_index.csv"), "a") as f:
+                    f.write("{},{},{:.1f}\n".format(output_count, time_step_index, time_in_secs))
+                last_output_time_step_index = time_step_index
+                last_output_averages = (average_mice_density, average_foxes_density)
+                if output_criterion == "densities":
+                    np.copyto(last_output_mice_densities, initial_mice_densities)
+                    np.copyto(last_output_foxes_densities, initial_foxes_densities)
+            output_count += 1
         
-        # updates its population densities
-        update_population_densities(mice_birth_rate, mice_death_rate, mice_diffusion_rate, foxes_birth_rate, foxes_death_rate, 
-                                    foxes_diffusion_rate, time_step_size, width, height, landscape, neighbouring_land_count, 
-                                    initial_mice_densities, new_mice_densities, initial_foxes_densities, new_foxes_densities)
- 
-                        
-        # Swap initial and new population densities for next iteration.
-        initial_mice_densities, new_mice_densities = new_mice_densities, initial_mice_densities
-        initial_foxes_densities, new_foxes_densities = new_foxes_densities, initial_foxes_densities
+        # Advance the population densities to the next output step (or the end of the simulation),
+        # swapping initial and new population densities after each time step. Adaptive outputs are
+        # checked after every time step once the minimum interval has passed.
+        if adaptive_output:
+            next_time_step_index = min(total_time_steps, max(time_step_index + 1,
+                                                             last_output_time_step_index + min_output_interval))
+        else:
+            next_time_step_index = min(total_time_steps, (time_step_index // output_time_step + 1) * output_time_step)
+        if landscape_changes:
+            # Stop at the next time step whose landscape changes
+            next_change_time_step_index = find_next_change_time_step(change_time_steps, time_step_index)
+            if next_change_time_step_index is not None:
+                next_time_step_index = min(next_time_step_index, next_change_time_step_index)
+        if sensitivities:
+            # The tangents are advanced after each time step, from the densities before and after it
+            for _ in range(next_time_step_index - time_step_index):
+                initial_mice_densities, new_mice_densities, initial_foxes_densities, new_foxes_densities = \
+                    advance_function(1, mice_birth_rate, mice_death_rate, mice_diffusion_rate, foxes_birth_rate,
+                                     foxes_death_rate, foxes_diffusion_rate, time_step_size, width, height, landscape,
+                                     neighbouring_land_count, initial_mice_densities, new_mice_densities,
+                                     initial_foxes_densities, new_foxes_densities)
+                update_tangents(sensitivities, mice_birth_rate, mice_death_rate, mice_diffusion_rate,
+                                foxes_birth_rate, foxes_death_rate, foxes_diffusion_rate, time_step_size, landscape,
+                                neighbouring_land_count, new_mice_densities, new_foxes_densities,
+                                initial_mice_densities, initial_foxes_densities, mice_tangents, foxes_tangents,
+                                new_mice_tangents, new_foxes_tangents, tangent_workspace)
+                mice_tangents, new_mice_tangents = new_mice_tangents, mice_tangents
+                foxes_tangents, new_foxes_tangents = new_foxes_tangents, foxes_tangents
+        else:
+            initial_mice_densities, new_mice_densities, initial_foxes_densities, new_foxes_densities = \
+                advance_function(next_time_step_index - time_step_index, mice_birth_rate, mice_death_rate,
+                                 mice_diffusion_rate, foxes_birth_rate, foxes_death_rate, foxes_diffusion_rate,
+                                 time_step_size, width, height, landscape, neighbouring_land_count,
+                                 initial_mice_densities, new_mice_densities, initial_foxes_densities,
+                                 new_foxes_densities)
+        time_step_index = next_time_step_index
 
+    logger.info("Simulation finished after %d time steps", max(start_time_step_index, total_time_steps),
+                extra={"event": {"event": "finished", "timestep": max(start_time_step_index, total_time_steps)}})
+    return max(start_time_step_index, total_time_steps), initial_mice_densities, initial_foxes_densities
     
 if __name__ == "__main__":
     simCommLineIntf()
@@ -0,0 +1,285 @@
+'''Multi-resolution tile pyramid output of the maps.
+
+Each frame is coloured into RGB pixels of `save_ppm_file` a band of rows at a time, from which
+successive 2x downsampled levels are built as the bands arrive, so that only a few rows of tiles
+of each level are held in memory. Every level is cut into fixed-size tiles, stored as
+binary PPM files named by the hash of their contents, so that a tile unchanged since an earlier
+frame (e.g. open water) is written only once. A JSON manifest per frame lists the tiles of each
+level, so that viewers load only the tiles they show.
+'''
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+from predator_prey.helper_functions import *
+from predator_prey.engines import get_thread_pool
+
+DEFAULT_TILE_SIZE = 256
+WATER_COLOUR = (0, 200, 255)
+
+def calculate_rgb_rows(width, height, landscape, mice_densities, maximum_mice_density, foxes_densities,
+                       maximum_foxes_density, first_row, last_row):
+    """
+    Colour a band of rows of the densities into RGB pixels of the map written by `save_ppm_file`.
+
+    The red and green planes are the density colours of `calculate_density_colors` for the foxes
+    and the mice. Only the rows of the band are read, so that the densities may be memory-mapped.
+
+    Args:
+        width (int): The width of the landscape.
+        height (int): The height of the landscape.
+        landscape (numpy.ndarray): A 2D array (with halo) representing the landscape.
+        mice_densities (numpy.ndarray): A 2D array (with halo) of mice densities.
+        maximum_mice_density (float): The maximum density of mice.
+        foxes_densities (numpy.ndarray): A 2D array (with halo) of foxes densities.
+        maximum_foxes_density (float): The maximum density of foxes.
+        first_row (int): The first row of the band, counted from 0 at the top of the landscape.
+        last_row (int): The row after the last row of the band.
+
+    Returns:
+        numpy.ndarray: The pixels, of shape (last_row - first_row, width, 3) and type uint8.
+    """
+    rows = slice(first_row + 1, last_row + 1)
+    land = landscape[rows, 1:width + 1] != 0
+    pixels = np.empty((last_row - first_row, width, 3), np.uint8)
+    pixels[:, :, 0] = np.where(land, calculate_colour_row(foxes_densities[rows, 1:width + 1], maximum_foxes_density),
+                               WATER_COLOUR[0])
+    pixels[:, :, 1] = np.where(land, calculate_colour_row(mice_densities[rows, 1:width + 1], maximum_mice_density),
+                               WATER_COLOUR[1])
+    pixels[:, :, 2] = np.where(land, 0, WATER_COLOUR[2])
+    return pixels
+
+def calculate_rgb_image(width, height, landscape, mice_densities, maximum_mice_density, foxes_densities,
+                        maximum_foxes_density):
+    """
+    Colour the densities into an RGB image with the pixels of the map written by `save_ppm_file`.
+
+    Args:
+        As for `calculate_rgb_rows`, without the band.
+
+    Returns:
+        numpy.ndarray: The image, of shape (height, width, 3) and type uint8.
+    """
+    return calculate_rgb_rows(width, height, landscape, mice_densities, maximum_mice_density, foxes_densities,
+                              maximum_foxes_density, 0, height)
+
+def downsample_image(image):
+    """
+    Halve the resolution of an image, averaging each block of 2 x 2 pixels.
+
+    An odd last row or column is averaged with a copy of itself.
+
+    Args:
+        image (numpy.ndarray): The image, of shape (height, width, 3) and type uint8.
+
+    Returns:
+        numpy.ndarray: The image of shape (ceil(height / 2), ceil(width / 2), 3).
+    """
+    height, width = image.shape[:2]
+    padded = np.pad(image, ((0, height % 2), (0, width % 2), (0, 0)), mode="edge").astype(np.uint16)
+    sums = padded[0::2, 0::2] + padded[1::2, 0::2] + padded[0::2, 1::2] + padded[1::2, 1::2]
+    return ((sums + 2) // 4).astype(np.uint8)
+
+def build_image_pyramid(image, tile_size):
+    """
+    Build the levels of a pyramid, each downsampled 2x from the previous one, down to a single tile.
+
+    Args:
+        image (numpy.ndarray): The full resolution image (level 0).
+        tile_size (int): The size of the tiles.
+
+    Returns:
+        list: The image of each level, from full resolution.
+    """
+    levels = [image]
+    while max(levels[-1].shape[:2]) > tile_size:
+        levels.append(downsample_image(levels[-1]))
+    return levels
+
+def encode_tile(tile):
+    """
+    Encode a tile as a binary (P6) PPM file.
+
+    Args:
+        tile (numpy.ndarray): The tile image, of shape (height, width, 3) and type uint8.
+
+    Returns:
+        bytes: The contents of the file.
+    """
+    return "P6\n{} {}\n{}\n".format(tile.shape[1], tile.shape[0], 255).encode("ascii") + np.ascontiguousarray(tile).tobytes()
+
+def store_tile(tile_directory, tile):
+    """
+    Store a tile under the hash of its contents, unless a tile with the same contents is stored already.
+
+    Args:
+        tile_directory (str): The tile directory.
+        tile (numpy.ndarray): The tile image.
+
+    Returns:
+        str: The path of the tile file, relative to the tile directory.
+    """
+    contents = encode_tile(tile)
+    tile_file = "tiles/" + hashlib.sha256(contents).hexdigest()[:32] + ".ppm"
+    path = os.path.join(tile_directory, tile_file)
+    if not os.path.exists(path):
+        # Written under a temporary name first, so that a tile file is always complete
+        temporary_path = "{}.{}.{}.tmp".format(path, os.getpid(), threading.get_ident())
+        with open(temporary_path, "wb") as f:
+            f.write(contents)
+        os.replace(temporary_path, path)
+    return tile_file
+
+def calculate_pyramid_level_sizes(width, height, tile_size):
+    """
+    Calculate the sizes of the levels of a pyramid, as built by `build_image_pyramid`.
+
+    Args:
+        width (int): The width of the full resolution image.
+        height (int): The height of the full resolution image.
+        tile_size (int): The size of the tiles.
+
+    Returns:
+        list: The (width, height) of each level, from full resolution.
+    """
+    sizes = [(width, height)]
+    while max(sizes[-1]) > tile_size:
+        sizes.append((-(-sizes[-1][0] // 2), -(-sizes[-1][1] // 2)))
+    return sizes
+
+def store_tile_row(tile_directory, level, rows, pool):
+    """
+    Cut a row of tiles from the rows of a level and store them.
+
+    Args:
+        tile_directory (str): The tile directory.
+        level (dict): The state of the level, as from `save_tile_pyramid_bands`.
+        rows (numpy.ndarray): The rows of the level, at most a tile high.
+        pool (concurrent.futures.Executor): A pool on which the tiles are written concurrently, or None.
+
+    Returns:
+        None
+    """
+    tile_size = level["tile_size"]
+    tiles = [rows[:, left:left + tile_size] for left in range(0, rows.shape[1], tile_size)]
+    level["tiles"].append(list(pool.map(lambda tile: store_tile(tile_directory, tile), tiles)) if pool is not None
+                          else [store_tile(tile_directory, tile) for tile in tiles])
+
+def add_level_rows(tile_directory, levels, level_index, rows, pool):
+    """
+    Add rows to a level of a pyramid, storing each complete row of tiles and passing the
+    downsampled pairs of rows on to the next level.
+
+    Args:
+        tile_directory (str): The tile directory.
+        levels (list): The state of each level, as from `save_tile_pyramid_bands`.
+        level_index (int): The index of the level.
+        rows (numpy.ndarray): The next rows of the level.
+        pool (concurrent.futures.Executor): A pool on which the tiles are written concurrently, or None.
+
+    Returns:
+        None
+    """
+    level = levels[level_index]
+    level["pending"] = np.concatenate((level["pending"], rows))
+    while len(level["pending"]) >= level["tile_size"]:
+        store_tile_row(tile_directory, level, level["pending"][:level["tile_size"]], pool)
+        level["pending"] = level["pending"][level["tile_size"]:]
+    if level_index + 1 < len(levels):
+        # Pairs of rows are averaged independently, so the next level is built two rows at a time
+        rows = np.concatenate((level["carry"], rows))
+        paired_rows = len(rows) - len(rows) % 2
+        level["carry"] = rows[paired_rows:]
+        if paired_rows:
+            add_level_rows(tile_directory, levels, level_index + 1, downsample_image(rows[:paired_rows]), pool)
+
+def save_tile_pyramid_bands(tile_directory, time_step_index, width, height, bands, tile_size=DEFAULT_TILE_SIZE,
+                            pool=None):
+    """
+    Save the tile pyramid of a frame and its manifest, from the bands of rows of its full
+    resolution image.
+
+    The levels are built as the bands arrive, so at most about a tile high of rows of each level is
+    held at a time, and the tiles are the same as if cut from the levels of `build_image_pyramid`.
+
+    Args:
+        tile_directory (str): The tile directory, which receives the tiles in tiles/ and the manifest
+            frame_<time step index>.json.
+        time_step_index (int): The time step index of the frame.
+        width (int): The width of the full resolution image.
+        height (int): The height of the full resolution image.
+        bands (iterable): The consecutive bands of rows of the full resolution image, each of shape
+            (rows, width, 3) and type uint8.
+        tile_size (int): The size of the tiles.
+        pool (concurrent.futures.Executor): A pool on which the tiles are written concurrently, or None.
+
+    Returns:
+        dict: The manifest of the frame.
+    """
+    os.makedirs(os.path.join(tile_directory, "tiles"), exist_ok=True)
+    levels = [{"width": level_width, "height": level_height, "tile_size": tile_size, "tiles": [],
+               "pending": np.empty((0, level_width, 3), np.uint8), "carry": np.empty((0, level_width, 3), np.uint8)}
+              for level_width, level_height in calculate_pyramid_level_sizes(width, height, tile_size)]
+    for band in bands:
+        add_level_rows(tile_directory, levels, 0, band, pool)
+    for level_index, level in enumerate(levels):
+        # An odd last row is averaged with a copy of itself, before the last row of tiles of the level is cut
+        if len(level["carry"]):
+            add_level_rows(tile_directory, levels, level_index + 1, downsample_image(level["carry"]), pool)
+        if len(level["pending"]):
+            store_tile_row(tile_directory, level, level["pending"], pool)
+    manifest = {"time_step": time_step_index, "width": width, "height": height, "tile_size": tile_size,
+                "levels": [{"level": level_index, "scale": 2 ** level_index, "width": level["width"],
+                            "height": level["height"], "columns": len(level["tiles"][0]), "rows": len(level["tiles"]),
+                            "tiles": level["tiles"]} for level_index, level in enumerate(levels)]}
+    with open(os.path.join(tile_directory, "frame_{:04d}.json".format(time_step_index)), "w") as f:
+        json.dump(manifest, f)
+    return manifest
+
+def save_tile_pyramid(tile_directory, time_step_index, image, tile_size=DEFAULT_TILE_SIZE, pool=None):
+    """
+    Save the tile pyramid of a frame and its manifest, from its full resolution image.
+
+    Args:
+        tile_directory (str): The tile directory.
+        time_step_index (int): The time step index of the frame.
+        image (numpy.ndarray): The full resolution image of the frame.
+        tile_size (int): The size of the tiles.
+        pool (concurrent.futures.Executor): A pool on which the tiles are written concurrently, or None.
+
+    Returns:
+        dict: The manifest of the frame, as from `save_tile_pyramid_bands`.
+    """
+    height, width = image.shape[:2]
+    return save_tile_pyramid_bands(tile_directory, time_step_index, width, height,
+                                   (image[top:top + tile_size] for top in range(0, height, tile_size)), tile_size, pool)
+
+def create_tile_output(tile_directory, tile_size=DEFAULT_TILE_SIZE, threads=None):
+    """
+    Create a map output writing the tile pyramid of each frame.
+
+    Args:
+        tile_directory (str): The tile directory; created if needed.
+        tile_size (int): The size of the tiles.
+        threads (int): The number of threads writing tiles, or None for one per core.
+
+    Raises:
+        ValueError: If the tile size is not positive.
+
+    Returns:
+        callable: A map output, as from `predator_prey.map_outputs.create_map_outputs`.
+    """
+    if tile_size <= 0:
+        raise ValueError("Tile size must be a positive integer greater than 0")
+    threads = threads or os.cpu_count()
+
+    def save_tiles(width, height, landscape, mice_densities, maximum_mice_density, foxes_densities,
+                   maximum_foxes_density, time_step_index):
+        # The image is coloured a tile high at a time, so that a frame never needs a full-size image
+        bands = (calculate_rgb_rows(width, height, landscape, mice_densities, maximum_mice_density, foxes_densities,
+                                    maximum_foxes_density, top, min(top + tile_size, height))
+                 for top in range(0, height, tile_size))
+        save_tile_pyramid_bands(tile_directory, time_step_index, width, height, bands, tile_size,
+                                get_thread_pool(threads))
+    return save_tiles
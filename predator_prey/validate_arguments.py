@@ -31,6 +31,46 @@ def validate_arguments(args):
         raise ValueError("Random seed for initializing mouse densities must be a non-negative integer")
     if args.fox_seed < 0:
         raise ValueError("Random seed for initializing fox densities must be a non-negative integer")
+    if args.cache_size <= 0:
+        raise ValueError("Size limit of the result cache must be a positive number greater than 0")
+    if args.progress_interval < 0:
+        raise ValueError("Minimum number of seconds between progress events must be a non-negative number")
+    if args.threads is not None and args.threads <= 0:
+        raise ValueError("Number of threads must be a positive integer greater than 0")
+    if args.block_steps <= 0:
+        raise ValueError("Number of time steps per block must be a positive integer greater than 0")
+    if args.max_memory is not None and args.max_memory <= 0:
+        raise ValueError("Memory budget must be a positive number greater than 0")
+    if args.out_of_core is not None and (args.cache_directory is not None or args.snapshot_directory is not None):
+        raise ValueError("Out-of-core runs support neither the result cache nor density snapshots")
+    if args.out_of_core is not None and args.landscape_cache_directory is not None:
+        raise ValueError("Out-of-core runs load the landscape into their work directory, not from the landscape cache")
+    if (args.region or args.overview_factor is not None or args.tile_directory is not None) \
+            and args.cache_directory is not None:
+        raise ValueError("Region, overview and tile maps are not stored in the result cache")
+    if args.overview_factor is not None and args.overview_factor <= 0:
+        raise ValueError("Downsampling factor of the overview must be a positive integer greater than 0")
+    if args.tile_size <= 0:
+        raise ValueError("Tile size must be a positive integer greater than 0")
+    if args.sensitivities and (args.cache_directory is not None or args.out_of_core is not None):
+        raise ValueError("Sensitivities are supported neither with the result cache nor in out-of-core runs")
+    if args.landscape_changes is not None and (args.cache_directory is not None or args.out_of_core is not None
+                                               or args.snapshot_directory is not None):
+        raise ValueError("Landscape changes are supported neither with the result cache, density snapshots nor in out-of-core runs")
+    if args.shared_frames is not None:
+        if args.shared_frame_slots <= 0:
+            raise ValueError("Number of frame slots must be a positive integer greater than 0")
+        if args.cache_directory is not None or args.out_of_core is not None:
+            raise ValueError("Frames are published neither with the result cache nor in out-of-core runs")
+    if args.output_threshold is not None:
+        if args.output_threshold < 0:
+            raise ValueError("Output threshold must be a non-negative number")
+        if args.min_output_interval <= 0:
+            raise ValueError("Minimum number of time steps between outputs must be a positive integer greater than 0")
+        if args.max_output_interval is not None and args.max_output_interval < args.min_output_interval:
+            raise ValueError("Maximum number of time steps between outputs must not be less than the minimum")
+        if args.cache_directory is not None or args.out_of_core is not None:
+            raise ValueError("Adaptive output supports neither the result cache nor out-of-core runs")
 
 def validate_input_file_argument(landscape_file):
     """
@@ -0,0 +1,39 @@
+'''Fixtures shared by the tests.'''
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+# A 5x4 landscape with water on every row, in the format of `read_landscape_file`
+LANDSCAPE = "5 4\n1 1 1 0 1\n0 1 1 1 1\n1 1 0 1 1\n1 0 1 1 0\n"
+
+# A 3x2 landscape with a single water square
+SMALL_LANDSCAPE = "3 2\n1 1 1\n0 1 1\n"
+
+def write_landscape_file(file_path, contents=LANDSCAPE):
+    """Write a landscape file, by default with `LANDSCAPE`."""
+    with open(file_path, "w") as f:
+        f.write(contents)
+
+def read_outputs(directory="."):
+    """Read the averages and maps written to a directory, keyed by file name, and remove them."""
+    outputs = {}
+    for file_name in sorted(os.listdir(directory)):
+        if file_name == "averages.csv" or file_name.startswith("map_"):
+            file_path = os.path.join(directory, file_name)
+            with open(file_path) as f:
+                outputs[file_name] = f.read()
+            os.remove(file_path)
+    return outputs
+
+class TemporaryDirectoryTestCase(TestCase):
+    """A test case whose tests run in a new temporary directory, removed afterwards."""
+
+    def setUp(self):
+        self.original_directory = os.getcwd()
+        self.directory = tempfile.mkdtemp()
+        os.chdir(self.directory)
+
+    def tearDown(self):
+        os.chdir(self.original_directory)
+        shutil.rmtree(self.directory)
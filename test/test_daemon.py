@@ -0,0 +1,110 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from unittest import TestCase
+from unittest.mock import patch
+from predator_prey.daemon import *
+from test.helpers import write_landscape_file, SMALL_LANDSCAPE
+
+class TestDaemon(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.landscape_file = os.path.join(self.directory, "temp_landscape.dat")
+        write_landscape_file(self.landscape_file, SMALL_LANDSCAPE)
+        self.parameters = {"birth_mice": 0.5, "death_mice": 0.2, "diffusion_mice": 0.1, "birth_foxes": 0.4,
+                           "death_foxes": 0.3, "diffusion_foxes": 0.2, "delta_t": 1.0, "time_step": 1,
+                           "duration": 2, "landscape_file": self.landscape_file, "mouse_seed": 42, "fox_seed": 42}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def start_server(self):
+        server = SimulationServer(os.path.join(self.directory, "daemon.sock"), 1, 2)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        def stop_server():
+            server.shutdown()
+            thread.join()
+            server.server_close()
+        self.addCleanup(stop_server)
+        return server
+
+    def test_submit_simulation_streams_averages(self):
+        server = self.start_server()
+        events = list(submit_simulation(self.parameters, server.server_address, self.directory))
+        self.assertEqual([event["timestep"] for event in events], [0, 1])
+        self.assertEqual("{:.17f}".format(events[1]["mice"]), "1.77137705920111133")
+        self.assertEqual("{:.17f}".format(events[1]["foxes"]), "3.48409653173904710")
+        self.assertTrue(os.path.exists(os.path.join(self.directory, "averages.csv")))
+        self.assertTrue(os.path.exists(os.path.join(self.directory, "map_0001.ppm")))
+
+    def test_submit_simulation_reports_invalid_parameters(self):
+        server = self.start_server()
+        self.parameters["birth_mice"] = -0.5
+        with self.assertRaises(RuntimeError) as context:
+            list(submit_simulation(self.parameters, server.server_address, self.directory))
+        self.assertEqual("Birth rate of mice must be a positive float greater than 0", str(context.exception))
+
+    def test_create_simulation_arguments_fills_in_defaults(self):
+        args = create_simulation_arguments({"landscape_file": "map.dat", "duration": 10})
+        self.assertEqual(args.duration, 10)
+        self.assertEqual(args.birth_mice, 0.1)
+        self.assertFalse(args.no_maps)
+
+    def test_create_simulation_arguments_rejects_unknown_parameters(self):
+        with self.assertRaises(ValueError) as context:
+            create_simulation_arguments({"landscape_file": "map.dat", "speed": 10})
+        self.assertEqual("Unknown simulation parameter: speed", str(context.exception))
+
+    def test_create_simulation_arguments_checks_values_as_the_parser(self):
+        for name, value in (("time_step", "ten"), ("engine", "quantum"), ("no_maps", "yes")):
+            with self.assertRaises(ValueError):
+                create_simulation_arguments({"landscape_file": "map.dat", name: value})
+        # The parameters of the client, as sent through JSON, give back its arguments
+        args = create_argument_parser().parse_args(["-f", "map.dat", "-t", "5", "--no-maps", "--engine", "blocked",
+                                                    "--region", "0,1,2,1", "--sensitivities", "all"])
+        self.assertEqual(create_simulation_arguments(json.loads(json.dumps(vars(args)))), args)
+
+    def test_create_simulation_arguments_resolves_paths_against_working_directory(self):
+        args = create_simulation_arguments({"landscape_file": "map.dat", "tile_directory": "tiles",
+                                            "cache_directory": os.path.join(self.directory, "cache")}, "/work")
+        self.assertEqual((args.landscape_file, args.tile_directory, args.cache_directory),
+                         ("/work/map.dat", "/work/tiles", os.path.join(self.directory, "cache")))
+
+    def test_submit_simulation_writes_to_working_directory_without_changing_directory(self):
+        server = self.start_server()
+        output_directory = os.path.join(self.directory, "output")
+        os.makedirs(output_directory)
+        shutil.copy(self.landscape_file, output_directory)
+        self.parameters["landscape_file"] = "temp_landscape.dat"
+        original_directory = os.getcwd()
+        list(submit_simulation(self.parameters, server.server_address, output_directory))
+        self.assertEqual(os.getcwd(), original_directory)
+        self.assertTrue(os.path.exists(os.path.join(output_directory, "averages.csv")))
+        self.assertTrue(os.path.exists(os.path.join(output_directory, "map_0001.ppm")))
+
+    def test_submit_simulation_reports_dead_worker(self):
+        # The worker processes are forked with the patched run function
+        with patch("predator_prey.daemon.run_simulation_from_arguments", side_effect=lambda *args, **kwargs: os._exit(1)):
+            server = self.start_server()
+        with self.assertRaises(RuntimeError) as context:
+            list(submit_simulation(self.parameters, server.server_address, self.directory))
+        self.assertEqual("The worker process running the job exited unexpectedly", str(context.exception))
+
+    def test_load_cached_landscape_evicts_least_recently_used(self):
+        landscape_cache = OrderedDict()
+        other_landscape_file = os.path.join(self.directory, "other_landscape.dat")
+        third_landscape_file = os.path.join(self.directory, "third_landscape.dat")
+        for file_path in (other_landscape_file, third_landscape_file):
+            shutil.copy(self.landscape_file, file_path)
+
+        first = load_cached_landscape(landscape_cache, self.landscape_file, 2)
+        load_cached_landscape(landscape_cache, other_landscape_file, 2)
+        self.assertIs(load_cached_landscape(landscape_cache, self.landscape_file, 2), first)
+        load_cached_landscape(landscape_cache, third_landscape_file, 2)
+        cached_files = [key[0] for key in landscape_cache]
+        self.assertEqual(cached_files, [os.path.realpath(self.landscape_file), os.path.realpath(third_landscape_file)])
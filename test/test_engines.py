@@ -0,0 +1,118 @@
+import os
+import random
+import shutil
+import tempfile
+from unittest import TestCase
+import numpy as np
+from predator_prey.helper_functions import *
+from predator_prey.simulate_predator_prey import run_simulation
+from predator_prey.engines import *
+
+class TestEngines(TestCase):
+
+    def setUp(self):
+        self.width, self.height = 13, 7
+        generator = random.Random(3)
+        self.landscape = np.zeros((self.height + 2, self.width + 2), int)
+        for x in range(1, self.height + 1):
+            for y in range(1, self.width + 1):
+                self.landscape[x, y] = generator.random() < 0.7
+        self.neighbours = calculate_land_neighbours(self.width, self.height, self.width + 2, self.height + 2, self.landscape)
+
+    def run_engine(self, update_function, rates, time_steps):
+        mice = initialize_population_densities(1, self.width, self.height, self.landscape)
+        foxes = initialize_population_densities(2, self.width, self.height, self.landscape)
+        new_mice, new_foxes = mice.copy(), foxes.copy()
+        for _ in range(time_steps):
+            update_function(*rates, self.width, self.height, self.landscape, self.neighbours,
+                            mice, new_mice, foxes, new_foxes)
+            mice, new_mice = new_mice, mice
+            foxes, new_foxes = new_foxes, foxes
+        return mice, foxes
+
+    def assert_engine_matches_loop(self, update_function, rates, time_steps=20):
+        expected_mice, expected_foxes = self.run_engine(update_population_densities, rates, time_steps)
+        mice, foxes = self.run_engine(update_function, rates, time_steps)
+        self.assertTrue(np.array_equal(mice, expected_mice))
+        self.assertTrue(np.array_equal(foxes, expected_foxes))
+
+    def test_vectorized_engine_matches_loop(self):
+        self.assert_engine_matches_loop(create_update_function("vectorized"), (0.1, 0.05, 0.2, 0.03, 0.09, 0.2, 0.5))
+
+    def test_threaded_engine_matches_loop(self):
+        for threads in (1, 3, 16):
+            self.assert_engine_matches_loop(create_update_function("threaded", threads),
+                                            (0.1, 0.05, 0.2, 0.03, 0.09, 0.2, 0.5))
+
+    def test_engines_clamp_negative_densities_like_loop(self):
+        rates = (0.1, 0.9, 0.3, 0.4, 0.9, 0.3, 2.0)
+        mice, foxes = self.run_engine(update_population_densities, rates, 3)
+        self.assertTrue(np.any((mice == 0) & (self.landscape == 1)))
+        self.assert_engine_matches_loop(create_update_function("vectorized"), rates, 3)
+        self.assert_engine_matches_loop(create_update_function("threaded", 4), rates, 3)
+
+    def advance_engine(self, advance_function, rates, time_steps):
+        mice = initialize_population_densities(1, self.width, self.height, self.landscape)
+        foxes = initialize_population_densities(2, self.width, self.height, self.landscape)
+        mice, _, foxes, _ = advance_function(time_steps, *rates, self.width, self.height, self.landscape,
+                                             self.neighbours, mice, mice.copy(), foxes, foxes.copy())
+        return mice, foxes
+
+    def test_blocked_engine_matches_loop(self):
+        rates = (0.1, 0.05, 0.2, 0.03, 0.09, 0.2, 0.5)
+        expected_mice, expected_foxes = self.run_engine(update_population_densities, rates, 23)
+        for block_steps, band_rows, threads in ((1, 1, None), (4, 2, None), (8, 3, 3), (30, None, 2)):
+            advance_function = create_advance_function("blocked", threads, block_steps, band_rows)
+            mice, foxes = self.advance_engine(advance_function, rates, 23)
+            self.assertTrue(np.array_equal(mice, expected_mice))
+            self.assertTrue(np.array_equal(foxes, expected_foxes))
+
+    def test_advance_function_of_single_step_engine_matches_loop(self):
+        rates = (0.1, 0.05, 0.2, 0.03, 0.09, 0.2, 0.5)
+        expected_mice, expected_foxes = self.run_engine(update_population_densities, rates, 5)
+        mice, foxes = self.advance_engine(create_advance_function("vectorized"), rates, 5)
+        self.assertTrue(np.array_equal(mice, expected_mice))
+        self.assertTrue(np.array_equal(foxes, expected_foxes))
+
+    def test_thread_pools_are_bounded(self):
+        rates = (0.1, 0.05, 0.2, 0.03, 0.09, 0.2, 0.5)
+        update_function = create_update_function("threaded", 3)
+        first_pool = get_thread_pool(3)
+        for threads in range(5, 5 + MAX_THREAD_POOLS):
+            get_thread_pool(threads)
+        self.assertEqual(len(thread_pools), MAX_THREAD_POOLS)
+        self.assertNotIn(3, thread_pools)
+        with self.assertRaises(RuntimeError):
+            first_pool.submit(print)
+        # The engine gets a new pool once its own was shut down
+        self.assert_engine_matches_loop(update_function, rates)
+        shutdown_thread_pools()
+        self.assertEqual(len(thread_pools), 0)
+
+    def test_calculate_row_bands_covers_all_rows(self):
+        self.assertEqual(calculate_row_bands(7, 3), [(1, 3), (3, 5), (5, 8)])
+        self.assertEqual(calculate_row_bands(2, 4), [(1, 2), (2, 3)])
+
+    def test_create_update_function_rejects_unknown_engine(self):
+        with self.assertRaises(ValueError) as context:
+            create_update_function("gpu")
+        self.assertEqual("Engine must be one of: loop, vectorized, threaded", str(context.exception))
+
+    def test_run_simulation_with_threaded_engine_writes_same_outputs(self):
+        original_directory = os.getcwd()
+        directory = tempfile.mkdtemp()
+        os.chdir(directory)
+        try:
+            np.savetxt("landscape.dat", self.landscape[1:-1, 1:-1], fmt="%d",
+                       header="{} {}".format(self.width, self.height), comments="")
+            outputs = []
+            for engine in ("loop", "threaded", "blocked"):
+                run_simulation(0.1, 0.05, 0.2, 0.03, 0.09, 0.2, 0.5, 5, 10, "landscape.dat", 1, 2,
+                               engine=engine, threads=2)
+                with open("averages.csv") as f, open("map_0015.ppm") as g:
+                    outputs.append((f.read(), g.read()))
+            self.assertEqual(outputs[0], outputs[1])
+            self.assertEqual(outputs[0], outputs[2])
+        finally:
+            os.chdir(original_directory)
+            shutil.rmtree(directory)
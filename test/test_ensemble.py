@@ -0,0 +1,102 @@
+import os
+from unittest.mock import patch
+import numpy as np
+from predator_prey.simulate_predator_prey import run_simulation
+from predator_prey.ensemble import *
+from test.helpers import TemporaryDirectoryTestCase
+
+class TestEnsemble(TemporaryDirectoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        with open("temp_landscape.dat", "w") as f:
+            f.write("4 3\n1 1 1 0\n0 1 1 1\n1 1 0 1\n")
+        self.rates = (0.1, 0.05, 0.2, 0.03, 0.09, 0.2, 0.5, 3, 5)
+
+    def run_members(self, seed_pairs):
+        densities, averages = [], []
+        for mouse_seed, fox_seed in seed_pairs:
+            run_simulation(*self.rates, "temp_landscape.dat", mouse_seed, fox_seed, save_maps=False,
+                           snapshot_directory="snapshots")
+            densities.append([[np.load(os.path.join("snapshots", "snapshot_{:04d}.npz".format(index)))[species]
+                               for index in (0, 3, 6, 9)] for species in SPECIES])
+            with open("averages.csv") as f:
+                averages.append([[float(value) for value in row.split(",")[2:]] for row in f.readlines()[1:]])
+        return np.array(densities), np.array(averages)
+
+    def test_update_running_statistics(self):
+        values = np.array([[1.0, 4.0], [3.0, -2.0], [8.0, 0.5]])
+        mean, m2 = np.zeros(2), np.zeros(2)
+        minimum, maximum = np.full(2, np.inf), np.full(2, -np.inf)
+        for count, value in enumerate(values, 1):
+            update_running_statistics(count, mean, m2, minimum, maximum, value)
+        self.assertTrue(np.allclose(mean, values.mean(axis=0)))
+        self.assertTrue(np.allclose(calculate_variance(3, m2), values.var(axis=0, ddof=1)))
+        self.assertTrue(np.array_equal(minimum, values.min(axis=0)))
+        self.assertTrue(np.array_equal(maximum, values.max(axis=0)))
+        self.assertTrue(np.array_equal(calculate_variance(1, m2), np.zeros(2)))
+
+    def test_run_ensemble_matches_statistics_of_separate_runs(self):
+        densities, averages = self.run_members([(1, 5), (2, 6), (3, 7)])
+
+        output_time_step_indices = run_ensemble(*self.rates, "temp_landscape.dat", 1, 5, 3, "ensemble",
+                                                engine="vectorized")
+        self.assertEqual(output_time_step_indices, [0, 3, 6, 9])
+        self.assertFalse(os.path.exists(os.path.join("ensemble", "mice_m2.npy")))
+        for index, species in enumerate(SPECIES):
+            fields = densities[:, index]
+            expected = {"mean": fields.mean(axis=0), "variance": fields.var(axis=0, ddof=1),
+                        "min": fields.min(axis=0), "max": fields.max(axis=0)}
+            for statistic in STATISTICS:
+                actual = np.load(os.path.join("ensemble", "{}_{}.npy".format(species, statistic)))
+                self.assertTrue(np.allclose(actual, expected[statistic], rtol=1e-12, atol=1e-12))
+
+        with open(os.path.join("ensemble", "averages.csv")) as f:
+            rows = f.readlines()
+        self.assertEqual(rows[0], "Timestep,Time,Mice mean,Mice variance,Mice min,Mice max,"
+                                  "Foxes mean,Foxes variance,Foxes min,Foxes max\n")
+        for output, row in enumerate(rows[1:]):
+            values = [float(value) for value in row.split(",")]
+            self.assertEqual(values[:2], [3 * output, 1.5 * output])
+            for species in range(2):
+                member_averages = averages[:, output, species]
+                expected = [member_averages.mean(), member_averages.var(ddof=1), member_averages.min(),
+                            member_averages.max()]
+                self.assertTrue(np.allclose(values[2 + 4 * species:6 + 4 * species], expected, rtol=1e-12))
+
+    def test_run_ensemble_with_seed_pairs(self):
+        with open("seeds.txt", "w") as f:
+            f.write("# Mouse and fox seeds\n4 1\n\n9 9\n")
+        seed_pairs = load_seed_pairs("seeds.txt")
+        self.assertEqual(seed_pairs, [(4, 1), (9, 9)])
+        self.assertEqual(parse_seed_pairs("4:1,9:9"), seed_pairs)
+        densities, _ = self.run_members(seed_pairs)
+        run_ensemble(*self.rates, "temp_landscape.dat", 1, 5, 2, "ensemble", seed_pairs=seed_pairs)
+        self.assertTrue(np.allclose(np.load(os.path.join("ensemble", "mice_max.npy")), densities[:, 0].max(axis=0),
+                                    rtol=1e-12, atol=1e-12))
+        with self.assertRaises(ValueError):
+            run_ensemble(*self.rates, "temp_landscape.dat", 1, 5, 3, "ensemble", seed_pairs=seed_pairs)
+        with self.assertRaises(ValueError) as context:
+            run_ensemble(*self.rates, "temp_landscape.dat", 1, 5, 2, "ensemble",
+                         seed_pairs=parse_seed_pairs("4:1,9:-9"))
+        self.assertEqual("Random seed for initializing fox densities must be a non-negative integer",
+                         str(context.exception))
+        for contents in ("4\n", "4 1 2\n", "# No seeds\n"):
+            with open("seeds.txt", "w") as f:
+                f.write(contents)
+            with self.assertRaises(ValueError):
+                load_seed_pairs("seeds.txt")
+
+    def test_command_line_rejects_unsupported_options(self):
+        arguments = ["ensemble", "-f", "temp_landscape.dat", "-d", "3", "--members", "2"]
+        for option in (["--snapshot-directory", "snapshots"], ["--tile-directory", "tiles"],
+                       ["--sensitivities", "all"], ["--max-memory", "100"], ["--out-of-core", "work"],
+                       ["--seed-pairs", "1:2", "--seeds-file", "seeds.txt"]):
+            with patch("sys.argv", arguments + option), patch("sys.stderr"), self.assertRaises(SystemExit):
+                ensembleCommLineIntf()
+        self.assertFalse(os.path.exists("ensemble"))
+        with patch("sys.argv", ["ensemble", "-f", "temp_landscape.dat", "-d", "3", "-t", "2", "-q", "--no-maps",
+                                "--seed-pairs", "1:5,2:6"]):
+            ensembleCommLineIntf()
+        with open(os.path.join("ensemble", "averages.csv")) as f:
+            self.assertEqual(len(f.readlines()), 4)
@@ -0,0 +1,83 @@
+from unittest import TestCase
+import numpy as np
+from predator_prey.helper_functions import *
+from predator_prey.engines import STEP_ENGINES, create_update_function
+from predator_prey.out_of_core import calculate_density_statistics_out_of_core
+from predator_prey.equivalence import *
+
+class TestEquivalence(TestCase):
+
+    def setUp(self):
+        self.landscape = generate_landscape(9, 6, 0.7, seed=4)
+        self.rates = generate_rates(4)
+
+    def test_calculate_ulp_distance(self):
+        self.assertEqual(calculate_ulp_distance(np.array(1.0), np.nextafter(1.0, 2.0)), 1)
+        self.assertEqual(calculate_ulp_distance(np.array(-0.0), np.array(0.0)), 0)
+        self.assertEqual(calculate_ulp_distance(np.array(-5e-324), np.array(5e-324)), 2)
+
+    def test_find_first_divergence(self):
+        expected = np.array([[1.0, 2.0], [3.0, 4.0]])
+        actual = np.array([[1.0, 2.0], [3.5, 4.5]])
+        self.assertEqual(find_first_divergence(expected, actual), (1, 0))
+        self.assertIsNone(find_first_divergence(expected, actual, absolute_tolerance=0.5))
+        self.assertIsNone(find_first_divergence(expected, np.nextafter(expected, 10.0), ulp_tolerance=1))
+
+    def test_engines_are_equivalent_to_the_reference(self):
+        for engine in STEP_ENGINES:
+            check_engine_equivalence(engine, cases=2, time_steps=5, threads=2)
+        check_engine_equivalence("blocked", cases=2, time_steps=9, block_steps=3, band_rows=2, comparison_interval=4)
+
+    def test_alternative_output_paths_are_equivalent_to_the_reference(self):
+        def calculate_statistics_in_bands(mice_densities, foxes_densities, num_lands):
+            return calculate_density_statistics_out_of_core(mice_densities, foxes_densities, num_lands, 2)
+        check_equivalence(self.landscape, self.rates, 5, ulp_tolerance=4, map_function=save_ppm_file_from_densities,
+                          statistics_function=calculate_statistics_in_bands)
+
+    def test_check_equivalence_reports_the_first_divergence(self):
+        update_function = create_update_function("vectorized")
+
+        def advance_perturbed(time_steps, *arguments):
+            arguments = list(arguments)
+            for _ in range(time_steps):
+                update_function(*arguments)
+                # The new mice density of one square is off by a few ULP
+                arguments[-3][2, 3] *= 1 + 1e-15
+                arguments[-4], arguments[-3] = arguments[-3], arguments[-4]
+                arguments[-2], arguments[-1] = arguments[-1], arguments[-2]
+            return arguments[-4], arguments[-3], arguments[-2], arguments[-1]
+
+        self.landscape[2, 3] = True
+        with self.assertRaises(EquivalenceError) as context:
+            check_equivalence(self.landscape, self.rates, 5, advance_function=advance_perturbed)
+        self.assertIn("mice densities diverge at time step 1, index (2, 3)", str(context.exception))
+        check_equivalence(self.landscape, self.rates, 1, absolute_tolerance=1e-9, pixel_tolerance=1,
+                          advance_function=advance_perturbed)
+
+    def test_read_ppm_pixels_reads_plain_and_binary_files(self):
+        directory = tempfile.mkdtemp()
+        try:
+            colours = np.arange(6, dtype=np.uint8).reshape(2, 3)
+            landscape = np.ones((4, 5), bool)
+            landscape[1, 1] = False
+            save_ppm_file(3, 2, landscape, colours, colours + 10, 0, directory)
+            plain = read_ppm_pixels(os.path.join(directory, "map_0000.ppm"))
+            save_binary_ppm_file(3, 2, landscape, colours, colours + 10, 0, directory)
+            binary = read_ppm_pixels(os.path.join(directory, "map_0000.ppm"))
+        finally:
+            shutil.rmtree(directory)
+        self.assertTrue(np.array_equal(plain, binary))
+        self.assertEqual(list(plain[0, 0]), [0, 200, 255])
+        self.assertEqual(list(plain[1, 2]), [5, 15, 0])
+
+    def test_read_ppm_pixels_reads_whitespace_pixel_bytes(self):
+        directory = tempfile.mkdtemp()
+        try:
+            # The first pixel bytes are a space, a line feed and a tab, which are not part of the header
+            pixels = np.array([[[32, 10, 9], [255, 0, 13]]], np.uint8)
+            ppm_file = os.path.join(directory, "whitespace.ppm")
+            with open(ppm_file, "wb") as f:
+                f.write(b"P6\n2 1\n255\n" + pixels.tobytes())
+            self.assertTrue(np.array_equal(read_ppm_pixels(ppm_file), pixels))
+        finally:
+            shutil.rmtree(directory)
@@ -101,6 +101,14 @@ class TestHelperFunctions(TestCase):
         result = calculate_average_density(self.num_lands, self.densities)
         self.assertEqual(result, 1.0)
         
+    def test_calculate_average_density_is_independent_of_row_bands(self):
+        densities = np.random.RandomState(3).uniform(0, 5, (37, 53)) * 10.0 ** np.linspace(-8, 8, 53)
+        expected = calculate_average_density(self.num_lands, densities)
+        for band_rows in (1, 4, 10, 37):
+            row_sums = [calculate_row_sums(densities[row:row + band_rows]) for row in range(0, 37, band_rows)]
+            row_sums = [row_sum for band in reversed(row_sums) for row_sum in band]
+            self.assertEqual(calculate_total_density(row_sums) / self.num_lands, expected)
+
     def test_calculate_colour_value_maximum_density_zero(self):
         result = calculate_colour_value(self.densities[1,3],0)
         self.assertEqual(result, 0)
@@ -261,6 +269,41 @@ class TestHelperFunctions(TestCase):
         # Assert that all values in the density_colors array are initialized to 0
         self.assertTrue(np.all(density_colors == 0))
     
+    def test_initialize_arrays_without_colours(self):
+        _, _, density_colors = initialize_arrays(42, self.width, self.height, self.expected_landscape, colours=False)
+        self.assertIsNone(density_colors)
+
+    def test_save_ppm_file_from_densities_matches_save_ppm_file(self):
+        mice_densities = initialize_population_densities(1, self.width, self.height, self.expected_landscape)
+        foxes_densities = initialize_population_densities(2, self.width, self.height, self.expected_landscape)
+        maximum_mice_density, maximum_foxes_density, _, _ = \
+            calculate_density_statistics(mice_densities, foxes_densities, self.num_lands)
+        mice_density_colours = np.zeros((self.height, self.width), np.uint8)
+        foxes_density_colours = np.zeros((self.height, self.width), np.uint8)
+        calculate_density_colors(self.height, self.width, self.expected_landscape, mice_densities,
+                                 maximum_mice_density, foxes_densities, maximum_foxes_density,
+                                 mice_density_colours, foxes_density_colours)
+        save_ppm_file(self.width, self.height, self.expected_landscape, foxes_density_colours,
+                      mice_density_colours, self.time_step_index)
+        ppm_file_path = "map_{:04d}.ppm".format(self.time_step_index)
+        with open(ppm_file_path) as f:
+            expected = f.read()
+
+        save_ppm_file_from_densities(self.width, self.height, self.expected_landscape, mice_densities,
+                                     maximum_mice_density, foxes_densities, maximum_foxes_density,
+                                     self.time_step_index)
+        with open(ppm_file_path) as f:
+            self.assertEqual(f.read(), expected)
+
+    def test_estimate_memory_usage(self):
+        self.assertEqual(estimate_memory_usage(3, 2, colour_maps=False), 5 * 4 * 34)
+        self.assertEqual(estimate_memory_usage(3, 2, colour_maps=True, engine_bytes=100), 5 * 4 * 34 + 12 + 100)
+
+    def test_calculate_relative_change(self):
+        self.assertEqual(calculate_relative_change(np.array([2.0, -4.0]), np.array([3.0, -4.0])), 0.25)
+        self.assertEqual(calculate_relative_change(0.0, 0.0), 0.0)
+        self.assertEqual(calculate_relative_change(0.0, 1.0), float("inf"))
+
     def tearDown(self):
         # remove the temporary created PPM and landscape file
         ppm_file_path = os.path.join(os.getcwd(), "map_{:04d}.ppm".format(self.time_step_index))
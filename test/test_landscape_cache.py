@@ -0,0 +1,59 @@
+import os
+import shutil
+from unittest.mock import patch
+import numpy as np
+from predator_prey.helper_functions import *
+from predator_prey.simulate_predator_prey import create_argument_parser, run_simulation_from_arguments
+from predator_prey.landscape_cache import *
+from test.helpers import TemporaryDirectoryTestCase, read_outputs, write_landscape_file
+
+class TestLandscapeCache(TemporaryDirectoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        write_landscape_file("temp_landscape.dat")
+
+    def test_load_compiled_landscape_matches_load_landscape(self):
+        expected = load_landscape("temp_landscape.dat")
+        for _ in range(2):
+            landscape_data = load_compiled_landscape("temp_landscape.dat", "landscapes")
+            self.assertEqual(landscape_data[:4], expected[:4])
+            self.assertEqual(landscape_data[5], expected[5])
+            for array, expected_array in ((landscape_data[4], expected[4]), (landscape_data[6], expected[6])):
+                self.assertEqual(array.dtype, expected_array.dtype)
+                self.assertTrue(np.array_equal(array, expected_array))
+        self.assertEqual(len(os.listdir("landscapes")), 1)
+
+    def test_compiled_landscape_is_reused_for_the_same_contents(self):
+        load_compiled_landscape("temp_landscape.dat", "landscapes")
+        shutil.copy("temp_landscape.dat", "copy.dat")
+        with patch("predator_prey.landscape_cache.load_landscape") as load, \
+                patch("predator_prey.landscape_cache.validate_input_file_argument") as validate:
+            load_compiled_landscape("copy.dat", "landscapes")
+        load.assert_not_called()
+        validate.assert_not_called()
+
+        with open("copy.dat", "w") as f:
+            f.write("2 1\n1 0\n")
+        landscape_data = load_compiled_landscape("copy.dat", "landscapes")
+        self.assertEqual(landscape_data[5], 1)
+        self.assertEqual(landscape_data[4].tolist(), [[False] * 4, [False, True, False, False], [False] * 4])
+        self.assertEqual(len(os.listdir("landscapes")), 2)
+
+    def test_invalid_landscape_is_not_compiled(self):
+        with open("invalid.dat", "w") as f:
+            f.write("2 1\n1 2\n")
+        with self.assertRaises(ValueError):
+            load_compiled_landscape("invalid.dat", "landscapes")
+        self.assertEqual(os.listdir("landscapes"), [])
+        with self.assertRaises(FileNotFoundError):
+            load_compiled_landscape("missing.dat", "landscapes")
+
+    def test_run_with_compiled_landscape_matches_run(self):
+        arguments = ["-f", "temp_landscape.dat", "-d", "4", "-t", "2", "--engine", "vectorized"]
+        run_simulation_from_arguments(create_argument_parser().parse_args(arguments))
+        expected = read_outputs()
+        for _ in range(2):
+            run_simulation_from_arguments(create_argument_parser().parse_args(
+                arguments + ["--landscape-cache-directory", "landscapes"]))
+            self.assertEqual(read_outputs(), expected)
@@ -0,0 +1,118 @@
+import os
+import random
+import numpy as np
+from predator_prey.helper_functions import *
+from predator_prey.simulate_predator_prey import run_simulation
+from predator_prey.landscape_changes import *
+from test.helpers import TemporaryDirectoryTestCase
+
+class TestLandscapeChanges(TemporaryDirectoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.rows = [[1, 1, 1, 0, 1], [0, 1, 1, 1, 1], [1, 1, 0, 1, 1], [1, 0, 1, 1, 0]]
+        self.write_landscape("temp_landscape.dat", self.rows)
+        self.rates = (0.1, 0.05, 0.2, 0.03, 0.09, 0.2, 0.5)
+
+    def write_landscape(self, file_name, rows):
+        with open(file_name, "w") as f:
+            f.write("{} {}\n".format(len(rows[0]), len(rows)))
+            for row in rows:
+                f.write(" ".join(str(value) for value in row) + "\n")
+
+    def test_load_landscape_changes(self):
+        with open("changes.txt", "w") as f:
+            f.write("# Flooding\n4 0 0 0\n\n4 3 4 1\n2 1 0 1\n")
+        self.assertEqual(load_landscape_changes("changes.txt", 5, 4),
+                         {4: [(1, 1, False), (4, 5, True)], 2: [(2, 1, True)]})
+        for line in ("4 0 0", "0 0 0 1", "1 4 0 1", "1 0 5 1", "1 0 0 2"):
+            with open("changes.txt", "w") as f:
+                f.write(line + "\n")
+            with self.assertRaises(ValueError):
+                load_landscape_changes("changes.txt", 5, 4)
+
+    def test_find_next_change_time_step(self):
+        self.assertEqual(find_next_change_time_step([2, 5], 0), 2)
+        self.assertEqual(find_next_change_time_step([2, 5], 2), 5)
+        self.assertIsNone(find_next_change_time_step([2, 5], 5))
+
+    def test_incremental_changes_match_recomputed_landscape(self):
+        _, _, _, _, landscape, num_lands, neighbouring_land_count = load_landscape("temp_landscape.dat")
+        generator = random.Random(3)
+        rows = [list(row) for row in self.rows]
+        for _ in range(20):
+            changes = []
+            for _ in range(generator.randint(1, 6)):
+                row, column, land = generator.randrange(4), generator.randrange(5), generator.random() < 0.5
+                rows[row][column] = int(land)
+                changes.append((row + 1, column + 1, land))
+            num_lands += apply_landscape_changes(changes, 5, 4, landscape, neighbouring_land_count, [], [])
+            self.write_landscape("expected.dat", rows)
+            _, _, _, _, expected_landscape, expected_num_lands, expected_neighbours = load_landscape("expected.dat")
+            self.assertTrue(np.array_equal(landscape, expected_landscape))
+            self.assertTrue(np.array_equal(neighbouring_land_count, expected_neighbours))
+            self.assertEqual(num_lands, expected_num_lands)
+
+    def test_flooded_densities_are_dropped_or_displaced(self):
+        _, _, _, _, landscape, _, neighbouring_land_count = load_landscape("temp_landscape.dat")
+        densities = np.where(landscape, np.arange(42.0).reshape(6, 7), 0.0)
+        tangents = np.stack([densities, 2 * densities])
+        spare_densities = np.ones((6, 7))
+        for policy in FLOODED_DENSITY_POLICIES:
+            changed_landscape, neighbours = landscape.copy(), neighbouring_land_count.copy()
+            changed_densities, changed_tangents, changed_spare_densities = \
+                densities.copy(), tangents.copy(), spare_densities.copy()
+            # The square at (2, 2) has the land neighbours (1, 2), (3, 2) and (2, 3)
+            apply_landscape_changes([(2, 2, False)], 5, 4, changed_landscape, neighbours,
+                                    [changed_densities, changed_tangents], [changed_spare_densities], policy)
+            self.assertEqual(changed_densities[2, 2], 0.0)
+            self.assertEqual(changed_tangents[:, 2, 2].tolist(), [0.0, 0.0])
+            self.assertEqual(changed_spare_densities[2, 2], 0.0)
+            if policy == "drop":
+                self.assertEqual(changed_densities.sum(), densities.sum() - 16.0)
+            else:
+                self.assertEqual(changed_densities.sum(), densities.sum())
+                self.assertEqual([changed_densities[1, 2], changed_densities[3, 2], changed_densities[2, 3]],
+                                 [9.0 + 16.0 / 3, 23.0 + 16.0 / 3, 17.0 + 16.0 / 3])
+                self.assertTrue(np.allclose(changed_tangents[1], 2 * changed_densities))
+
+    def test_run_with_changes_matches_restarted_run(self):
+        with open("changes.txt", "w") as f:
+            f.write("3 1 1 0\n3 2 2 1\n3 0 3 1\n")
+        landscape_changes = load_landscape_changes("changes.txt", 5, 4)
+        engine_densities = []
+        for engine in ("loop", "vectorized", "blocked"):
+            _, mice_densities, foxes_densities = run_simulation(*self.rates, 2, 4, "temp_landscape.dat", 1, 2,
+                                                                save_maps=False, engine=engine,
+                                                                landscape_changes=landscape_changes)
+            engine_densities.append((mice_densities, foxes_densities))
+        for mice_densities, foxes_densities in engine_densities[1:]:
+            self.assertTrue(np.array_equal(mice_densities, engine_densities[0][0]))
+            self.assertTrue(np.array_equal(foxes_densities, engine_densities[0][1]))
+
+        # Stop at time step 3, flood and reclaim by hand, and resume on the changed landscape
+        _, mice_densities, foxes_densities = run_simulation(*self.rates, 2, 1.5, "temp_landscape.dat", 1, 2,
+                                                            save_maps=False)
+        mice_densities[2, 2] = foxes_densities[2, 2] = 0.0
+        self.write_landscape("changed_landscape.dat", [[1, 1, 1, 1, 1], [0, 0, 1, 1, 1], [1, 1, 1, 1, 1],
+                                                       [1, 0, 1, 1, 0]])
+        _, expected_mice_densities, expected_foxes_densities = run_simulation(
+            *self.rates, 2, 4, "changed_landscape.dat", 1, 2, save_maps=False,
+            initial_state=(3, mice_densities, foxes_densities), landscape_data=load_landscape("changed_landscape.dat"))
+        self.assertTrue(np.array_equal(engine_densities[0][0], expected_mice_densities))
+        self.assertTrue(np.array_equal(engine_densities[0][1], expected_foxes_densities))
+
+    def test_landscape_data_is_not_changed(self):
+        landscape_data = load_landscape("temp_landscape.dat")
+        landscape, neighbours = landscape_data[4].copy(), landscape_data[6].copy()
+        run_simulation(*self.rates, 2, 4, "temp_landscape.dat", 1, 2, save_maps=False, landscape_data=landscape_data,
+                       landscape_changes={1: [(1, 1, False)]})
+        self.assertTrue(np.array_equal(landscape_data[4], landscape))
+        self.assertTrue(np.array_equal(landscape_data[6], neighbours))
+        with self.assertRaises(ValueError):
+            run_simulation(*self.rates, 2, 4, "temp_landscape.dat", 1, 2, save_maps=False,
+                           landscape_changes={1: [(1, 1, False)]}, flooded_density_policy="evaporate")
+        with self.assertRaises(ValueError):
+            run_simulation(*self.rates, 2, 4, "temp_landscape.dat", 1, 2, save_maps=False,
+                           snapshot_directory="snapshots", landscape_changes={1: [(1, 1, False)]})
+        self.assertFalse(os.path.exists("snapshots"))
@@ -0,0 +1,68 @@
+import json
+import logging
+from predator_prey.logging_config import *
+from predator_prey.helper_functions import read_landscape_file
+from predator_prey.simulate_predator_prey import run_simulation
+from test.helpers import TemporaryDirectoryTestCase, write_landscape_file, SMALL_LANDSCAPE
+
+class TestLoggingConfig(TemporaryDirectoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        write_landscape_file("temp_landscape.dat", SMALL_LANDSCAPE)
+
+    def tearDown(self):
+        logger = logging.getLogger("predator_prey")
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+            handler.close()
+        logger.setLevel(logging.NOTSET)
+        logger.propagate = True
+        super().tearDown()
+
+    def create_record(self, event=None):
+        record = logging.LogRecord("predator_prey", logging.INFO, __file__, 1, "message", None, None)
+        if event is not None:
+            record.event = event
+        return record
+
+    def test_progress_event_filter_rate_limits_events(self):
+        progress_filter = ProgressEventFilter(3600)
+        self.assertFalse(progress_filter.filter(self.create_record()))
+        self.assertTrue(progress_filter.filter(self.create_record({"event": "averages"})))
+        self.assertFalse(progress_filter.filter(self.create_record({"event": "averages"})))
+        self.assertTrue(progress_filter.filter(self.create_record({"event": "finished"})))
+
+    def test_progress_event_formatter_writes_json(self):
+        record = self.create_record({"event": "averages", "timestep": 10})
+        event = json.loads(ProgressEventFormatter().format(record))
+        self.assertEqual(event["timestep"], 10)
+        self.assertEqual(event["wall_time"], record.created)
+
+    def test_read_landscape_file_logs_landscape_only_at_debug_level(self):
+        with self.assertLogs("predator_prey", logging.INFO) as logs:
+            read_landscape_file("temp_landscape.dat")
+        self.assertEqual(logs.output, ["INFO:predator_prey.helper_functions:Width: 3 Height: 2"])
+        with self.assertLogs("predator_prey", logging.DEBUG) as logs:
+            read_landscape_file("temp_landscape.dat")
+        self.assertEqual(len(logs.output), 2)
+
+    def test_configure_logging_writes_progress_events(self):
+        configure_logging("INFO", quiet=True, progress_file="progress.jsonl", progress_interval=0)
+        run_simulation(0.5, 0.2, 0.1, 0.4, 0.3, 0.2, 1, 1, 2, "temp_landscape.dat", 42, 42)
+        with open("progress.jsonl") as f:
+            events = [json.loads(line) for line in f]
+        self.assertEqual([event["event"] for event in events], ["averages", "averages", "finished"])
+        self.assertEqual("{:.17f}".format(events[1]["mice"]), "1.77137705920111133")
+
+    def test_configure_logging_quiet_mode(self):
+        logger = configure_logging("DEBUG", quiet=True)
+        self.assertEqual(logger.level, logging.WARNING)
+
+    def test_configure_logging_replaces_handlers_without_a_stream(self):
+        logger = logging.getLogger("predator_prey")
+        logger.addHandler(logging.NullHandler())
+        logger.addHandler(logging.FileHandler("delayed.log", delay=True))
+        configure_logging("INFO")
+        self.assertEqual(len(logger.handlers), 1)
+        self.assertIsInstance(logger.handlers[0], logging.StreamHandler)
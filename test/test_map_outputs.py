@@ -0,0 +1,58 @@
+import os
+import numpy as np
+from predator_prey.simulate_predator_prey import run_simulation
+from predator_prey.equivalence import read_ppm_pixels
+from predator_prey.map_outputs import *
+from test.helpers import TemporaryDirectoryTestCase, write_landscape_file
+
+class TestMapOutputs(TemporaryDirectoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        write_landscape_file("temp_landscape.dat")
+
+    def test_parse_region(self):
+        self.assertEqual(parse_region("1,2,3,4"), (1, 2, 3, 4))
+        with self.assertRaises(ValueError):
+            parse_region("1,2,3")
+        with self.assertRaises(ValueError):
+            parse_region("1,2,0,4")
+
+    def test_create_map_outputs_validates_regions(self):
+        with self.assertRaises(ValueError):
+            create_map_outputs(5, 4, regions=[(3, 0, 3, 1)])
+
+    def test_region_maps_are_crops_of_the_full_map(self):
+        regions = [(1, 1, 3, 2), (0, 0, 5, 4), (4, 3, 1, 1)]
+        map_outputs = create_map_outputs(5, 4, regions, region_pattern="roi{region}_{time_step:03d}.ppm")
+        run_simulation(0.1, 0.05, 0.2, 0.03, 0.09, 0.2, 0.5, 2, 2, "temp_landscape.dat", 1, 2,
+                       map_outputs=map_outputs)
+        for time_step_index in (0, 2):
+            full_map = read_ppm_pixels("map_{:04d}.ppm".format(time_step_index))
+            for number, (left, top, width, height) in enumerate(regions):
+                region_map = read_ppm_pixels("roi{}_{:03d}.ppm".format(number, time_step_index))
+                self.assertTrue(np.array_equal(region_map, full_map[top:top + height, left:left + width]))
+
+    def test_calculate_block_average(self):
+        landscape = np.zeros((6, 7), bool)
+        landscape[1:5, 1:6] = [[1, 1, 1, 0, 1], [0, 1, 1, 1, 1], [1, 1, 0, 1, 1], [1, 0, 1, 1, 0]]
+        densities = np.where(landscape, np.arange(42.0).reshape(6, 7), 0.0)
+        block_densities, block_landscape = calculate_block_average(5, 4, landscape, densities, 2)
+        self.assertEqual(block_densities.shape, (4, 5))
+        # The top left block has land squares of densities 8, 9 and 16
+        self.assertEqual(block_densities[1, 1], 11.0)
+        # The right edge block is one square wide, with land squares of densities 12 and 19
+        self.assertEqual(block_densities[1, 3], 15.5)
+        self.assertTrue(block_landscape[1:-1, 1:-1].all())
+        self.assertFalse(block_landscape[0].any())
+
+    def test_overview_maps(self):
+        map_outputs = create_map_outputs(5, 4, overview_factor=2)
+        run_simulation(0.1, 0.05, 0.2, 0.03, 0.09, 0.2, 0.5, 2, 2, "temp_landscape.dat", 1, 2, save_maps=False,
+                       map_outputs=map_outputs)
+        self.assertFalse(os.path.exists("map_0000.ppm"))
+        overview = read_ppm_pixels("overview2_0000.ppm")
+        self.assertEqual(overview.shape, (2, 3, 3))
+        self.assertEqual(overview[:, :, 2].tolist(), [[0, 0, 0], [0, 0, 0]])
+        self.assertEqual(overview[:, :, 0].max(), 255)
+        self.assertEqual(overview[:, :, 1].max(), 255)
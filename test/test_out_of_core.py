@@ -0,0 +1,57 @@
+import os
+import random
+import numpy as np
+from predator_prey.helper_functions import *
+from predator_prey.simulate_predator_prey import run_simulation
+from predator_prey.out_of_core import *
+from test.helpers import TemporaryDirectoryTestCase, read_outputs
+
+class TestOutOfCore(TemporaryDirectoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        generator = random.Random(5)
+        self.width, self.height = 11, 9
+        with open("temp_landscape.dat", "w") as f:
+            f.write("{} {}\n".format(self.width, self.height))
+            for _ in range(self.height):
+                f.write(" ".join(str(int(generator.random() < 0.7)) for _ in range(self.width)) + "\n")
+        self.rates = (0.1, 0.05, 0.2, 0.03, 0.09, 0.2, 0.5, 4, 10)
+
+    def test_load_landscape_out_of_core_matches_load_landscape(self):
+        os.mkdir("work")
+        expected = load_landscape("temp_landscape.dat")
+        landscape_data = load_landscape_out_of_core("temp_landscape.dat", "work", band_rows=2)
+        self.assertEqual(landscape_data[:4], expected[:4])
+        self.assertTrue(np.array_equal(landscape_data[4], expected[4]))
+        self.assertEqual(landscape_data[5], expected[5])
+        self.assertTrue(np.array_equal(landscape_data[6], expected[6]))
+
+    def test_initialize_population_densities_out_of_core(self):
+        landscape = load_landscape("temp_landscape.dat")[4]
+        for seed in (0, 3):
+            densities = np.zeros(landscape.shape)
+            initialize_population_densities_out_of_core(seed, self.width, self.height, landscape, densities)
+            expected = initialize_population_densities(seed, self.width, self.height, landscape)
+            self.assertTrue(np.array_equal(densities, expected))
+
+    def test_run_simulation_out_of_core_matches_run_simulation(self):
+        _, expected_mice, expected_foxes = run_simulation(*self.rates, "temp_landscape.dat", 1, 2)
+        expected = read_outputs()
+
+        for band_rows, block_steps in ((None, 8), (2, 3)):
+            _, mice, foxes = run_simulation_out_of_core(*self.rates, "temp_landscape.dat", 1, 2, "work",
+                                                        block_steps=block_steps, band_rows=band_rows)
+            self.assertTrue(np.array_equal(mice, expected_mice))
+            self.assertTrue(np.array_equal(foxes, expected_foxes))
+            outputs = read_outputs()
+            self.assertEqual(sorted(outputs), sorted(expected))
+            # The averages are reduced independently of the bands, so they are identical too
+            self.assertEqual(outputs, expected)
+
+    def test_run_simulation_out_of_core_narrows_bands_to_max_memory(self):
+        max_memory = estimate_out_of_core_memory(self.width, 4, 8)
+        run_simulation_out_of_core(*self.rates, "temp_landscape.dat", 1, 2, "work", max_memory=max_memory)
+        self.assertTrue(os.path.exists("map_0000.ppm"))
+        with self.assertRaises(MemoryError):
+            run_simulation_out_of_core(*self.rates, "temp_landscape.dat", 1, 2, "work", max_memory=100)
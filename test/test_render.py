@@ -0,0 +1,55 @@
+import os
+from predator_prey.simulate_predator_prey import run_simulation
+from predator_prey.render import *
+from test.helpers import TemporaryDirectoryTestCase, write_landscape_file, SMALL_LANDSCAPE
+
+class TestRender(TemporaryDirectoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        write_landscape_file("temp_landscape.dat", SMALL_LANDSCAPE)
+        self.parameters = (0.5, 0.2, 0.1, 0.4, 0.3, 0.2, 1, 1, 3, "temp_landscape.dat", 42, 42)
+
+    def read_file(self, file_path, mode="r"):
+        with open(file_path, mode) as f:
+            return f.read()
+
+    def test_run_simulation_stores_snapshots_without_maps(self):
+        run_simulation(*self.parameters, save_maps=False, snapshot_directory="snapshots")
+        self.assertFalse(os.path.exists("map_0000.ppm"))
+        self.assertTrue(os.path.exists(os.path.join("snapshots", "landscape.npy")))
+        self.assertEqual(list_snapshots("snapshots"), [0, 1, 2])
+
+    def test_render_snapshots_reproduces_simulation_maps(self):
+        run_simulation(*self.parameters, snapshot_directory="snapshots")
+        rendered = render_snapshots("snapshots", "rendered", processes=2)
+        self.assertEqual(rendered, [0, 1, 2])
+        for time_step_index in rendered:
+            file_name = "map_{:04d}.ppm".format(time_step_index)
+            self.assertEqual(self.read_file(os.path.join("rendered", file_name)), self.read_file(file_name))
+
+    def test_render_snapshots_fixed_colour_scale(self):
+        run_simulation(*self.parameters, save_maps=False, snapshot_directory="snapshots")
+        render_snapshots("snapshots", "rendered", colour_scale="fixed", processes=1)
+        maximum_mice_density, maximum_foxes_density = calculate_maximum_densities("snapshots", [0, 1, 2])
+        _, mice_densities, foxes_densities = load_density_snapshot("snapshots", 0)
+        self.assertTrue(np.max(mice_densities) <= maximum_mice_density)
+        first_pixel = self.read_file(os.path.join("rendered", "map_0000.ppm")).splitlines()[3]
+        expected = "{} {} 0".format(int(foxes_densities[1, 1] / maximum_foxes_density * 255),
+                                    int(mice_densities[1, 1] / maximum_mice_density * 255))
+        self.assertEqual(first_pixel, expected)
+
+    def test_render_snapshots_binary_format(self):
+        run_simulation(*self.parameters, snapshot_directory="snapshots")
+        render_snapshots("snapshots", "rendered", [1], image_format="ppm-binary", processes=1)
+        content = self.read_file(os.path.join("rendered", "map_0001.ppm"), "rb")
+        self.assertTrue(content.startswith(b"P6\n3 2\n255\n"))
+        pixels = [int(value) for line in self.read_file("map_0001.ppm").splitlines()[3:] for value in line.split()]
+        self.assertEqual(list(content[len(b"P6\n3 2\n255\n"):]), pixels)
+
+    def test_select_snapshots(self):
+        self.assertEqual(select_snapshots([0, 10, 20, 30, 40], start=10, stop=40, every=2), [10, 30])
+
+    def test_render_snapshots_rejects_unknown_format(self):
+        with self.assertRaises(ValueError):
+            render_snapshots("snapshots", image_format="png")
@@ -0,0 +1,86 @@
+import os
+from predator_prey.simulate_predator_prey import run_simulation
+from predator_prey.result_cache import *
+from test.helpers import TemporaryDirectoryTestCase, read_outputs, write_landscape_file, SMALL_LANDSCAPE
+
+class TestResultCache(TemporaryDirectoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        write_landscape_file("temp_landscape.dat", SMALL_LANDSCAPE)
+        self.rates = (0.5, 0.2, 0.1, 0.4, 0.3, 0.2, 0.5, 2)
+        self.cache_size = 1024 * 1024
+
+    def run_reference(self, duration):
+        run_simulation(*self.rates, duration, "temp_landscape.dat", 42, 7)
+        return read_outputs()
+
+    def run_cached(self, duration, cache_size=None, **options):
+        run_cached_simulation(*self.rates, duration, "temp_landscape.dat", 42, 7, "cache",
+                              cache_size or self.cache_size, **options)
+        return read_outputs()
+
+    def test_cache_miss_then_hit_gives_same_outputs(self):
+        expected = self.run_reference(5)
+        self.assertEqual(self.run_cached(5), expected)
+        self.assertEqual(self.run_cached(5), expected)
+        self.assertEqual(len(os.listdir("cache")), 1)
+
+    def test_shorter_run_is_answered_from_cache(self):
+        self.run_cached(10)
+        self.assertEqual(self.run_cached(3), self.run_reference(3))
+
+    def test_longer_run_resumes_from_cached_prefix(self):
+        self.run_cached(2.5)
+        key = os.listdir("cache")[0]
+        metadata, _ = load_cache_entry(os.path.join("cache", key))
+        self.assertEqual(metadata["time_step_index"], 5)
+
+        self.assertEqual(self.run_cached(6), self.run_reference(6))
+        metadata, _ = load_cache_entry(os.path.join("cache", key))
+        self.assertEqual(metadata["time_step_index"], 12)
+
+    def test_resumed_run_streams_all_averages(self):
+        self.run_cached(2.5)
+        time_step_indices = []
+        self.run_cached(6, averages_callback=lambda index, *averages: time_step_indices.append(index))
+        self.assertEqual(time_step_indices, [0, 2, 4, 6, 8, 10])
+
+    def test_cache_without_maps_is_not_used_for_maps(self):
+        self.run_cached(3, save_maps=False)
+        self.assertEqual(self.run_cached(3), self.run_reference(3))
+
+    def test_cache_key_depends_on_landscape_contents_and_parameters(self):
+        key = calculate_cache_key("temp_landscape.dat", *self.rates, 42, 7)
+        self.assertEqual(key, calculate_cache_key("temp_landscape.dat", *self.rates, 42, 7))
+        self.assertNotEqual(key, calculate_cache_key("temp_landscape.dat", *self.rates, 42, 8))
+        with open("temp_landscape.dat", "w") as f:
+            f.write("3 2\n1 1 1\n1 1 1\n")
+        self.assertNotEqual(key, calculate_cache_key("temp_landscape.dat", *self.rates, 42, 7))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        self.run_cached(3)
+        first_key = os.listdir("cache")[0]
+        entry_size = calculate_directory_size(os.path.join("cache", first_key))
+        self.rates = self.rates[:-1] + (3,)
+        self.run_cached(3, cache_size=entry_size + entry_size // 2)
+        self.assertNotIn(first_key, os.listdir("cache"))
+        self.assertEqual(len(os.listdir("cache")), 1)
+
+    def test_options_changing_the_outputs_are_refused(self):
+        for options in ({"sensitivities": ["birth_mice"]}, {"output_threshold": 0.1},
+                        {"landscape_changes": {1: [(1, 1, False)]}}, {"map_outputs": []}):
+            with self.assertRaises(ValueError):
+                self.run_cached(3, **options)
+        self.assertFalse(os.path.exists("cache"))
+        self.assertEqual(self.run_cached(3, engine="blocked", threads=2, max_memory=1 << 30),
+                         self.run_reference(3))
+
+    def test_entries_are_replaced_whole(self):
+        self.run_cached(2.5)
+        self.run_cached(6)
+        key = os.listdir("cache")[0]
+        self.assertEqual(os.listdir("cache"), [key])
+        self.assertEqual(sorted(file_name for file_name in os.listdir(os.path.join("cache", key))
+                                if file_name.startswith("map_")), ["map_{:04d}.ppm".format(index)
+                                                                   for index in range(0, 12, 2)])
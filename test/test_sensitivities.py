@@ -0,0 +1,74 @@
+import numpy as np
+from predator_prey.helper_functions import estimate_memory_usage
+from predator_prey.engines import estimate_engine_memory
+from predator_prey.simulate_predator_prey import run_simulation
+from predator_prey.sensitivities import *
+from test.helpers import TemporaryDirectoryTestCase, write_landscape_file
+
+class TestSensitivities(TemporaryDirectoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        write_landscape_file("temp_landscape.dat")
+        self.rates = [0.1, 0.05, 0.2, 0.03, 0.09, 0.2]
+
+    def read_csv(self, file_name):
+        with open(file_name) as f:
+            rows = f.readlines()
+        return rows[0].strip().split(","), np.array([[float(value) for value in row.split(",")] for row in rows[1:]])
+
+    def run_averages(self, rates, **options):
+        run_simulation(*rates, 0.5, 3, 6, "temp_landscape.dat", 1, 2, save_maps=False, engine="vectorized", **options)
+        return self.read_csv("averages.csv")[1][:, 2:]
+
+    def test_parse_sensitivity_parameters(self):
+        self.assertEqual(parse_sensitivity_parameters("death_foxes,birth-mice"), ["birth_mice", "death_foxes"])
+        self.assertEqual(parse_sensitivity_parameters("all"), SENSITIVITY_PARAMETERS)
+        with self.assertRaises(ValueError):
+            parse_sensitivity_parameters("birth_rabbits")
+
+    def test_sensitivities_match_finite_differences(self):
+        averages = self.run_averages(self.rates, sensitivities=SENSITIVITY_PARAMETERS)
+        header, sensitivities = self.read_csv("sensitivities.csv")
+        self.assertEqual(header[:4], ["Timestep", "Time", "dMice/dbirth_mice", "dFoxes/dbirth_mice"])
+        self.assertEqual(sensitivities[:, 0].tolist(), [0, 3, 6, 9])
+        # The averages are unchanged by the sensitivities
+        self.assertTrue(np.array_equal(averages, self.run_averages(self.rates)))
+
+        for index in range(len(SENSITIVITY_PARAMETERS)):
+            step = 1e-6 * self.rates[index]
+            rates = list(self.rates)
+            rates[index] += step
+            upper = self.run_averages(rates)
+            rates[index] -= 2 * step
+            lower = self.run_averages(rates)
+            finite_differences = (upper - lower) / (2 * step)
+            self.assertTrue(np.allclose(sensitivities[:, 2 + 2 * index:4 + 2 * index], finite_differences,
+                                        rtol=1e-5, atol=1e-8))
+
+    def test_sensitivities_are_zero_where_densities_are_clamped(self):
+        landscape = np.ones((3, 4), bool)
+        landscape[:, 0] = landscape[:, -1] = landscape[0] = landscape[-1] = False
+        neighbours = np.zeros((3, 4), np.uint8)
+        neighbours[1, 1:3] = 1
+        mice_densities, foxes_densities = np.zeros((3, 4)), np.zeros((3, 4))
+        mice_densities[1, 1:3], foxes_densities[1, 1:3] = 1.0, 2.0
+        mice_tangents, new_mice_tangents, foxes_tangents, new_foxes_tangents = \
+            create_tangent_arrays(["death_mice"], (3, 4))
+        new_mice_densities, new_foxes_densities = mice_densities.copy(), foxes_densities.copy()
+        new_mice_densities[1, 1] = 0.0
+        update_tangents(["death_mice"], 0.1, 5.0, 0.2, 0.03, 0.09, 0.2, 0.5, landscape, neighbours,
+                        mice_densities, foxes_densities, new_mice_densities, new_foxes_densities, mice_tangents,
+                        foxes_tangents, new_mice_tangents, new_foxes_tangents)
+        self.assertEqual(new_mice_tangents[0, 1].tolist(), [0.0, 0.0, -1.0, 0.0])
+        self.assertTrue(np.array_equal(new_foxes_tangents, np.zeros((1, 3, 4))))
+
+    def test_sensitivities_count_towards_max_memory(self):
+        self.assertEqual(estimate_sensitivity_memory(["birth_mice", "death_foxes"], 5, 4),
+                         4 * 2 * 8 * 7 * 6 + calculate_tangent_workspace_bytes(["birth_mice", "death_foxes"], 5, 4))
+        lean_memory = estimate_memory_usage(5, 4, False, estimate_engine_memory("blocked", 5, 4))
+        self.run_averages(self.rates, max_memory=lean_memory)
+        with self.assertRaises(MemoryError):
+            self.run_averages(self.rates, max_memory=lean_memory, sensitivities=SENSITIVITY_PARAMETERS)
+        self.run_averages(self.rates, max_memory=lean_memory + estimate_sensitivity_memory(SENSITIVITY_PARAMETERS, 5, 4),
+                          sensitivities=SENSITIVITY_PARAMETERS)
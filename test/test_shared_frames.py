@@ -0,0 +1,76 @@
+import os
+import subprocess
+import sys
+import uuid
+import numpy as np
+import predator_prey
+from predator_prey.simulate_predator_prey import run_simulation
+from predator_prey.shared_frames import *
+from test.helpers import TemporaryDirectoryTestCase, write_landscape_file
+
+class TestSharedFrames(TemporaryDirectoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        write_landscape_file("temp_landscape.dat")
+        self.name = "predator_prey_test_" + uuid.uuid4().hex[:12]
+
+    def test_frames_are_read_until_overwritten(self):
+        densities = np.arange(42.0).reshape(6, 7)
+        with SharedFrameBuffer.create(self.name, 5, 4, slots=2) as frame_buffer, \
+                SharedFrameBuffer.attach(self.name) as reader:
+            self.assertIsNone(reader.read_latest_frame())
+            for time_step_index in range(3):
+                frame_buffer.publish(time_step_index, time_step_index / 2, densities + time_step_index, 1.0,
+                                     -densities, 2.0, 3.0, 4.0)
+            self.assertEqual(reader.latest_frame, 3)
+            self.assertIsNone(reader.read_frame(1))
+            contents = reader.read_latest_frame()
+            self.assertEqual((contents["frame"], contents["time_step"], contents["time"]), (3, 2, 1.0))
+            self.assertEqual([contents[statistic] for statistic in ("maximum_mice_density", "maximum_foxes_density",
+                             "average_mice_density", "average_foxes_density")], [1.0, 2.0, 3.0, 4.0])
+            self.assertTrue(np.array_equal(contents["mice_densities"], densities + 2))
+            self.assertTrue(np.array_equal(contents["foxes_densities"], -densities))
+
+            # The views are of the shared memory, and are overwritten two frames later
+            frame_buffer.publish(3, 1.5, densities, 1.0, densities, 2.0, 3.0, 4.0)
+            self.assertTrue(reader.is_frame_intact(3))
+            frame_buffer.publish(4, 2.0, densities, 1.0, densities, 2.0, 3.0, 4.0)
+            self.assertFalse(reader.is_frame_intact(3))
+            self.assertTrue(np.array_equal(contents["mice_densities"], densities))
+            del contents
+
+    def test_run_simulation_publishes_output_steps(self):
+        with SharedFrameBuffer.create(self.name, 5, 4, slots=8) as frame_buffer:
+            run_simulation(0.1, 0.05, 0.2, 0.03, 0.09, 0.2, 0.5, 2, 3, "temp_landscape.dat", 1, 2, save_maps=False,
+                           frame_buffer=frame_buffer)
+            with open("averages.csv") as f:
+                rows = [row.strip().split(",") for row in f.readlines()[1:]]
+            self.assertEqual(frame_buffer.latest_frame, len(rows))
+            for frame, row in enumerate(rows, 1):
+                contents = frame_buffer.read_frame(frame)
+                self.assertEqual(str(contents["time_step"]), row[0])
+                self.assertEqual(["{:.17f}".format(contents["average_mice_density"]),
+                                  "{:.17f}".format(contents["average_foxes_density"])], row[2:])
+            # The last frame is of time step 4, the end of a run of duration 2
+            _, mice_densities, foxes_densities = run_simulation(0.1, 0.05, 0.2, 0.03, 0.09, 0.2, 0.5, 2, 2,
+                                                                "temp_landscape.dat", 1, 2, save_maps=False)
+            self.assertEqual(contents["time_step"], 4)
+            self.assertTrue(np.array_equal(contents["mice_densities"], mice_densities))
+            self.assertTrue(np.array_equal(contents["foxes_densities"], foxes_densities))
+            del contents
+
+    def test_reader_process_follows_frames(self):
+        densities = np.ones((6, 7))
+        with SharedFrameBuffer.create(self.name, 5, 4) as frame_buffer:
+            frame_buffer.publish(10, 5.0, densities, 1.0, densities, 1.0, 0.25, 0.5)
+            environment = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(predator_prey.__file__))))
+            result = subprocess.run([sys.executable, "-m", "predator_prey.shared_frames", self.name, "--count", "1",
+                                     "--timeout", "10"], capture_output=True, text=True, env=environment,
+                                    timeout=60)
+            self.assertEqual(result.returncode, 0, result.stderr)
+            self.assertIn("Frame: 1 Timestep: 10 Time (s): 5.0 Mice: 0.25000000000000000 Foxes: 0.50000000000000000",
+                          result.stdout + result.stderr)
+            # The reader leaves the frame buffer in place
+            with SharedFrameBuffer.attach(self.name) as reader:
+                self.assertEqual(reader.latest_frame, 1)
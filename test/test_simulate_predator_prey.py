@@ -53,7 +53,7 @@ class TestSimulation(TestCase):
         self.assertTrue(os.path.exists("map_0000.ppm"))
         self.assertTrue(os.path.exists("map_0001.ppm"))
         
-        expected_averages_content = ['Timestep,Time,Mice,Foxes\n', '0,0.0,1.89914882436250498,1.89914882436250498\n', '1,1.0,1.77137705920111133,3.48409653173904710\n']
+        expected_averages_content = ['Timestep,Time,Mice,Foxes\n', '0,0.0,1.89914882436250521,1.89914882436250521\n', '1,1.0,1.77137705920111133,3.48409653173904710\n']
         expected_map_0000_content = ['P3\n', '3 2\n', '255\n', '221 221 0\n', '8 8 0\n', '95 95 0\n', '0 200 255\n', '77 77 0\n', '255 255 0\n']
         expected_map_0001_content = ['P3\n', '3 2\n', '255\n', '207 255 0\n', '41 74 0\n', '70 186 0\n', '0 200 255\n', '57 165 0\n', '255 242 0\n']
 
@@ -67,6 +67,53 @@ class TestSimulation(TestCase):
             if os.path.exists(ppm_file_path):
                 os.remove(ppm_file_path)
 
+    def test_run_simulation_with_max_memory_uses_lean_mode(self):
+        run_simulation(0.5, 0.2, 0.1, 0.4, 0.3, 0.2, 1, 1, 2, self.landscape_file, 42, 42)
+        expected = {}
+        for file_name in ("averages.csv", "map_0000.ppm", "map_0001.ppm"):
+            with open(file_name) as f:
+                expected[file_name] = f.read()
+
+        # The budget fits the densities but not the density colours arrays
+        lean_memory = estimate_memory_usage(3, 2, colour_maps=False)
+        run_simulation(0.5, 0.2, 0.1, 0.4, 0.3, 0.2, 1, 1, 2, self.landscape_file, 42, 42,
+                       engine="vectorized", max_memory=lean_memory + 1024)
+        for file_name, content in expected.items():
+            with open(file_name) as f:
+                self.assertEqual(f.read(), content)
+            if file_name.startswith("map_"):
+                os.remove(file_name)
+
+    def test_run_simulation_refuses_to_exceed_max_memory(self):
+        with self.assertRaises(MemoryError):
+            run_simulation(0.5, 0.2, 0.1, 0.4, 0.3, 0.2, 1, 1, 2, self.landscape_file, 42, 42, max_memory=100)
+        self.assertFalse(os.path.exists("map_0000.ppm"))
+
+    def read_output_index(self):
+        with open("output_index.csv") as f:
+            rows = f.readlines()
+        self.assertEqual(rows[0], "Output,Timestep,Time\n")
+        return [int(row.split(",")[1]) for row in rows[1:]]
+
+    def test_run_simulation_with_adaptive_output(self):
+        # Every time step changes the averages, so a threshold of 0 outputs them all
+        run_simulation(0.5, 0.2, 0.1, 0.4, 0.3, 0.2, 1, 5, 6, self.landscape_file, 42, 42, save_maps=False,
+                       output_threshold=0.0)
+        self.assertEqual(self.read_output_index(), [0, 1, 2, 3, 4, 5])
+
+        # A threshold never reached outputs at the maximum interval only
+        for criterion in ("averages", "densities"):
+            run_simulation(0.5, 0.2, 0.1, 0.4, 0.3, 0.2, 1, 5, 6, self.landscape_file, 42, 42, save_maps=False,
+                           output_threshold=1e9, output_criterion=criterion, max_output_interval=4)
+            self.assertEqual(self.read_output_index(), [0, 4])
+            with open("averages.csv") as f:
+                self.assertEqual([row.split(",")[0] for row in f.readlines()[1:]], ["0", "4"])
+
+        run_simulation(0.5, 0.2, 0.1, 0.4, 0.3, 0.2, 1, 5, 6, self.landscape_file, 42, 42, save_maps=False,
+                       output_threshold=0.0, min_output_interval=2)
+        self.assertEqual(self.read_output_index(), [0, 2, 4])
+        os.remove("output_index.csv")
+
     def tearDown(self):
         # Clean up any resources created during the test
         if os.path.exists(self.landscape_file):
@@ -0,0 +1,69 @@
+import json
+import os
+import numpy as np
+from predator_prey.simulate_predator_prey import run_simulation
+from predator_prey.equivalence import generate_landscape, read_ppm_pixels
+from predator_prey.tiles import *
+from test.helpers import TemporaryDirectoryTestCase
+
+class TestTiles(TemporaryDirectoryTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.width, self.height = 23, 13
+        self.landscape = generate_landscape(self.width, self.height, 0.7, seed=2)
+        with open("temp_landscape.dat", "w") as f:
+            f.write("{} {}\n".format(self.width, self.height))
+            for row in self.landscape[1:-1, 1:-1]:
+                f.write(" ".join(str(int(square)) for square in row) + "\n")
+
+    def test_downsample_image(self):
+        image = np.array([[[0], [4], [9]], [[2], [6], [9]], [[1], [1], [255]]], np.uint8)
+        self.assertEqual(downsample_image(image)[:, :, 0].tolist(), [[3, 9], [1, 255]])
+        self.assertEqual([level.shape for level in build_image_pyramid(np.zeros((9, 20, 3), np.uint8), 4)],
+                         [(9, 20, 3), (5, 10, 3), (3, 5, 3), (2, 3, 3)])
+
+    def test_tile_pyramid_bands_match_the_pyramid_levels(self):
+        image = np.random.RandomState(4).randint(0, 256, (37, 29, 3)).astype(np.uint8)
+        levels = build_image_pyramid(image, 3)
+        self.assertEqual([level.shape[1::-1] for level in levels], calculate_pyramid_level_sizes(29, 37, 3))
+        # Bands of any height, odd or even, give the tiles of the whole image
+        bands = [image[top:bottom] for top, bottom in ((0, 5), (5, 6), (6, 20), (20, 37))]
+        manifest = save_tile_pyramid_bands("tiles", 0, 29, 37, bands, tile_size=3)
+        for level, level_image in zip(manifest["levels"], levels):
+            self.assertEqual((level["height"], level["width"]), level_image.shape[:2])
+            for row, tile_files in enumerate(level["tiles"]):
+                for column, tile_file in enumerate(tile_files):
+                    self.assertTrue(np.array_equal(read_ppm_pixels(os.path.join("tiles", tile_file)),
+                                                   level_image[3 * row:3 * row + 3, 3 * column:3 * column + 3]))
+
+    def test_tile_pyramid_matches_the_full_map(self):
+        run_simulation(0.1, 0.05, 0.2, 0.03, 0.09, 0.2, 0.5, 2, 2, "temp_landscape.dat", 1, 2,
+                       map_outputs=[create_tile_output("tiles", tile_size=8, threads=2)])
+        for time_step_index in (0, 2):
+            full_map = read_ppm_pixels("map_{:04d}.ppm".format(time_step_index))
+            with open(os.path.join("tiles", "frame_{:04d}.json".format(time_step_index))) as f:
+                manifest = json.load(f)
+            self.assertEqual((manifest["width"], manifest["height"], manifest["tile_size"]), (23, 13, 8))
+            self.assertEqual([(level["width"], level["height"]) for level in manifest["levels"]],
+                             [(23, 13), (12, 7), (6, 4)])
+            levels = build_image_pyramid(full_map.astype(np.uint8), 8)
+            for level, level_image in zip(manifest["levels"], levels):
+                self.assertEqual((level["rows"], level["columns"]), (-(-level["height"] // 8), -(-level["width"] // 8)))
+                image = np.concatenate([np.concatenate([read_ppm_pixels(os.path.join("tiles", tile_file))
+                                                        for tile_file in row], axis=1)
+                                        for row in level["tiles"]], axis=0)
+                self.assertTrue(np.array_equal(image, level_image))
+
+    def test_unchanged_tiles_are_stored_once(self):
+        # Without animals the maps do not change between frames
+        run_simulation(0.1, 0.05, 0.2, 0.03, 0.09, 0.2, 0.5, 1, 2, "temp_landscape.dat", 0, 0, save_maps=False,
+                       map_outputs=[create_tile_output("tiles", tile_size=8)])
+        manifests = []
+        for time_step_index in range(4):
+            with open(os.path.join("tiles", "frame_{:04d}.json".format(time_step_index))) as f:
+                manifests.append(json.load(f))
+        self.assertTrue(all(manifest["levels"] == manifests[0]["levels"] for manifest in manifests))
+        tile_files = {tile_file for level in manifests[0]["levels"] for row in level["tiles"] for tile_file in row}
+        self.assertEqual(sorted(os.listdir(os.path.join("tiles", "tiles"))),
+                         sorted(os.path.basename(tile_file) for tile_file in tile_files))
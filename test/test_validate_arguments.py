@@ -24,6 +24,26 @@ class TestValidateCommandLineArguments(TestCase):
             duration = 1000,
             mouse_seed = 42,
             fox_seed = 42,
+            cache_size = 1024,
+            progress_interval = 1.0,
+            threads = None,
+            block_steps = 8,
+            max_memory = None,
+            out_of_core = None,
+            cache_directory = None,
+            snapshot_directory = None,
+            landscape_cache_directory = None,
+            shared_frames = None,
+            landscape_changes = None,
+            shared_frame_slots = 4,
+            output_threshold = None,
+            min_output_interval = 1,
+            max_output_interval = None,
+            region = None,
+            overview_factor = None,
+            tile_directory = None,
+            tile_size = 256,
+            sensitivities = None,
         )
     
     def test_create_temp_landscape_file(self):
@@ -156,6 +176,104 @@ class TestValidateCommandLineArguments(TestCase):
         with self.assertRaises(ValueError) as context:
             validate_arguments(self.args)
         self.assertEqual("Random seed for initializing fox densities must be a non-negative integer", str(context.exception))
+
+    def test_validate_arguments_validates_cache_size(self):
+        self.args.cache_size = 0
+        with self.assertRaises(ValueError) as context:
+            validate_arguments(self.args)
+        self.assertEqual("Size limit of the result cache must be a positive number greater than 0", str(context.exception))
+
+    def test_validate_arguments_validates_progress_interval(self):
+        self.args.progress_interval = -1
+        with self.assertRaises(ValueError) as context:
+            validate_arguments(self.args)
+        self.assertEqual("Minimum number of seconds between progress events must be a non-negative number", str(context.exception))
+
+    def test_validate_arguments_validates_threads(self):
+        self.args.threads = 0
+        with self.assertRaises(ValueError) as context:
+            validate_arguments(self.args)
+        self.assertEqual("Number of threads must be a positive integer greater than 0", str(context.exception))
+
+    def test_validate_arguments_validates_block_steps(self):
+        self.args.block_steps = 0
+        with self.assertRaises(ValueError) as context:
+            validate_arguments(self.args)
+        self.assertEqual("Number of time steps per block must be a positive integer greater than 0", str(context.exception))
+
+    def test_validate_arguments_validates_max_memory(self):
+        self.args.max_memory = 0
+        with self.assertRaises(ValueError) as context:
+            validate_arguments(self.args)
+        self.assertEqual("Memory budget must be a positive number greater than 0", str(context.exception))
+
+    def test_validate_arguments_validates_out_of_core(self):
+        self.args.out_of_core = "work"
+        self.args.cache_directory = "cache"
+        with self.assertRaises(ValueError) as context:
+            validate_arguments(self.args)
+        self.assertEqual("Out-of-core runs support neither the result cache nor density snapshots", str(context.exception))
+
+    def test_validate_arguments_validates_landscape_cache_directory(self):
+        self.args.out_of_core = "work"
+        self.args.landscape_cache_directory = "landscapes"
+        with self.assertRaises(ValueError) as context:
+            validate_arguments(self.args)
+        self.assertEqual("Out-of-core runs load the landscape into their work directory, not from the landscape cache", str(context.exception))
+
+    def test_validate_arguments_validates_landscape_changes(self):
+        self.args.landscape_changes = "changes.txt"
+        self.args.snapshot_directory = "snapshots"
+        with self.assertRaises(ValueError) as context:
+            validate_arguments(self.args)
+        self.assertEqual("Landscape changes are supported neither with the result cache, density snapshots nor in out-of-core runs", str(context.exception))
+
+    def test_validate_arguments_validates_shared_frame_slots(self):
+        self.args.shared_frames = "frames"
+        self.args.shared_frame_slots = 0
+        with self.assertRaises(ValueError) as context:
+            validate_arguments(self.args)
+        self.assertEqual("Number of frame slots must be a positive integer greater than 0", str(context.exception))
+
+    def test_validate_arguments_validates_shared_frames(self):
+        self.args.shared_frames = "frames"
+        self.args.cache_directory = "cache"
+        with self.assertRaises(ValueError) as context:
+            validate_arguments(self.args)
+        self.assertEqual("Frames are published neither with the result cache nor in out-of-core runs", str(context.exception))
+
+    def test_validate_arguments_validates_overview_factor(self):
+        self.args.overview_factor = 0
+        with self.assertRaises(ValueError) as context:
+            validate_arguments(self.args)
+        self.assertEqual("Downsampling factor of the overview must be a positive integer greater than 0", str(context.exception))
+
+    def test_validate_arguments_validates_tile_size(self):
+        self.args.tile_size = 0
+        with self.assertRaises(ValueError) as context:
+            validate_arguments(self.args)
+        self.assertEqual("Tile size must be a positive integer greater than 0", str(context.exception))
+
+    def test_validate_arguments_validates_sensitivities(self):
+        self.args.sensitivities = ["birth_mice"]
+        self.args.out_of_core = "work"
+        with self.assertRaises(ValueError) as context:
+            validate_arguments(self.args)
+        self.assertEqual("Sensitivities are supported neither with the result cache nor in out-of-core runs", str(context.exception))
+
+    def test_validate_arguments_validates_output_threshold(self):
+        self.args.output_threshold = -0.1
+        with self.assertRaises(ValueError) as context:
+            validate_arguments(self.args)
+        self.assertEqual("Output threshold must be a non-negative number", str(context.exception))
+
+    def test_validate_arguments_validates_output_intervals(self):
+        self.args.output_threshold = 0.1
+        self.args.min_output_interval = 5
+        self.args.max_output_interval = 2
+        with self.assertRaises(ValueError) as context:
+            validate_arguments(self.args)
+        self.assertEqual("Maximum number of time steps between outputs must not be less than the minimum", str(context.exception))
         
     def tearDown(self):
         # remove the created landscape file